@@ -25,7 +25,7 @@
 
 import sys
 import getopt
-import cPickle as pickle
+import nodedb
 import os.path
 import subprocess
 from ndb2dot import DotExporter
@@ -94,11 +94,7 @@ def main():
     f = args[0]
     print >>sys.stderr, 'NodeDB file:', f
 
-    fd = open(f, 'r')
-    nodeDB = pickle.load(fd)
-    fd.close()
-
-    nodeDB.updateHierarchy()
+    nodeDB = nodedb.load(f)
 
     if len(nodes) == 0:
         nodes = nodeDB.getNodeList()
@@ -0,0 +1,841 @@
+#!/usr/bin/env python
+
+# ndb2bin.py -- X3D Type Hierarchy to Flat Binary Image Converter
+#
+# Author: Dmitri Rubinstein <rubinstein@cs.uni-saarland.de>
+#
+# Copyright (C) 2008 Saarland University
+# Copyright (C) 2009, 2010, 2011, 2012 German Research Center for
+# Artificial Intelligence (DFKI)
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+
+import sys
+import getopt
+import struct
+import zlib
+import re
+import StringIO
+import nodedb
+
+##########################################################################
+# Image layout
+##########################################################################
+#
+# The image contains the same information as the NodeDef/FieldDef arrays
+# generated by ndb2cpp.py. All integers are little-endian, all offsets
+# are byte offsets from the start of the image, so the image can be
+# mapped into memory and used in place.
+#
+# header       : HEADER_FORMAT
+# node table   : nodeCount records NODE_FORMAT
+# field table  : fieldCount records FIELD_FORMAT, fields of a node are
+#                stored contiguously
+# list table   : arrays of uint32 string offsets (super types, valid
+#                value types, enum values, MFString/SFString defaults)
+# value table  : parsed default values, 8-byte aligned, int32 or float64
+#                elements depending on the value kind
+# string table : NUL-terminated UTF-8 strings
+#
+# Missing strings are stored as NO_STRING, the checksum is the CRC-32 of
+# the image without the header.
+
+IMAGE_MAGIC = 'X3DNDBIM'
+IMAGE_VERSION = 1
+
+# magic, version, headerSize, imageSize, checksum,
+# nodeCount, nodeTableOffset, fieldCount, fieldTableOffset,
+# listTableOffset, listTableSize, valueTableOffset, valueTableSize,
+# stringTableOffset, stringTableSize, reserved
+HEADER_FORMAT = '<8s15I'
+
+# type, superTypesOffset, numSuperTypes, firstField, numFields,
+# componentName, auxTypeName, encodingId, flags
+NODE_FORMAT = '<7IiI'
+
+# type, name, accessType, value, valueKind, valueOffset, valueCount,
+# validValueTypesOffset, numValidValueTypes, encodingId, flags
+FIELD_FORMAT = '<9IiI'
+
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+NODE_SIZE = struct.calcsize(NODE_FORMAT)
+FIELD_SIZE = struct.calcsize(FIELD_FORMAT)
+
+NO_STRING = 0xffffffff
+
+# node flags
+NODE_ABSTRACT = 1
+
+# field flags, in the order of the FieldDef annotation members
+FIELD_FLAG_ANNOTATIONS = ['isReference', 'isContainment', 'isMixedContent',
+                          'isResource', 'enum', 'dontCreate', 'isNodeName',
+                          'replaceNodeWithReference']
+
+# parsed value kinds
+VALUE_NONE   = 0
+VALUE_BOOL   = 1
+VALUE_INT32  = 2
+VALUE_DOUBLE = 3
+VALUE_STRING = 4
+VALUE_NODE   = 5
+
+VALUE_FORMATS = {VALUE_BOOL : 'i',
+                 VALUE_INT32 : 'i',
+                 VALUE_DOUBLE : 'd'}
+
+def getValueKind(fieldType):
+    baseType = fieldType[2:]
+    if baseType == 'Bool':
+        return VALUE_BOOL
+    if baseType in ('Int32', 'Image'):
+        return VALUE_INT32
+    if baseType == 'String':
+        return VALUE_STRING
+    if baseType == 'Node':
+        return VALUE_NODE
+    return VALUE_DOUBLE
+
+def flattenValue(value):
+    if isinstance(value, list):
+        result = []
+        for v in value:
+            result.extend(flattenValue(v))
+        return result
+    return [value]
+
+def getFieldEncodingId(field):
+    ann = field.getAnnotations().getAnnotation('encodingId')
+    if ann and ann.getValueList():
+        return int(ann.getValueList()[0])
+    return -1
+
+def getNodeEncodingId(node):
+    encodingId = node.getAttribute('encodingId')
+    if encodingId is None:
+        return -1
+    return int(encodingId)
+
+##########################################################################
+# BinaryExporter
+##########################################################################
+
+class BinaryExporter(object):
+
+    def __init__(self, nodeDB, nodes=None):
+        self.nodeDB = nodeDB
+        self.nodes = nodes
+        self.nodeList = None
+        # string : offset in the string table
+        self._strings = None
+        self._stringBuf = None
+        # tuple of string offsets : offset in the list table
+        self._lists = None
+        self._listBuf = None
+        self._valueBuf = None
+
+    def _getAllSuperNodes(self, node, nodeList):
+        superNodes = []
+        for t in node.getSuperTypes():
+            superNodes.append(self.nodeDB.getNode(t))
+        for sn in superNodes:
+            if sn not in nodeList:
+                nodeList.append(sn)
+        for sn in superNodes:
+            self._getAllSuperNodes(sn, nodeList)
+
+    def _computeNodeList(self):
+        if self.nodes is None or len(self.nodes) == 0:
+            nodeList = self.nodeDB.getNodeList()
+        else:
+            nodeList = []
+            for nodeType in self.nodes:
+                node = self.nodeDB.getNode(nodeType)
+                if node:
+                    nodeList.append(node)
+                    self._getAllSuperNodes(node, nodeList)
+        self.nodeList = [n for n in nodeList
+                         if not n.getAttribute('externalDefinition')]
+
+    def addString(self, s):
+        """returns relative offset of string s in the string table"""
+        if s is None:
+            return NO_STRING
+        offset = self._strings.get(s)
+        if offset is None:
+            offset = self._stringBuf.tell()
+            self._strings[s] = offset
+            self._stringBuf.write(s)
+            self._stringBuf.write('\0')
+        return offset
+
+    def addStringList(self, strings):
+        """returns tuple (relative offset in list table, count)"""
+        if not strings:
+            return (0, 0)
+        offsets = tuple([self.addString(s) for s in strings])
+        offset = self._lists.get(offsets)
+        if offset is None:
+            offset = self._listBuf.tell()
+            self._lists[offsets] = offset
+            # string offsets are relocated when the image is assembled
+            self._listBuf.write(struct.pack('<%iI' % len(offsets), *offsets))
+        return (offset, len(offsets))
+
+    def addValue(self, field):
+        """returns tuple (value kind, relative offset, count)"""
+        parsedValue = field.getParsedValue()
+        if parsedValue is None:
+            return (VALUE_NONE, 0, 0)
+        kind = getValueKind(field.getType())
+        values = flattenValue(parsedValue)
+        if kind == VALUE_STRING:
+            offset, count = self.addStringList(values)
+            return (kind, offset, count)
+        if kind == VALUE_NODE:
+            return (kind, 0, len(values))
+        if not values:
+            return (kind, 0, 0)
+        # keep doubles aligned
+        self._valueBuf.write('\0' * (-self._valueBuf.tell() % 8))
+        offset = self._valueBuf.tell()
+        self._valueBuf.write(struct.pack('<%i%s' % (len(values),
+                                                    VALUE_FORMATS[kind]),
+                                         *values))
+        return (kind, offset, len(values))
+
+    def export(self, out):
+        self._strings = {}
+        self._stringBuf = StringIO.StringIO()
+        self._lists = {}
+        self._listBuf = StringIO.StringIO()
+        self._valueBuf = StringIO.StringIO()
+
+        self._computeNodeList()
+
+        nodeRecords = []
+        fieldRecords = []
+
+        for node in self.nodeList:
+            fields = node.getOwnFields()
+            firstField = len(fieldRecords)
+
+            for field in fields:
+                annotations = field.getAnnotations()
+                enumAnnot = annotations.getAnnotation('enum')
+                if field.getValidValueTypes():
+                    vvt = self.addStringList(field.getValidValueTypes())
+                elif enumAnnot:
+                    vvt = self.addStringList(enumAnnot.getValueList())
+                else:
+                    vvt = (0, 0)
+
+                flags = 0
+                for i in xrange(len(FIELD_FLAG_ANNOTATIONS)):
+                    if annotations.getAnnotation(FIELD_FLAG_ANNOTATIONS[i]):
+                        flags |= 1 << i
+
+                valueKind, valueOffset, valueCount = self.addValue(field)
+
+                fieldRecords.append((self.addString(field.getType()),
+                                     self.addString(field.getName()),
+                                     field.getAccessType(),
+                                     self.addString(field.getValue()),
+                                     valueKind, valueOffset, valueCount,
+                                     vvt[0], vvt[1],
+                                     getFieldEncodingId(field),
+                                     flags))
+
+            superTypes = self.addStringList(node.getSuperTypes())
+            flags = 0
+            if node.isAbstract():
+                flags |= NODE_ABSTRACT
+
+            nodeRecords.append((self.addString(node.getType()),
+                                superTypes[0], superTypes[1],
+                                firstField, len(fields),
+                                self.addString(node.getComponentName()),
+                                self.addString(node.getAttribute('auxTypeName')
+                                               or ''),
+                                getNodeEncodingId(node),
+                                flags))
+
+        # Assemble image
+
+        def align(offset, alignment=8):
+            return offset + (-offset % alignment)
+
+        nodeTableOffset = HEADER_SIZE
+        fieldTableOffset = align(nodeTableOffset + NODE_SIZE*len(nodeRecords))
+        listTableOffset = align(fieldTableOffset +
+                                FIELD_SIZE*len(fieldRecords))
+        listData = self._listBuf.getvalue()
+        valueTableOffset = align(listTableOffset + len(listData))
+        valueData = self._valueBuf.getvalue()
+        stringTableOffset = align(valueTableOffset + len(valueData))
+        stringData = self._stringBuf.getvalue()
+        imageSize = align(stringTableOffset + len(stringData))
+
+        def strOffset(offset):
+            if offset == NO_STRING:
+                return NO_STRING
+            return stringTableOffset + offset
+
+        def listOffset(offset, count):
+            if count == 0:
+                return 0
+            return listTableOffset + offset
+
+        body = StringIO.StringIO()
+
+        for r in nodeRecords:
+            body.write(struct.pack(NODE_FORMAT, strOffset(r[0]),
+                                   listOffset(r[1], r[2]), r[2],
+                                   r[3], r[4], strOffset(r[5]),
+                                   strOffset(r[6]), r[7], r[8]))
+
+        body.write('\0' * (fieldTableOffset - HEADER_SIZE - body.tell()))
+        for r in fieldRecords:
+            if r[4] == VALUE_STRING:
+                valueOffset = listOffset(r[5], r[6])
+            elif r[4] in VALUE_FORMATS and r[6] > 0:
+                valueOffset = valueTableOffset + r[5]
+            else:
+                valueOffset = 0
+            body.write(struct.pack(FIELD_FORMAT, strOffset(r[0]),
+                                   strOffset(r[1]), r[2], strOffset(r[3]),
+                                   r[4], valueOffset, r[6],
+                                   listOffset(r[7], r[8]), r[8],
+                                   r[9], r[10]))
+
+        body.write('\0' * (listTableOffset - HEADER_SIZE - body.tell()))
+        # relocate string offsets
+        numListEntries = len(listData) / 4
+        listEntries = struct.unpack('<%iI' % numListEntries, listData)
+        body.write(struct.pack('<%iI' % numListEntries,
+                               *[strOffset(o) for o in listEntries]))
+
+        body.write('\0' * (valueTableOffset - HEADER_SIZE - body.tell()))
+        body.write(valueData)
+        body.write('\0' * (stringTableOffset - HEADER_SIZE - body.tell()))
+        body.write(stringData)
+        body.write('\0' * (imageSize - HEADER_SIZE - body.tell()))
+
+        body = body.getvalue()
+
+        out.write(struct.pack(HEADER_FORMAT, IMAGE_MAGIC, IMAGE_VERSION,
+                              HEADER_SIZE, imageSize,
+                              zlib.crc32(body) & 0xffffffff,
+                              len(nodeRecords), nodeTableOffset,
+                              len(fieldRecords), fieldTableOffset,
+                              listTableOffset, len(listData),
+                              valueTableOffset, len(valueData),
+                              stringTableOffset, len(stringData), 0))
+        out.write(body)
+
+        self._strings = None
+        self._stringBuf = None
+        self._lists = None
+        self._listBuf = None
+        self._valueBuf = None
+
+##########################################################################
+# Image reader
+##########################################################################
+
+class ImageException(nodedb.NodeDBException):
+    pass
+
+class ImageNode(object):
+
+    def __init__(self, type, superTypes, fields, abstract, componentName,
+                 auxTypeName, encodingId):
+        self.type = type
+        self.superTypes = superTypes
+        self.fields = fields
+        self.abstract = abstract
+        self.componentName = componentName
+        self.auxTypeName = auxTypeName
+        self.encodingId = encodingId
+
+class ImageField(object):
+
+    def __init__(self, type, name, accessType, value, valueKind,
+                 parsedValue, validValueTypes, encodingId, flags):
+        self.type = type
+        self.name = name
+        self.accessType = accessType
+        self.value = value
+        self.valueKind = valueKind
+        # flat list of values or None
+        self.parsedValue = parsedValue
+        self.validValueTypes = validValueTypes
+        self.encodingId = encodingId
+        self.flags = flags
+
+    def hasFlag(self, annotationName):
+        return bool(self.flags &
+                    (1 << FIELD_FLAG_ANNOTATIONS.index(annotationName)))
+
+class NDBImage(object):
+    """Reads and validates binary image written by BinaryExporter"""
+
+    def __init__(self, data):
+        self.data = data
+        if len(data) < HEADER_SIZE:
+            raise ImageException('Image is too small')
+        header = struct.unpack_from(HEADER_FORMAT, data, 0)
+        (magic, version, headerSize, imageSize, checksum,
+         self.nodeCount, self.nodeTableOffset,
+         self.fieldCount, self.fieldTableOffset,
+         self.listTableOffset, self.listTableSize,
+         self.valueTableOffset, self.valueTableSize,
+         self.stringTableOffset, self.stringTableSize, reserved) = header
+
+        if magic != IMAGE_MAGIC:
+            raise ImageException('Invalid image magic %s' % repr(magic))
+        if version != IMAGE_VERSION:
+            raise ImageException('Unsupported image version %i' % version)
+        if headerSize != HEADER_SIZE or imageSize != len(data):
+            raise ImageException('Invalid image size')
+        if zlib.crc32(buffer(data, HEADER_SIZE)) & 0xffffffff != checksum:
+            raise ImageException('Image checksum mismatch')
+
+        self._checkRange(self.nodeTableOffset, self.nodeCount * NODE_SIZE,
+                         'node table')
+        self._checkRange(self.fieldTableOffset, self.fieldCount * FIELD_SIZE,
+                         'field table')
+        self._checkRange(self.listTableOffset, self.listTableSize,
+                         'list table')
+        self._checkRange(self.valueTableOffset, self.valueTableSize,
+                         'value table')
+        self._checkRange(self.stringTableOffset, self.stringTableSize,
+                         'string table')
+        if self.stringTableSize and \
+           data[self.stringTableOffset + self.stringTableSize - 1] != '\0':
+            raise ImageException('String table is not terminated')
+
+        self.nodes = [self._readNode(i) for i in xrange(self.nodeCount)]
+
+    def _checkRange(self, offset, size, what):
+        if offset < HEADER_SIZE or offset + size > len(self.data):
+            raise ImageException('%s is out of image bounds' % what)
+
+    def getString(self, offset):
+        if offset == NO_STRING:
+            return None
+        end = self.stringTableOffset + self.stringTableSize
+        if offset < self.stringTableOffset or offset >= end:
+            raise ImageException('String offset %i is out of bounds' % offset)
+        return self.data[offset:self.data.index('\0', offset)]
+
+    def getStringList(self, offset, count):
+        if count == 0:
+            return []
+        if offset < self.listTableOffset or \
+           offset + 4*count > self.listTableOffset + self.listTableSize:
+            raise ImageException('List offset %i is out of bounds' % offset)
+        return [self.getString(o)
+                for o in struct.unpack_from('<%iI' % count, self.data, offset)]
+
+    def _readValue(self, kind, offset, count):
+        if kind == VALUE_NONE:
+            return None
+        if kind == VALUE_STRING:
+            return self.getStringList(offset, count)
+        if kind == VALUE_NODE:
+            return [None] * count
+        if kind not in VALUE_FORMATS:
+            raise ImageException('Unknown value kind %i' % kind)
+        if count == 0:
+            return []
+        size = struct.calcsize('<%i%s' % (count, VALUE_FORMATS[kind]))
+        if offset < self.valueTableOffset or \
+           offset + size > self.valueTableOffset + self.valueTableSize:
+            raise ImageException('Value offset %i is out of bounds' % offset)
+        values = struct.unpack_from('<%i%s' % (count, VALUE_FORMATS[kind]),
+                                    self.data, offset)
+        if kind == VALUE_BOOL:
+            return [bool(v) for v in values]
+        return list(values)
+
+    def _readField(self, index):
+        (type, name, accessType, value, valueKind, valueOffset, valueCount,
+         vvtOffset, numVVT, encodingId, flags) = \
+         struct.unpack_from(FIELD_FORMAT, self.data,
+                            self.fieldTableOffset + index * FIELD_SIZE)
+        if accessType > nodedb.INPUT_OUTPUT:
+            raise ImageException('Invalid access type %i' % accessType)
+        return ImageField(self.getString(type), self.getString(name),
+                          accessType, self.getString(value), valueKind,
+                          self._readValue(valueKind, valueOffset, valueCount),
+                          self.getStringList(vvtOffset, numVVT),
+                          encodingId, flags)
+
+    def _readNode(self, index):
+        (type, superTypesOffset, numSuperTypes, firstField, numFields,
+         componentName, auxTypeName, encodingId, flags) = \
+         struct.unpack_from(NODE_FORMAT, self.data,
+                            self.nodeTableOffset + index * NODE_SIZE)
+        if firstField + numFields > self.fieldCount:
+            raise ImageException('Field range of node %i is out of bounds' % \
+                                 index)
+        return ImageNode(self.getString(type),
+                         self.getStringList(superTypesOffset, numSuperTypes),
+                         [self._readField(i) for i in
+                          xrange(firstField, firstField + numFields)],
+                         bool(flags & NODE_ABSTRACT),
+                         self.getString(componentName),
+                         self.getString(auxTypeName),
+                         encodingId)
+
+    def getNodes(self):
+        return self.nodes
+
+##########################################################################
+# Comparison with the C++ exporter output
+##########################################################################
+
+CPP_DEF_PATTERN = re.compile(r'^(?:static\s+)?const\s+[\w:<>\s*]*?(\w+)\s*' \
+                             r'(?:\[\])?\s*=\s*', re.MULTILINE)
+CPP_TOKEN_PATTERN = re.compile(r'\s*("(?:[^"\\]|\\.)*"|[{},;]|[^{},;\s]+)')
+CPP_ESCAPES = {'n' : '\n', 't' : '\t', 'r' : '\r', 'b' : '\b', 'f' : '\f',
+               '0' : '\0'}
+
+class CString(str):
+    """string literal parsed from C++ source"""
+    pass
+
+def cunquote(s):
+    return CString(re.sub(r'\\(.)',
+                          lambda m: CPP_ESCAPES.get(m.group(1), m.group(1)),
+                          s[1:-1]))
+
+def parseCPPDefinitions(source):
+    """returns dictionary variable name : initializer of all constant
+    definitions in source generated by ndb2cpp.py. Initializers in braces
+    are returned as lists, string literals are unquoted and returned as
+    CString instances, adjacent string literals are concatenated.
+    """
+    defs = {}
+    for m in CPP_DEF_PATTERN.finditer(source):
+        pos = m.end()
+        stack = [[]]
+        lastToken = None
+        while True:
+            tm = CPP_TOKEN_PATTERN.match(source, pos)
+            if tm is None:
+                break
+            pos = tm.end()
+            token = tm.group(1)
+            if token == '{':
+                stack.append([])
+            elif token == '}':
+                l = stack.pop()
+                stack[-1].append(l)
+            elif token == ';' and len(stack) == 1:
+                break
+            elif token.startswith('"') and lastToken is not None and \
+                 lastToken.startswith('"'):
+                stack[-1][-1] = CString(stack[-1][-1] + cunquote(token))
+            elif token != ',':
+                if token.startswith('"'):
+                    token = cunquote(token)
+                stack[-1].append(token)
+            lastToken = tm.group(1)
+        if stack[0]:
+            defs[m.group(1)] = stack[0][0]
+    return defs
+
+def checkImage(image, nodeDB, nodes=None):
+    """compares image with the output of ndb2cpp.CPPExporter,
+    returns list of errors"""
+    import ndb2cpp
+
+    out = StringIO.StringIO()
+    ndb2cpp.CPPExporter(nodeDB, nodes).export(out)
+    defs = parseCPPDefinitions(out.getvalue())
+
+    def isNull(token):
+        return token == '0' and not isinstance(token, CString)
+
+    def resolveString(token):
+        """returns string of a literal or of an address in a string pool
+        (pool+offset)"""
+        if isinstance(token, CString):
+            return token
+        if isNull(token):
+            return None
+        poolName, offset = token.split('+')
+        pool = defs[poolName]
+        offset = int(offset)
+        return CString(pool[offset:pool.index('\0', offset)])
+
+    def resolve(token):
+        if isNull(token):
+            return []
+        if isinstance(token, list):
+            return token
+        return defs[token]
+
+    def resolveStrings(token):
+        return map(resolveString, resolve(token))
+
+    errors = []
+    cppNodes = defs.get('nodeDefs', [])
+    imageNodes = image.getNodes()
+    if len(cppNodes) != len(imageNodes):
+        errors.append('Number of nodes differ: %i in C++, %i in image' % \
+                      (len(cppNodes), len(imageNodes)))
+
+    for cppNode, imageNode in zip(cppNodes, imageNodes):
+        nodeType = resolveString(cppNode[0])
+
+        def check(what, cppValue, imageValue):
+            if cppValue != imageValue:
+                errors.append('%s of node %s differ: %s in C++, %s in image'
+                              % (what, nodeType, repr(cppValue),
+                                 repr(imageValue)))
+
+        check('Type', nodeType, imageNode.type)
+        check('Super types', resolveStrings(cppNode[1]),
+              imageNode.superTypes)
+        check('Abstract flag', cppNode[5] == 'true', imageNode.abstract)
+        check('Component name', resolveString(cppNode[6]),
+              imageNode.componentName)
+        check('Auxiliary type name', resolveString(cppNode[7]),
+              imageNode.auxTypeName)
+        check('Encoding id', int(cppNode[8]), imageNode.encodingId)
+
+        cppFields = resolve(cppNode[3])
+        check('Number of fields', len(cppFields), len(imageNode.fields))
+        for cppField, imageField in zip(cppFields, imageNode.fields):
+            fieldName = imageField.name
+            check('Field name', resolveString(cppField[2]), fieldName)
+            check('Type of field %s' % fieldName, resolveString(cppField[0]),
+                  imageField.type)
+            check('Access type of field %s' % fieldName,
+                  cppField[1], nodedb.Field.accessTypeConsts[
+                      imageField.accessType])
+            check('Value of field %s' % fieldName, resolveString(cppField[3]),
+                  imageField.value)
+            check('Default value presence of field %s' % fieldName,
+                  not isNull(cppField[4]), imageField.valueKind != VALUE_NONE)
+            check('Valid value types of field %s' % fieldName,
+                  resolveStrings(cppField[5]), imageField.validValueTypes)
+            check('Encoding id of field %s' % fieldName,
+                  int(cppField[7]), imageField.encodingId)
+            for i in xrange(len(FIELD_FLAG_ANNOTATIONS)):
+                ann = FIELD_FLAG_ANNOTATIONS[i]
+                check('Annotation %s of field %s' % (ann, fieldName),
+                      cppField[8+i] == 'true', imageField.hasFlag(ann))
+
+    return errors
+
+def checkParsedValues(image, nodeDB):
+    """compares parsed default values stored in image with nodeDB,
+    returns list of errors"""
+    errors = []
+    for imageNode in image.getNodes():
+        node = nodeDB.getNode(imageNode.type)
+        for imageField in imageNode.fields:
+            field = node.findField(imageField.name)
+            parsedValue = field.getParsedValue()
+            if parsedValue is not None:
+                parsedValue = flattenValue(parsedValue)
+                if imageField.valueKind == VALUE_NODE:
+                    parsedValue = [None] * len(parsedValue)
+            if parsedValue != imageField.parsedValue:
+                errors.append('Parsed value of field %s.%s differ: %s in' \
+                              ' NodeDB, %s in image' % \
+                              (node.getType(), field.getName(),
+                               repr(parsedValue),
+                               repr(imageField.parsedValue)))
+    return errors
+
+##########################################################################
+# C++ declarations of the image layout
+##########################################################################
+
+CPP_HEADER = '''// Generated with ndb2bin.py
+// Layout of the flat binary node database image, all offsets are byte
+// offsets from the start of the image.
+
+#include <stdint.h>
+
+struct NDBImageHeader
+{
+    char magic[8];              // "%(magic)s"
+    uint32_t version;           // %(version)i
+    uint32_t headerSize;
+    uint32_t imageSize;
+    uint32_t checksum;          // CRC-32 of the image without header
+    uint32_t nodeCount;
+    uint32_t nodeTableOffset;
+    uint32_t fieldCount;
+    uint32_t fieldTableOffset;
+    uint32_t listTableOffset;
+    uint32_t listTableSize;
+    uint32_t valueTableOffset;
+    uint32_t valueTableSize;
+    uint32_t stringTableOffset;
+    uint32_t stringTableSize;
+    uint32_t reserved;
+};
+
+enum NDBImageConstants
+{
+    NDB_IMAGE_NO_STRING = 0x%(noString)x,
+    NDB_IMAGE_NODE_ABSTRACT = %(abstract)i
+};
+
+enum NDBImageValueKind
+{
+    NDB_IMAGE_VALUE_NONE = %(none)i,
+    NDB_IMAGE_VALUE_BOOL = %(bool)i,     // int32 elements
+    NDB_IMAGE_VALUE_INT32 = %(int32)i,    // int32 elements
+    NDB_IMAGE_VALUE_DOUBLE = %(double)i,   // double elements
+    NDB_IMAGE_VALUE_STRING = %(string)i,   // string offset list
+    NDB_IMAGE_VALUE_NODE = %(node)i      // count of NULL nodes
+};
+
+enum NDBImageFieldFlags
+{
+%(fieldFlags)s
+};
+
+struct NDBImageNode
+{
+    uint32_t type;
+    uint32_t superTypes;        // offset of string offset list
+    uint32_t numSuperTypes;
+    uint32_t firstField;        // index in the field table
+    uint32_t numFields;
+    uint32_t componentName;
+    uint32_t auxTypeName;
+    int32_t encodingId;
+    uint32_t flags;
+};
+
+struct NDBImageField
+{
+    uint32_t type;
+    uint32_t name;
+    uint32_t accessType;
+    uint32_t value;
+    uint32_t valueKind;
+    uint32_t valueOffset;
+    uint32_t valueCount;
+    uint32_t validValueTypes;   // offset of string offset list
+    uint32_t numValidValueTypes;
+    int32_t encodingId;
+    uint32_t flags;
+};
+'''
+
+def getCPPHeader():
+    fieldFlags = ',\n'.join(['    NDB_IMAGE_FIELD_%s = 0x%x' % \
+                             (FIELD_FLAG_ANNOTATIONS[i], 1 << i)
+                             for i in xrange(len(FIELD_FLAG_ANNOTATIONS))])
+    return CPP_HEADER % {'magic' : IMAGE_MAGIC,
+                         'version' : IMAGE_VERSION,
+                         'noString' : NO_STRING,
+                         'abstract' : NODE_ABSTRACT,
+                         'none' : VALUE_NONE,
+                         'bool' : VALUE_BOOL,
+                         'int32' : VALUE_INT32,
+                         'double' : VALUE_DOUBLE,
+                         'string' : VALUE_STRING,
+                         'node' : VALUE_NODE,
+                         'fieldFlags' : fieldFlags}
+
+def error(msg, exitCode = 1, exit = True):
+    sys.stderr.write('Error: ')
+    sys.stderr.write(msg)
+    sys.stderr.write('\n')
+    if exit:
+        sys.exit(exitCode)
+
+def usage(exitCode = 0):
+    print 'Usage:',sys.argv[0],'[options] <node-db-file>'
+    print '-h | --help                     Print this message and exit.'
+    print '-n | --node-types list          Output hierarchy of specified node types (list is separated by commas)'
+    print '-o | --output file              Write image to file instead of stdout'
+    print '-c | --check                    Read the image back and compare it with the'
+    print '                                output of ndb2cpp.py'
+    print '--cpp-header                    Print C++ declarations of the image layout and exit'
+    sys.exit(exitCode)
+
+def main():
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], 'hn:o:c',
+                                   ['help', 'node-types=', 'output=',
+                                    'check', 'cpp-header'])
+    except getopt.GetoptError, e:
+        error(str(e), exit = False)
+        usage(1)
+
+    nodes = []
+    outputFile = None
+    checkOutput = False
+
+    for o, a in opts:
+        if o in ('-h', '--help'):
+            usage()
+        elif o in ('-n', '--node-types'):
+            nodes.extend(a.split(','))
+        elif o in ('-o', '--output'):
+            outputFile = a
+        elif o in ('-c', '--check'):
+            checkOutput = True
+        elif o in ('--cpp-header',):
+            sys.stdout.write(getCPPHeader())
+            sys.exit(0)
+
+    if len(args) != 1:
+        error('you must specify node database file')
+
+    f = args[0]
+    print >>sys.stderr, 'NodeDB file:', f
+
+    nodeDB = nodedb.load(f)
+
+    out = StringIO.StringIO()
+    BinaryExporter(nodeDB, nodes).export(out)
+    data = out.getvalue()
+
+    if checkOutput:
+        try:
+            image = NDBImage(data)
+        except ImageException, e:
+            error('Invalid image: %s' % e)
+        errors = checkImage(image, nodeDB, nodes)
+        errors.extend(checkParsedValues(image, nodeDB))
+        for e in errors:
+            print >>sys.stderr, e
+        if errors:
+            sys.exit(1)
+        print >>sys.stderr, 'Image is consistent with ndb2cpp.py output' \
+              ' (%i nodes, %i fields, %i bytes)' % \
+              (image.nodeCount, image.fieldCount, len(data))
+
+    if outputFile is not None:
+        fd = open(outputFile, 'wb')
+        fd.write(data)
+        fd.close()
+    elif not checkOutput:
+        sys.stdout.write(data)
+
+if __name__ == '__main__':
+    main()
@@ -24,9 +24,11 @@
 # Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
 
 import sys
+import os
+import re
 import getopt
-import cPickle as pickle
 import StringIO
+import multiprocessing
 import nodedb
 
 ##########################################################################
@@ -51,12 +53,18 @@ def cquote(s):
             r += '\\\\'
         elif c == '"':
             r += '\\"'
+        elif c == '\0':
+            r += '\\0'
         else:
             # check for printable char ?
             r += c
     r += '"'
     return r
 
+# maximal size of a string pool in bytes, compilers limit the length of
+# concatenated string literals
+STRING_POOL_SIZE = 32768
+
 def cquote_list(l):
     return '{' + ', '.join(map(cquote, l)) + '}'
 
@@ -143,10 +151,12 @@ def convertSingleValue(fieldType, value):
 
 class CPPExporter:
 
-    def __init__(self, nodeDB, nodes=None):
+    def __init__(self, nodeDB, nodes=None, hashTables=False):
         self.nodeDB = nodeDB
         self.nodes = nodes
         self.nodeList = None
+        # generate perfect hash tables of node types and field names
+        self.hashTables = hashTables
         # C/C++ initialization variables buffer
         self._cVarBuf = None
         # C-Variable counter
@@ -157,6 +167,18 @@ class CPPExporter:
         self._mainBuf = None
         # default value initialization variables
         self._initVars = None
+        # True when field definitions are referenced by other units
+        self._externFields = False
+        # pooled string lists generation buffer
+        self._poolBuf = None
+        # string pools, lists of strings stored in a char array each
+        self._stringPools = None
+        # size of the last string pool in bytes
+        self._stringPoolSize = 0
+        # string : address expression of the pooled string
+        self._stringRefs = None
+        # tuple of strings : name of the pooled string list variable
+        self._stringListVars = None
         # conversion cache
         self._convertCache = {}
 
@@ -225,6 +247,35 @@ class CPPExporter:
             cnl.append(node)
         return components
 
+    def getStringRef(self, s):
+        """returns expression of the address of s in the string pool,
+           every string is stored once"""
+        ref = self._stringRefs.get(s)
+        if ref is None:
+            if not self._stringPools or \
+               self._stringPoolSize + len(s) + 1 > STRING_POOL_SIZE:
+                self._stringPools.append([])
+                self._stringPoolSize = 0
+            ref = '_strpool_%i+%i' % (len(self._stringPools) - 1,
+                                      self._stringPoolSize)
+            self._stringRefs[s] = ref
+            self._stringPools[-1].append(s)
+            self._stringPoolSize += len(s) + 1
+        return ref
+
+    def getStringListVar(self, strings):
+        """returns name of the pooled array of the pooled strings, every
+           list is defined once"""
+        key = tuple(strings)
+        varName = self._stringListVars.get(key)
+        if varName is None:
+            varName = '_strlist_%i' % len(self._stringListVars)
+            self._stringListVars[key] = varName
+            items = ', '.join(map(self.getStringRef, strings))
+            print >>self._poolBuf, 'static const char * %s[] = {%s};' % \
+                  (varName, items)
+        return varName
+
     def getInitVarName(self, field):
         """returns name of the default value initialization variable,
            or None if no available"""
@@ -309,90 +360,50 @@ class CPPExporter:
 
         return (fmtStr, values)
 
-    # generates the variable names for valid value types used by enums and valid value types themselves
-    def genValidValueTypeNames(self, node, field):
-
-        validValueTypesVar = '%s_%s_field_vvt' % \
-                                   (node.getType(), field.getName())
-        validValueTypesSizeVar = validValueTypesVar + '_size'
+    # returns tuple (pooled string list, size) of valid value types or
+    # enum values of the field, or (0, 0) when the field has none
+    def genValidValueTypes(self, node, field):
 
-        return (validValueTypesVar, validValueTypesSizeVar)
-
-    # returns the string containing the type definitions
-    def genValidValueTypedefs(self, node, field):
-
-        validValueTypeDefs = []
         validValueTypes = field.getValidValueTypes()
-        n_validValueTypesVar, n_validValueTypesSizeVar = self.genValidValueTypeNames(node, field)
-
-        val = cquote_list(validValueTypes)
-        numValidValueTypes = len(validValueTypes)
-
-        validValueTypeDefs.append(
-            'const char * %s[] = %s;' % (n_validValueTypesVar,val)
-            )
-        validValueTypeDefs.append(
-            'const size_t %s = %i;' % (n_validValueTypesSizeVar,
-                                       numValidValueTypes)
-            )
-
-        return validValueTypeDefs
-
-    # returns  the string containing the definitions for the enumeration
-    def genFieldEnumAnnotation(self, node, field):
-
         enumAnnot = field.getAnnotations().getAnnotation('enum')
-        assert enumAnnot
-
-        validValueTypeDefs = []
-        n_validValueTypesVar, n_validValueTypesSizeVar = self.genValidValueTypeNames(node, field)
 
-        # enum's key is the value of the field,
-        # enum's value is the symbolic name of the value
-        validValueTypeDefs.append( '// Enum annotation of field %s.%s' % \
-              (node.getType(), field.getName()))
-
-        enumVals = '{'
-        comma = ''
-        for v in enumAnnot.getValueList():
-            enumVals += comma + '\"' + v + '\"'
-            comma = ','
-        enumVals += '}'
-
-        numVals = len(enumAnnot.getValueList())
+        if len(validValueTypes) > 0:
+            assert enumAnnot is None
+            values = validValueTypes
+        elif enumAnnot:
+            # enum's key is the value of the field,
+            # enum's value is the symbolic name of the value
+            values = enumAnnot.getValueList()
+        else:
+            return (0, 0)
 
-        validValueTypeDefs.append(
-            'const char * %s[] = %s;' % (n_validValueTypesVar, enumVals)
-            )
-        validValueTypeDefs.append(
-            'const size_t %s = %i;' % (n_validValueTypesSizeVar, numVals)
-            )
+        print >>self._mainBuf, 'const size_t %s_%s_field_vvt_size = %i;' % \
+              (node.getType(), field.getName(), len(values))
 
-        return validValueTypeDefs
+        return (self.getStringListVar(values), len(values))
 
     def genFields(self, node):
 
         #fields = node.getFields()
-        fields = [f for f in node.getFields() if node in f.getDeclarationNodes()]
+        fields = node.getOwnFields()
         flen = len(fields)
 
         fieldsDefRef = '0'
 
         if flen:
             
-            validValueTypesDefs = []
             fieldDefs = []
 
             for i in xrange(0, flen):
                 field = fields[i]
 
-                f_type = cquote(field.getType())
+                f_type = self.getStringRef(field.getType())
                 f_accessType = field.getAccessTypeConst()
-                f_name = cquote(field.getName())
+                f_name = self.getStringRef(field.getName())
 
                 value = field.getValue()
                 if value is not None:
-                    f_value = cquote(value)
+                    f_value = self.getStringRef(value)
                 else:
                     f_value = '0'
 
@@ -403,28 +414,16 @@ class CPPExporter:
                     f_parsedValue = '0'
 
 
-                # valid value typedefs and enums
-                n_validValueTypesVar, n_validValueTypesSizeVar = self.genValidValueTypeNames(node, field)
-
-                enumAnnot = field.getAnnotations().getAnnotation('enum')
-
-                if len(field.getValidValueTypes()) > 0:
-                    assert enumAnnot is None
-                    validValueTypesDefs.extend(self.genValidValueTypedefs(node, field))
-
-                elif enumAnnot:
-                    validValueTypesDefs.extend(self.genFieldEnumAnnotation(node, field))
-
-                else:
-                    n_validValueTypesVar = 0
-                    n_validValueTypesSizeVar = 0
+                # valid value types and enums
+                n_validValueTypesVar, n_numValidValueTypes = \
+                    self.genValidValueTypes(node, field)
 
                 # other annotations
                 annotFmtStr, annotValues = self.genFieldAnnotations(node, field)
 
                 # field definition string
                 fieldAttrs = (f_type, f_accessType, f_name, f_value, f_parsedValue,
-                     n_validValueTypesVar, n_validValueTypesSizeVar) + annotValues
+                     n_validValueTypesVar, n_numValidValueTypes) + annotValues
 
                 s = '   '
                 s+='{%s, %s, %s, %s, %s, %s, %s'
@@ -439,10 +438,11 @@ class CPPExporter:
 
             # output field definitions
 
-            for d in validValueTypesDefs:
-                print >>self._mainBuf, d
-
-            fieldsDefRef = '%s_fields' % node.getType()
+            fieldsDefRef = getFieldsDefName(node)
+            if self._externFields:
+                # referenced by nodeDefs of another translation unit
+                print >>self._mainBuf, 'extern const FieldDef %s[];' % \
+                      fieldsDefRef
             print >>self._mainBuf, 'const FieldDef %s[] =\n{' % fieldsDefRef
 
             for d in fieldDefs:
@@ -450,92 +450,54 @@ class CPPExporter:
 
             print >>self._mainBuf, '};'
 
-        fieldsSizeVar = '%s_fields_size' % node.getType()
+        return [fieldsDefRef, flen]
 
-        print >>self._mainBuf, 'const size_t %s = %i;' % (fieldsSizeVar, flen)
-        print >>self._mainBuf
+    def genNodeDef(self, node, fieldsDefRef, numFields):
+        """writes size constants of the node, returns tuple of NodeDef
+           initializer values"""
+        nodeType = node.getType()
 
-        return [fieldsDefRef, fieldsSizeVar, flen]
+        superTypes = node.getSuperTypes()
 
-    def export(self, out):
-        # initialize output buffers
-        self._cVarBuf = StringIO.StringIO()
-        self._varBuf = StringIO.StringIO()
-        self._mainBuf = StringIO.StringIO()
-
-        # initialize default value initialization variables
-        self._initVars = {}
-        self._cVarCount = 0
-
-        self._computeNodeList()
-
-        nodeDefs = []
-
-        for node in self.nodeList:
-            #derivedNodes = [n for n in node.getDerivedNodes() if n in self.nodeList]
-            if node.getAttribute("externalDefinition"):
-                continue
-
-            nodeType = node.getType()
-
-            print >>self._mainBuf
-            print >>self._mainBuf, "// ---- %s ----" % (nodeType,)
-            print >>self._mainBuf
-
-            fieldsDefRef, fieldsSizeVar, numFields = self.genFields(node)
-
-            superTypes = node.getSuperTypes()
-
-            n_superTypesVar = '%s_superTypes' % nodeType
-            n_superTypesSizeVar = '%s_size' % n_superTypesVar
-            
-            if len(superTypes):
-                val = cquote_list(superTypes)
-                n_superTypes = n_superTypesVar
-                n_numSuperTypes = len(superTypes)
-
-                print >>self._mainBuf, 'const char * %s[] = %s;' % \
-                      (n_superTypesVar, val)
-                print >>self._mainBuf, 'const size_t %s = %i;' % \
-                      (n_superTypesSizeVar, n_numSuperTypes)
-
-            else:
-                n_superTypes = '0'
-                n_numSuperTypes = 0
-                print >>self._mainBuf, 'const size_t %s = 0;' % \
-                      n_superTypesSizeVar
-
-            n_type = cquote(nodeType)
-
-            if node.isAbstract():
-                n_abstract = 'true'
-            else:
-                n_abstract = 'false'
-            n_componentName = cquote(node.getComponentName())
+        print >>self._mainBuf, 'const size_t %s_fields_size = %i;' % \
+              (nodeType, numFields)
+        print >>self._mainBuf
+        print >>self._mainBuf, 'const size_t %s_superTypes_size = %i;' % \
+              (nodeType, len(superTypes))
 
-            #nodeVar = '%s_node' % nodeType
+        if len(superTypes):
+            n_superTypes = self.getStringListVar(superTypes)
+        else:
+            n_superTypes = '0'
+        n_numSuperTypes = len(superTypes)
 
-            n_auxTypeName = node.getAttribute("auxTypeName")
-            if n_auxTypeName is None:
-                n_auxTypeName = ""
-            n_auxTypeName = cquote(n_auxTypeName)
+        n_type = self.getStringRef(nodeType)
 
-            n_encodingId = node.getAttribute("encodingId")
-            if n_encodingId is None:
-                n_encodingId = -1
-            else:
-                n_encodingId = int(n_encodingId)
+        if node.isAbstract():
+            n_abstract = 'true'
+        else:
+            n_abstract = 'false'
+        n_componentName = self.getStringRef(node.getComponentName())
 
+        #nodeVar = '%s_node' % nodeType
 
-            nodeDefs.append((n_type, n_superTypes, n_superTypesSizeVar,
-                             fieldsDefRef, fieldsSizeVar, # or numFields ?
-                             n_abstract, n_componentName,
-                             n_auxTypeName, n_encodingId))
+        n_auxTypeName = node.getAttribute("auxTypeName")
+        if n_auxTypeName is None:
+            n_auxTypeName = ""
+        n_auxTypeName = self.getStringRef(n_auxTypeName)
 
+        n_encodingId = node.getAttribute("encodingId")
+        if n_encodingId is None:
+            n_encodingId = -1
+        else:
+            n_encodingId = int(n_encodingId)
 
-            #pc = ';'.join([n.getType() for n in derivedNodes])
-            #print '%s -> { %s }' % (node.getType(), pc)
+        return (n_type, n_superTypes, n_numSuperTypes,
+                fieldsDefRef, numFields,
+                n_abstract, n_componentName,
+                n_auxTypeName, n_encodingId)
 
+    def genNodeDefs(self, nodeDefs):
 
         print >>self._mainBuf, 'const NodeDef nodeDefs[] =\n{'
 
@@ -549,7 +511,7 @@ class CPPExporter:
             else:
                 s=''
 
-            print >>self._mainBuf, ('    {%s, %s, %s, %s, %s, %s, %s, %s, %i}' % \
+            print >>self._mainBuf, ('    {%s, %s, %i, %s, %i, %s, %s, %s, %i}' % \
                                     nodeDef)+s
 
         print >>self._mainBuf, '};'
@@ -557,7 +519,92 @@ class CPPExporter:
         print >>self._mainBuf, 'const size_t nodeDefs_size = %i;' % \
               len(nodeDefs)
 
-        # Generate file
+    def genHashTables(self):
+        """generates minimal perfect hash functions of node types and of
+           the field names of every node, see createPerfectHash"""
+        nodes = self.getExportedNodes()
+
+        print >>self._mainBuf
+        print >>self._mainBuf, "// ---- perfect hash tables ----"
+        print >>self._mainBuf
+        print >>self._mainBuf, PERFECT_HASH_FUNCTIONS
+
+        seeds, indices = createPerfectHash([node.getType() for node in nodes])
+        print >>self._mainBuf, 'static const int _nodehash_seeds[] = {%s};' % \
+              formatArray(seeds)
+        print >>self._mainBuf, 'static const %s _nodehash_indices[] = {%s};' % \
+              (getIndexType(len(nodes)), formatArray(indices))
+
+        fieldNamesOfNodes = [tuple([field.getName()
+                                    for field in node.getOwnFields()])
+                             for node in nodes]
+        fieldIndexType = getIndexType(max([0] + map(len, fieldNamesOfNodes)))
+
+        # (seeds, indices) : (seeds variable, indices variable)
+        fieldHashVars = {}
+        fieldHashTables = []
+        for fieldNames in fieldNamesOfNodes:
+            if not fieldNames:
+                fieldHashTables.append('{0, 0, 0}')
+                continue
+            seeds, indices = createPerfectHash(fieldNames)
+            key = (tuple(seeds), tuple(indices))
+            hashVars = fieldHashVars.get(key)
+            if hashVars is None:
+                i = len(fieldHashVars)
+                hashVars = fieldHashVars[key] = \
+                           ('_fieldhash_seeds_%i' % i,
+                            '_fieldhash_indices_%i' % i)
+                print >>self._mainBuf, 'static const int %s[] = {%s};' % \
+                      (hashVars[0], formatArray(seeds))
+                print >>self._mainBuf, 'static const %s %s[] = {%s};' % \
+                      (fieldIndexType, hashVars[1], formatArray(indices))
+            fieldHashTables.append('{%s, %s, %i}' % (hashVars + \
+                                                     (len(fieldNames),)))
+
+        print >>self._mainBuf
+        print >>self._mainBuf, 'namespace {'
+        print >>self._mainBuf, 'struct _FieldHashTable'
+        print >>self._mainBuf, '{'
+        print >>self._mainBuf, '    const int *seeds;'
+        print >>self._mainBuf, '    const %s *indices;' % fieldIndexType
+        print >>self._mainBuf, '    std::size_t size;'
+        print >>self._mainBuf, '};'
+        print >>self._mainBuf, '}'
+        print >>self._mainBuf
+        print >>self._mainBuf, 'static const _FieldHashTable ' \
+              '_fieldHashTables[] =\n{\n    %s\n};' % \
+              ',\n    '.join(fieldHashTables)
+        print >>self._mainBuf
+        print >>self._mainBuf, PERFECT_HASH_LOOKUP % len(nodes)
+
+    def getExportedNodes(self):
+        """returns nodes with definitions in nodeDefs"""
+        if self.nodeList is None:
+            self._computeNodeList()
+        return [node for node in self.nodeList
+                if not node.getAttribute("externalDefinition")]
+
+    def _beginUnit(self, externFields=False):
+        # initialize output buffers
+        self._cVarBuf = StringIO.StringIO()
+        self._varBuf = StringIO.StringIO()
+        self._mainBuf = StringIO.StringIO()
+        self._poolBuf = StringIO.StringIO()
+
+        # initialize default value initialization variables
+        self._initVars = {}
+        self._cVarCount = 0
+
+        # initialize pools
+        self._stringPools = []
+        self._stringPoolSize = 0
+        self._stringRefs = {}
+        self._stringListVars = {}
+
+        self._externFields = externFields
+
+    def _writeUnit(self, out):
 
         # Header
 
@@ -577,6 +624,15 @@ class CPPExporter:
         out.write(self._cVarBuf.getvalue())
         out.write(self._varBuf.getvalue())
 
+        # Pools
+
+        for i in xrange(len(self._stringPools)):
+            print >>out, 'static const char _strpool_%i[] =' % i
+            for s in self._stringPools[i]:
+                print >>out, '    %s' % cquote(s + '\0')
+            print >>out, '    ;'
+        out.write(self._poolBuf.getvalue())
+
         # Body
 
         out.write(self._mainBuf.getvalue())
@@ -594,8 +650,337 @@ class CPPExporter:
         self._varBuf = None
         self._mainBuf.close()
         self._mainBuf = None
+        self._poolBuf.close()
+        self._poolBuf = None
         self._initVars = None
+        self._stringPools = None
+        self._stringRefs = None
+        self._stringListVars = None
+
+    def _printNodeHeader(self, node):
+        print >>self._mainBuf
+        print >>self._mainBuf, "// ---- %s ----" % (node.getType(),)
+        print >>self._mainBuf
+
+    def export(self, out):
+        """writes single translation unit with all definitions"""
+        self._beginUnit()
+
+        nodeDefs = []
+
+        for node in self.getExportedNodes():
+            self._printNodeHeader(node)
+
+            fieldsDefRef, numFields = self.genFields(node)
+
+            nodeDefs.append(self.genNodeDef(node, fieldsDefRef, numFields))
+
+        self.genNodeDefs(nodeDefs)
+        if self.hashTables:
+            self.genHashTables()
+
+        self._writeUnit(out)
 
+    def exportFields(self, nodes, out):
+        """writes translation unit with field definitions of nodes,
+           referenced by the unit written by exportIndex"""
+        self._beginUnit(externFields=True)
+
+        for node in nodes:
+            if node.getOwnFields():
+                self._printNodeHeader(node)
+                self.genFields(node)
+
+        self._writeUnit(out)
+
+    def exportIndex(self, out):
+        """writes translation unit with nodeDefs referencing field
+           definitions written by exportFields"""
+        self._beginUnit()
+
+        nodeDefs = []
+
+        for node in self.getExportedNodes():
+            numFields = len(node.getOwnFields())
+            if numFields:
+                fieldsDefRef = getFieldsDefName(node)
+                print >>self._mainBuf, 'extern const FieldDef %s[];' % \
+                      fieldsDefRef
+            else:
+                fieldsDefRef = '0'
+
+            nodeDefs.append(self.genNodeDef(node, fieldsDefRef, numFields))
+
+        print >>self._mainBuf
+        self.genNodeDefs(nodeDefs)
+        if self.hashTables:
+            self.genHashTables()
+
+        self._writeUnit(out)
+
+    def getComponentShards(self):
+        """returns list of tuples (file name, node types) of field
+           definition units of all components"""
+        shards = []
+        # file name : True
+        fileNames = {}
+        # component name : node types
+        componentNodes = {}
+        for node in self.getExportedNodes():
+            componentName = node.getComponentName()
+            nodeTypes = componentNodes.get(componentName)
+            if nodeTypes is None:
+                fileName = getComponentFileName(componentName)
+                # component names differing only in special characters
+                i = 1
+                while fileName in fileNames:
+                    fileName = getComponentFileName('%s_%i' % \
+                                                    (componentName, i))
+                    i += 1
+                fileNames[fileName] = True
+                nodeTypes = componentNodes[componentName] = []
+                shards.append((fileName, nodeTypes))
+            nodeTypes.append(node.getType())
+        return shards
+
+    def exportComponents(self, directory, processes=None):
+        """writes unit of field definitions of every component and the
+           index unit INDEX_FILE_NAME with nodeDefs into directory,
+           removes units of components that do not exist anymore. Only
+           files with changed content are written. Component units are
+           generated by processes worker processes (by default number of
+           CPUs). Returns tuple (number of written files, number of all
+           files).
+        """
+        if processes is None:
+            processes = multiprocessing.cpu_count()
+
+        shards = self.getComponentShards()
+
+        if processes == 1 or len(shards) < 2:
+            sources = map(exportComponent,
+                          [(self, nodeTypes) for f, nodeTypes in shards])
+        else:
+            pool = multiprocessing.Pool(processes, initWorker, (self,))
+            try:
+                sources = pool.map(exportComponentInWorker,
+                                   [nodeTypes for f, nodeTypes in shards])
+            finally:
+                pool.close()
+                pool.join()
+
+        out = StringIO.StringIO()
+        self.exportIndex(out)
+
+        files = [(INDEX_FILE_NAME, out.getvalue())]
+        files.extend(zip([f for f, nodeTypes in shards], sources))
+
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        numWritten = 0
+        for fileName, source in files:
+            if writeFileIfChanged(os.path.join(directory, fileName), source):
+                numWritten += 1
+
+        fileNames = [f for f, source in files]
+        for fileName in os.listdir(directory):
+            if fileName.startswith(COMPONENT_FILE_PREFIX) and \
+               fileName.endswith('.cpp') and fileName not in fileNames:
+                os.remove(os.path.join(directory, fileName))
+
+        return (numWritten, len(files))
+
+# Minimal perfect hash functions
+#
+# Keys are distributed into n buckets by hashString(0, key) % n, where n is
+# the number of keys. Buckets are processed by decreasing size: a bucket
+# with several keys gets the smallest seed d > 0 for which
+# hashString(d, key) % n places all its keys into distinct free slots of
+# the table, a bucket with a single key gets a free slot s stored as seed
+# -s-1. The table of indices maps every slot to the index of its key.
+
+# largest tried seed of a bucket
+MAX_PERFECT_HASH_SEED = 0x100000
+
+def hashString(seed, s):
+    """returns 32-bit FNV-1a hash of s with the offset basis xored with
+       seed, the high half is xored into the low half because the lowest
+       bit of FNV-1a depends only on the lowest bits of the characters"""
+    if isinstance(s, unicode):
+        s = s.encode('utf-8')
+    h = 0x811c9dc5 ^ seed
+    for c in s:
+        h = ((h ^ ord(c)) * 0x01000193) & 0xffffffff
+    return h ^ (h >> 16)
+
+def getPerfectHashSlot(seeds, key):
+    seed = seeds[hashString(0, key) % len(seeds)]
+    if seed < 0:
+        return -seed-1
+    return hashString(seed, key) % len(seeds)
+
+def createPerfectHash(keys):
+    """returns tuple of lists (seeds, indices) of a minimal perfect hash
+       function of keys: indices[getPerfectHashSlot(seeds, keys[i])] == i.
+       Raises NodeDBException when keys contain duplicates or the function
+       does not map every key to its index."""
+    n = len(keys)
+    if len(dict.fromkeys(keys)) != n:
+        raise nodedb.NodeDBException('Duplicate keys in perfect hash: %s' %
+                                     ', '.join(keys))
+    buckets = [[] for i in xrange(n)]
+    for i in xrange(n):
+        buckets[hashString(0, keys[i]) % n].append(i)
+    bucketOrder = range(n)
+    bucketOrder.sort(key=lambda b: -len(buckets[b]))
+
+    seeds = [0] * n
+    indices = [None] * n
+    for b in bucketOrder:
+        bucket = buckets[b]
+        if len(bucket) < 2:
+            break
+        seed = 1
+        while True:
+            slots = []
+            for i in bucket:
+                slot = hashString(seed, keys[i]) % n
+                if indices[slot] is not None or slot in slots:
+                    break
+                slots.append(slot)
+            else:
+                break
+            seed += 1
+            if seed > MAX_PERFECT_HASH_SEED:
+                raise nodedb.NodeDBException(
+                    'No perfect hash found for keys %s' % \
+                    ', '.join([keys[i] for i in bucket]))
+        for i, slot in zip(bucket, slots):
+            indices[slot] = i
+        seeds[b] = seed
+
+    freeSlots = [slot for slot in xrange(n) if indices[slot] is None]
+    for b in bucketOrder:
+        bucket = buckets[b]
+        if len(bucket) == 1:
+            slot = freeSlots.pop()
+            indices[slot] = bucket[0]
+            seeds[b] = -slot-1
+
+    # the generated C++ lookup computes the same slots
+    for i in xrange(n):
+        if indices[getPerfectHashSlot(seeds, keys[i])] != i:
+            raise nodedb.NodeDBException(
+                'Perfect hash does not map key %s' % keys[i])
+
+    return (seeds, indices)
+
+def getIndexType(size):
+    """returns C++ type of indices less than size"""
+    if size <= 0x10000:
+        return 'unsigned short'
+    return 'unsigned int'
+
+def formatArray(values, valuesPerLine=12):
+    """returns comma separated values, split into indented lines when
+       there are more than valuesPerLine values"""
+    if len(values) <= valuesPerLine:
+        return ', '.join(map(str, values))
+    lines = []
+    for i in xrange(0, len(values), valuesPerLine):
+        lines.append(', '.join(map(str, values[i:i+valuesPerLine])))
+    return '\n    ' + ',\n    '.join(lines) + '\n'
+
+PERFECT_HASH_FUNCTIONS = """\
+static unsigned int _hashString(unsigned int seed, const char *s)
+{
+    // 32-bit FNV-1a, offset basis xored with seed, high half xored into
+    // the low half
+    unsigned int h = 0x811c9dc5u ^ seed;
+    for (; *s; ++s)
+        h = ((h ^ (unsigned char)*s) * 0x01000193u) & 0xffffffffu;
+    return h ^ (h >> 16);
+}
+
+static std::size_t _getPerfectHashSlot(const int *seeds, std::size_t size,
+                                       const char *key)
+{
+    int seed = seeds[_hashString(0, key) % size];
+    if (seed < 0)
+        return -seed-1;
+    return _hashString(seed, key) % size;
+}
+"""
+
+PERFECT_HASH_LOOKUP = """\
+// Returns index of the definition of typeName in nodeDefs. Unknown type
+// names are mapped to an arbitrary index, the caller compares the name.
+std::size_t getNodeDefIndex(const char *typeName)
+{
+    return _nodehash_indices[_getPerfectHashSlot(_nodehash_seeds, %i,
+                                                 typeName)];
+}
+
+// Returns index of the definition of fieldName in the fields of
+// nodeDefs[nodeDefIndex] (0 when the node has no fields). Unknown field
+// names are mapped to an arbitrary index, the caller compares the name.
+std::size_t getFieldDefIndex(std::size_t nodeDefIndex, const char *fieldName)
+{
+    const _FieldHashTable &table = _fieldHashTables[nodeDefIndex];
+    if (table.size == 0)
+        return 0;
+    return table.indices[_getPerfectHashSlot(table.seeds, table.size,
+                                             fieldName)];
+}"""
+
+# Sharded output
+
+INDEX_FILE_NAME = 'nodedefs.cpp'
+COMPONENT_FILE_PREFIX = 'component_'
+
+def getFieldsDefName(node):
+    return '%s_fields' % node.getType()
+
+def getComponentFileName(componentName):
+    return '%s%s.cpp' % (COMPONENT_FILE_PREFIX,
+                         re.sub(r'\W', '_', str(componentName)))
+
+def writeFileIfChanged(fileName, data):
+    """writes data into the file when its content differs,
+       returns True when the file was written"""
+    try:
+        fd = open(fileName, 'rb')
+        try:
+            if fd.read() == data:
+                return False
+        finally:
+            fd.close()
+    except IOError:
+        pass
+    fd = open(fileName, 'wb')
+    try:
+        fd.write(data)
+    finally:
+        fd.close()
+    return True
+
+def exportComponent((exporter, nodeTypes)):
+    """returns source of the field definitions unit of nodes"""
+    out = StringIO.StringIO()
+    exporter.exportFields([exporter.nodeDB.getNode(t) for t in nodeTypes],
+                          out)
+    return out.getvalue()
+
+# state of worker processes
+workerExporter = None
+
+def initWorker(exporter):
+    global workerExporter
+    workerExporter = exporter
+
+def exportComponentInWorker(nodeTypes):
+    return exportComponent((workerExporter, nodeTypes))
 
 def error(msg, exitCode = 1, exit = True):
     sys.stderr.write('Error: ')
@@ -608,23 +993,46 @@ def usage(exitCode = 0):
     print 'Usage:',sys.argv[0],'[options] <node-db-file>'
     print '-h | --help                     Print this message and exit.'
     print '-n | --node-types list          Output hierarchy of specified node types (list is separated by commas)'
+    print '-o | --output-dir dir           Write field definitions of every component into'
+    print '                                dir/%s<component>.cpp and nodeDefs into dir/%s,' % \
+          (COMPONENT_FILE_PREFIX, INDEX_FILE_NAME)
+    print '                                only files with changed content are written'
+    print '-p | --processes n              Number of processes generating components with'
+    print '                                --output-dir (default: number of CPUs)'
+    print '--hash-tables                   Generate perfect hash functions getNodeDefIndex()'
+    print '                                and getFieldDefIndex() of node types and field names'
     sys.exit(exitCode)
 
 def main():
     try:
-        opts, args = getopt.getopt(sys.argv[1:], 'hn:',
-                                   ['help', 'node-types='])
+        opts, args = getopt.getopt(sys.argv[1:], 'hn:o:p:',
+                                   ['help', 'node-types=', 'output-dir=',
+                                    'processes=', 'hash-tables'])
     except getopt.GetoptError, e:
         error(str(e), exit = False)
         usage(1)
 
     nodes = []
+    outputDir = None
+    processes = None
+    hashTables = False
 
     for o, a in opts:
         if o in ('-h', '--help'):
             usage()
         elif o in ('-n', '--node-types'):
             nodes.extend(a.split(','))
+        elif o in ('-o', '--output-dir'):
+            outputDir = a
+        elif o in ('-p', '--processes'):
+            try:
+                processes = int(a)
+            except ValueError:
+                processes = 0
+            if processes < 1:
+                error('invalid number of processes %s' % a)
+        elif o == '--hash-tables':
+            hashTables = True
 
     if len(args) != 1:
         error('you must specify node database file')
@@ -632,14 +1040,18 @@ def main():
     f = args[0]
     print >>sys.stderr, 'NodeDB file:', f
 
-    fd = open(f, 'r')
-    nodeDB = pickle.load(fd)
-    fd.close()
+    nodeDB = nodedb.load(f)
 
-    nodeDB.updateHierarchy()
-
-    de = CPPExporter(nodeDB, nodes)
-    de.export(sys.stdout)
+    de = CPPExporter(nodeDB, nodes, hashTables)
+    try:
+        if outputDir is None:
+            de.export(sys.stdout)
+        else:
+            numWritten, numFiles = de.exportComponents(outputDir, processes)
+            print >>sys.stderr, '%i of %i files written to %s' % \
+                  (numWritten, numFiles, outputDir)
+    except nodedb.NodeDBException, e:
+        error(str(e))
 
 if __name__ == '__main__':
     main()
@@ -24,7 +24,7 @@
 
 import sys
 import getopt
-import cPickle as pickle
+import nodedb
 
 ##########################################################################
 # DotExporter
@@ -144,11 +144,7 @@ def main():
     f = args[0]
     print >>sys.stderr, 'NodeDB file:', f
 
-    fd = open(f, 'r')
-    nodeDB = pickle.load(fd)
-    fd.close()
-
-    nodeDB.updateHierarchy()
+    nodeDB = nodedb.load(f)
 
     de = DotExporter(nodeDB, nodes)
     de.export(sys.stdout)
@@ -29,6 +29,8 @@ import nodedb
 def usage(exitCode = 0):
     print 'Usage:',sys.argv[0],'[options] <node-db-file>'
     print '-h | --help                     Print this message and exit.'
+    print '-l | --lines                    Print one node per line sorted by node type (JSON Lines),'
+    print '                                used by ndbdiff.py --stream'
     sys.exit(exitCode)
 
 def error(msg, exitCode = 1, exit = True):
@@ -40,17 +42,20 @@ def error(msg, exitCode = 1, exit = True):
 
 def main():
     try:
-        opts, args = getopt.getopt(sys.argv[1:], 'h',
-                                   ['help'])
+        opts, args = getopt.getopt(sys.argv[1:], 'hl',
+                                   ['help', 'lines'])
     except getopt.GetoptError, e:
         error(str(e), exit = False)
         usage(1)
 
     nodes = []
+    jsonLines = False
 
     for o, a in opts:
         if o in ('-h', '--help'):
             usage()
+        elif o in ('-l', '--lines'):
+            jsonLines = True
 
     if len(args) != 1:
         error('you must specify node database file')
@@ -59,7 +64,10 @@ def main():
     print >>sys.stderr, 'NodeDB file:', f
 
     ndb = nodedb.load(f)
-    print nodedb.toJSON(ndb)
+    if jsonLines:
+        nodedb.writeJSONLines(ndb, sys.stdout)
+    else:
+        print nodedb.toJSON(ndb)
 
 if __name__ == '__main__':
     main()
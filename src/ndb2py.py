@@ -29,6 +29,8 @@ import nodedb
 def usage(exitCode = 0):
     print 'Usage:',sys.argv[0],'[options] <node-db-file>'
     print '-h | --help                     Print this message and exit.'
+    print '-m | --module                   Output importable module with constant tables,'
+    print '                                load it with nodedb.loadFromPythonModule'
     sys.exit(exitCode)
 
 def error(msg, exitCode = 1, exit = True):
@@ -40,17 +42,20 @@ def error(msg, exitCode = 1, exit = True):
 
 def main():
     try:
-        opts, args = getopt.getopt(sys.argv[1:], 'h',
-                                   ['help'])
+        opts, args = getopt.getopt(sys.argv[1:], 'hm',
+                                   ['help', 'module'])
     except getopt.GetoptError, e:
         error(str(e), exit = False)
         usage(1)
 
     nodes = []
+    outputModule = False
 
     for o, a in opts:
         if o in ('-h', '--help'):
             usage()
+        elif o in ('-m', '--module'):
+            outputModule = True
 
     if len(args) != 1:
         error('you must specify node database file')
@@ -59,7 +64,10 @@ def main():
     print >>sys.stderr, 'NodeDB file:', f
 
     ndb = nodedb.load(f)
-    print ndb.toPythonCode()
+    if outputModule:
+        ndb.writePythonModule(sys.stdout)
+    else:
+        print ndb.toPythonCode()
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,118 @@
+# ndbancestry.py -- Ancestry queries of X3D Type Hierarchy
+#
+# Author: Dmitri Rubinstein <rubinstein@cs.uni-saarland.de>
+#
+# Copyright (C) 2008 Saarland University
+# Copyright (C) 2009, 2010, 2011, 2012 German Research Center for
+# Artificial Intelligence (DFKI)
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+
+import ndbhierarchy
+
+# Every node has a dense id, its index in the node list of the database.
+# Sets of nodes are integers with bit i set when node with id i is in
+# the set, so intersections and unions are single bitwise operations.
+
+class Ancestry(object):
+
+    def __init__(self, nodeDB):
+        self.nodeDB = nodeDB
+        self.nodeList = nodeDB.getNodeList()[:]
+        # node type : id
+        self.ids = {}
+        for i, node in enumerate(self.nodeList):
+            self.ids[node.getType()] = i
+        # id : bitset of all super nodes
+        self.ancestorBits = [0] * len(self.nodeList)
+        # id : bitset of all derived nodes
+        self.descendantBits = [0] * len(self.nodeList)
+
+        order = ndbhierarchy.topologicalOrder(nodeDB)
+        for node in order:
+            bits = 0
+            for n in nodeDB.getSuperNodes(node):
+                superId = self.ids[n.getType()]
+                bits |= self.ancestorBits[superId] | (1 << superId)
+            self.ancestorBits[self.ids[node.getType()]] = bits
+        order.reverse()
+        for node in order:
+            bits = 0
+            for n in nodeDB.getDerivedNodes(node):
+                derivedId = self.ids[n.getType()]
+                bits |= self.descendantBits[derivedId] | (1 << derivedId)
+            self.descendantBits[self.ids[node.getType()]] = bits
+
+    def getId(self, node):
+        return self.ids[node.getType()]
+
+    def getNode(self, id):
+        return self.nodeList[id]
+
+    def getAncestorBits(self, node):
+        return self.ancestorBits[self.ids[node.getType()]]
+
+    def getDescendantBits(self, node):
+        return self.descendantBits[self.ids[node.getType()]]
+
+    def isDerivedFrom(self, node, superNode):
+        return (self.getAncestorBits(node) >> self.getId(superNode)) & 1 == 1
+
+    def nodesFromBits(self, bits):
+        """returns list of nodes of the bitset in the order of the database"""
+        result = []
+        # bin(bits) is '0b...' with the highest bit first
+        digits = bin(bits)[:1:-1]
+        i = digits.find('1')
+        while i != -1:
+            result.append(self.nodeList[i])
+            i = digits.find('1', i + 1)
+        return result
+
+    def getBases(self, node):
+        """returns tuple (bases, virtual bases). Bases are all super nodes
+        in depth-first order, virtual bases are super nodes reachable by
+        more than one path in the order they are reached again."""
+        bases = []
+        virtualBases = []
+        visitedBits = 0
+        virtualBits = 0
+        # depth-first traversal with stack of super node iterators
+        stack = [iter(self.nodeDB.getSuperNodes(node))]
+        while stack:
+            n = next(stack[-1], None)
+            if n is None:
+                stack.pop()
+                continue
+            bit = 1 << self.ids[n.getType()]
+            if visitedBits & bit:
+                if not virtualBits & bit:
+                    virtualBits |= bit
+                    virtualBases.append(n)
+            else:
+                visitedBits |= bit
+                bases.append(n)
+                stack.append(iter(self.nodeDB.getSuperNodes(n)))
+        return bases, virtualBases
+
+    def getCommonDerivedNodes(self, nodeList):
+        """returns list of nodes derived from all nodes of nodeList in the
+        order of the database"""
+        if not nodeList:
+            return []
+        bits = self.getDescendantBits(nodeList[0])
+        for node in nodeList[1:]:
+            bits &= self.getDescendantBits(node)
+        return self.nodesFromBits(bits)
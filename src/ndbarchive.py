@@ -0,0 +1,277 @@
+#!/usr/bin/env python
+
+# ndbarchive.py -- X3D Node Database Multi-Edition Archive
+#
+# Author: Dmitri Rubinstein <rubinstein@cs.uni-saarland.de>
+#
+# Copyright (C) 2008 Saarland University
+# Copyright (C) 2009, 2010, 2011, 2012 German Research Center for
+# Artificial Intelligence (DFKI)
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+
+import sys
+import os.path
+import getopt
+import cPickle as pickle
+import nodedb
+
+ARCHIVE_FORMAT_VERSION = 1
+
+class NDBArchive(object):
+    """Archive of multiple editions of a node database. The first
+    edition is stored completely, all other editions are stored as
+    changes (see NodeDB.compare) to their parent edition.
+    """
+
+    def __init__(self):
+        # list of (name, parentName, data) tuples, data is a NodeDB for
+        # the base edition and a list of changes for all other editions
+        self.editions = []
+        # edition name : materialized NodeDB
+        self._cache = {}
+
+    def getEditionNames(self):
+        return [e[0] for e in self.editions]
+
+    def _findEdition(self, name):
+        for e in self.editions:
+            if e[0] == name:
+                return e
+        raise nodedb.NodeDBException('Unknown edition %s' % name)
+
+    def hasEdition(self, name):
+        return name in self.getEditionNames()
+
+    def getParentName(self, name):
+        return self._findEdition(name)[1]
+
+    def getChanges(self, name):
+        """returns changes to the parent edition, or None for the base
+        edition"""
+        name, parentName, data = self._findEdition(name)
+        if parentName is None:
+            return None
+        return data
+
+    def addEdition(self, name, ndb, parentName=None):
+        """adds edition to the archive, the first edition becomes the base
+        edition. Other editions are stored as changes to the parent
+        edition, by default the previously added one.
+        """
+        if self.hasEdition(name):
+            raise nodedb.NodeDBException('Edition %s is already in the' \
+                                         ' archive' % name)
+        if not self.editions:
+            if parentName is not None:
+                raise nodedb.NodeDBException('Base edition cannot have' \
+                                             ' a parent edition')
+            self.editions.append((name, None, ndb.copy()))
+            return
+
+        if parentName is None:
+            parentName = self.editions[-1][0]
+        parent = self.getEdition(parentName)
+        # changes must not reference nodes of the compared databases
+        changes = nodedb.copyChanges(parent.compare(ndb, fullDiff=True))
+        self.editions.append((name, parentName, changes))
+
+    def getEdition(self, name):
+        """returns edition reconstructed from the base edition and the
+        changes of all its ancestors. Reconstructed editions are cached
+        and shared between calls, use NodeDB.copy before modifying them.
+        """
+        ndb = self._cache.get(name)
+        if ndb is not None:
+            return ndb
+
+        # collect editions up to the base edition or a cached one
+        chain = []
+        while ndb is None:
+            edition = self._findEdition(name)
+            chain.append(edition)
+            name = edition[1]
+            if name is None:
+                break
+            ndb = self._cache.get(name)
+
+        chain.reverse()
+        if ndb is None:
+            name, parentName, base = chain.pop(0)
+            ndb = base.copy()
+            ndb.updateHierarchy()
+            self._cache[name] = ndb
+
+        if chain:
+            # changes of the whole chain are applied to a single copy,
+            # intermediate editions are not materialized
+            ndb = ndb.copy()
+            for name, parentName, changes in chain:
+                ndb.applyChanges(changes, updateHierarchy=False)
+            ndb.updateHierarchy()
+            self._cache[name] = ndb
+
+        return ndb
+
+    def clearCache(self):
+        self._cache = {}
+
+    def save(self, filename, codec=None):
+        if getattr(filename, 'write', None) is not None:
+            fd = filename
+            closeFile = False
+        else:
+            fd = open(filename, 'wb')
+            closeFile = True
+
+        try:
+            # Note: the archive class itself is not pickled, so archives
+            # written by the ndbarchive.py script can be loaded by
+            # other modules
+            out = nodedb.openCompressedWriter(fd, codec)
+            pickle.dump({'version' : ARCHIVE_FORMAT_VERSION,
+                         'editions' : self.editions},
+                        out, pickle.HIGHEST_PROTOCOL)
+            if out is not fd:
+                out.close()
+        finally:
+            if closeFile:
+                fd.close()
+
+def loadArchive(filename):
+    if (getattr(filename, 'read', None) is not None and \
+        getattr(filename, 'readline', None) is not None):
+        fd = filename
+        closeFile = False
+    else:
+        fd = open(filename, 'rb')
+        closeFile = True
+
+    try:
+        state = pickle.load(nodedb.openDecompressedReader(fd))
+    finally:
+        if closeFile:
+            fd.close()
+
+    if not isinstance(state, dict) or 'editions' not in state:
+        raise nodedb.NodeDBException('File does not contain a NodeDB archive')
+    if state.get('version') != ARCHIVE_FORMAT_VERSION:
+        raise nodedb.NodeDBException('Unsupported archive version %s' % \
+                                     repr(state.get('version')))
+    archive = NDBArchive()
+    archive.editions = state['editions']
+    return archive
+
+def usage(exitCode = 0):
+    print 'Usage:',sys.argv[0],'[options] <archive-file> [[name=]<node-db-file> ...]'
+    print '-h | --help                     Print this message and exit.'
+    print '-c | --create                   Create archive from the node database files,'
+    print '                                every file is stored as changes to the previous one.'
+    print '                                Edition name is the file name without extension'
+    print '                                unless specified.'
+    print '-a | --add                      Add node database files to an existing archive'
+    print '-l | --list                     List editions stored in the archive'
+    print '-x | --extract name             Write edition to stdout'
+    print '-z | --codec name               Compress output with the specified codec (%s)' % \
+          ', '.join(nodedb.getCodecNames())
+    sys.exit(exitCode)
+
+def error(msg, exitCode = 1, exit = True):
+    sys.stderr.write('Error: ')
+    sys.stderr.write(msg)
+    sys.stderr.write('\n')
+    if exit:
+        sys.exit(exitCode)
+
+def main():
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], 'hcalx:z:',
+                                   ['help', 'create', 'add', 'list',
+                                    'extract=', 'codec='])
+    except getopt.GetoptError, e:
+        error(str(e), exit = False)
+        usage(1)
+
+    createArchive = False
+    addEditions = False
+    listEditions = False
+    extractEditions = []
+    codec = None
+
+    for o, a in opts:
+        if o in ('-h', '--help'):
+            usage()
+        elif o in ('-c', '--create'):
+            createArchive = True
+        elif o in ('-a', '--add'):
+            addEditions = True
+        elif o in ('-l', '--list'):
+            listEditions = True
+        elif o in ('-x', '--extract'):
+            extractEditions.append(a)
+        elif o in ('-z', '--codec'):
+            codec = a
+
+    if len(args) < 1:
+        error('you must specify archive file')
+
+    if codec is not None and codec != 'none' and \
+       codec not in nodedb.getCodecNames():
+        error('unknown compression codec %s' % codec)
+
+    archiveFile = args[0]
+    editionFiles = []
+    for arg in args[1:]:
+        if '=' in arg:
+            name, f = arg.split('=', 1)
+        else:
+            f = arg
+            name = os.path.splitext(os.path.basename(f))[0]
+        editionFiles.append((name, f))
+
+    if createArchive or addEditions:
+        if not editionFiles:
+            error('you must specify node database files')
+        if createArchive:
+            archive = NDBArchive()
+        else:
+            archive = loadArchive(archiveFile)
+        for name, f in editionFiles:
+            print >>sys.stderr, 'NodeDB file:', f
+            archive.addEdition(name, nodedb.load(f))
+        archive.save(archiveFile, codec)
+    else:
+        archive = loadArchive(archiveFile)
+
+    if listEditions:
+        for name in archive.getEditionNames():
+            parentName = archive.getParentName(name)
+            if parentName is None:
+                print '%s (base edition, %i nodes)' % \
+                      (name, len(archive.getEdition(name).getNodeList()))
+            else:
+                print '%s (parent %s, %i changes)' % \
+                      (name, parentName, len(archive.getChanges(name)))
+
+    if len(extractEditions) > 1:
+        error('only a single edition can be extracted')
+
+    for name in extractEditions:
+        if not archive.hasEdition(name):
+            error('unknown edition %s' % name)
+        archive.getEdition(name).save(sys.stdout, codec)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,688 @@
+#!/usr/bin/env python
+
+# ndbcheck.py -- Consistency checks of X3D Type Hierarchy
+#
+# Author: Dmitri Rubinstein <rubinstein@cs.uni-saarland.de>
+#
+# Copyright (C) 2008 Saarland University
+# Copyright (C) 2009, 2010, 2011, 2012 German Research Center for
+# Artificial Intelligence (DFKI)
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+
+import sys
+import os.path
+import getopt
+import imp
+import json
+import hashlib
+import cPickle as pickle
+import multiprocessing
+import nodedb
+import ndbhierarchy
+
+# Checks are done by rules registered with registerRule. Node rules are
+# called once for every checked node and can be run in worker processes,
+# database rules are called once for the whole database. Every rule gets
+# a CheckContext with data computed once per database.
+#
+# Custom rules are defined in Python modules which call registerRule when
+# imported, see loadRuleModule.
+#
+# Findings of node rules can be cached (see CheckCache). The findings of
+# a node are reused while the fingerprints of the node and its super
+# nodes, the field order of the node and the ruleset key are unchanged.
+# The ruleset key contains names and versions of the rules and their
+# database keys, rules depending on other parts of the database than the
+# checked node and its super nodes must return them in getDatabaseKey.
+
+# severities
+
+INFO    = 0
+WARNING = 1
+ERROR   = 2
+
+severityNames = ['info', 'warning', 'error']
+
+class Finding(object):
+
+    def __init__(self, ruleName, severity, nodeType, fieldName, messages):
+        self.ruleName = ruleName
+        self.severity = severity
+        self.nodeType = nodeType
+        # None when the finding is not about a single field
+        self.fieldName = fieldName
+        # list of text lines
+        self.messages = messages
+
+    def getSeverityName(self):
+        return severityNames[self.severity]
+
+    def toJSONObject(self):
+        return {'rule' : self.ruleName,
+                'severity' : self.getSeverityName(),
+                'node' : self.nodeType,
+                'field' : self.fieldName,
+                'messages' : self.messages}
+
+    def __str__(self):
+        lines = self.messages[:]
+        if self.severity != ERROR:
+            lines[0] = '%s: %s' % (self.getSeverityName().capitalize(),
+                                   lines[0])
+        return '\n'.join(lines)
+
+def findingsToJSON(findings):
+    return json.dumps([f.toJSONObject() for f in findings],
+                      sort_keys=True, indent=4)
+
+class Rule(object):
+    """base class of rules, derived classes set name, severity and
+    description and implement checkNode or checkDatabase"""
+
+    name = None
+    severity = ERROR
+    description = ''
+    # must be incremented when the rule is changed
+    version = 1
+
+    def finding(self, node, field, *messages):
+        fieldName = None
+        if field is not None:
+            fieldName = field.getName()
+        return Finding(self.name, self.severity, node.getType(), fieldName,
+                       list(messages))
+
+    def checkNode(self, context, node):
+        """returns list of findings of node"""
+        return []
+
+    def checkDatabase(self, context):
+        """returns list of findings of the whole database"""
+        return []
+
+    def getDatabaseKey(self, context):
+        """returns string describing data outside of the checked node and
+        its super nodes used by checkNode"""
+        return ''
+
+# rule name : rule
+rules = {}
+# rule names in the order of registration
+ruleNames = []
+
+def registerRule(rule):
+    """registers rule, replaces registered rule with the same name"""
+    if rule.name not in rules:
+        ruleNames.append(rule.name)
+    rules[rule.name] = rule
+
+def getRule(name):
+    rule = rules.get(name)
+    if rule is None:
+        raise nodedb.NodeDBException('Unknown check rule %s' % name)
+    return rule
+
+def getRules():
+    return [rules[name] for name in ruleNames]
+
+def loadRuleModule(name):
+    """imports module with custom rules, name is a module name or
+    a path of a Python file"""
+    if name.endswith('.py') or os.path.sep in name:
+        moduleName = os.path.splitext(os.path.basename(name))[0]
+        return imp.load_source(moduleName, name)
+    return __import__(name)
+
+class CheckContext(object):
+    """data shared by all rules, computed once per database"""
+
+    def __init__(self, nodeDB):
+        self.nodeDB = nodeDB
+        self.topologicalOrder = ndbhierarchy.topologicalOrder(nodeDB)
+        # node type : dictionary ancestor node type : True
+        self.ancestors = {}
+        # node type : dictionary field name : (field, declaring node)
+        # of all fields of the super nodes
+        self.inheritedFields = {}
+        # node type : dictionary field name : (field, declaring node)
+        fieldDicts = {}
+
+        for node in self.topologicalOrder:
+            superNodes = nodeDB.getSuperNodes(node)
+            if len(superNodes) == 1:
+                superType = superNodes[0].getType()
+                ancestors = self.ancestors[superType].copy()
+                ancestors[superType] = True
+                inheritedFields = fieldDicts[superType]
+            else:
+                ancestors = {}
+                inheritedFields = {}
+                # fields of the first super nodes take precedence
+                for n in reversed(superNodes):
+                    ancestors.update(self.ancestors[n.getType()])
+                    ancestors[n.getType()] = True
+                    inheritedFields.update(fieldDicts[n.getType()])
+            self.ancestors[node.getType()] = ancestors
+            self.inheritedFields[node.getType()] = inheritedFields
+
+            ownFields = [f for f in node.getFields()
+                         if f.getName() not in inheritedFields]
+            if ownFields:
+                fieldDict = inheritedFields.copy()
+                for f in ownFields:
+                    fieldDict[f.getName()] = (f, node)
+            else:
+                fieldDict = inheritedFields
+            fieldDicts[node.getType()] = fieldDict
+
+        # True when the database is prepared for XML parsing
+        self.hasContainerFields = \
+            len(nodeDB.index.getFieldsByName('containerField')) > 0
+
+        self.fieldTables = None
+
+    def getAncestorTypes(self, nodeType):
+        """returns dictionary with types of all super nodes of the node"""
+        return self.ancestors[nodeType]
+
+    def isDerivedFrom(self, nodeType, superType):
+        return superType in self.ancestors[nodeType]
+
+    def getInheritedFields(self, nodeType):
+        """returns dictionary field name : (field, declaring node) of all
+        fields of the super nodes"""
+        return self.inheritedFields[nodeType]
+
+    def getOwnFields(self, node):
+        """returns fields of node not declared in its super nodes"""
+        inheritedFields = self.inheritedFields[node.getType()]
+        return [f for f in node.getFields()
+                if f.getName() not in inheritedFields]
+
+    def getFieldTable(self, nodeType):
+        """returns resolved field table of the node,
+        see ndbhierarchy.resolveFieldTables"""
+        if self.fieldTables is None:
+            self.fieldTables = ndbhierarchy.resolveFieldTables(self.nodeDB)
+        return self.fieldTables[nodeType]
+
+# Built-in rules
+
+def equalFields(f1, f2):
+    return f1.type == f2.type and \
+           f1.accessType == f2.accessType and \
+           f1.name == f2.name
+
+class InheritedFieldRule(Rule):
+
+    name = 'inherited-field'
+    description = 'fields of super nodes are declared equally in the node'
+
+    def checkNode(self, context, node):
+        findings = []
+        inheritedFields = context.getInheritedFields(node.getType())
+        fieldNames = inheritedFields.keys()
+        fieldNames.sort()
+        for fieldName in fieldNames:
+            superField, superNode = inheritedFields[fieldName]
+            f = node.findField(fieldName)
+            if f is None:
+                findings.append(self.finding(node, superField, 'Field %s declared in the node "%s" is not declared in node "%s"' % (fieldName, superNode.getType(), node.getType())))
+            elif not equalFields(f, superField):
+                findings.append(self.finding(node, f, 'Field %s defined in the node "%s" differ to the declaration in node "%s"' % (fieldName, superNode.getType(), node.getType()),
+                                             '  in %s : %s' % (superNode.getType(), superField),
+                                             '  in %s : %s' % (node.getType(), f)))
+        return findings
+
+class ValidValueTypesRule(Rule):
+
+    name = 'valid-value-types'
+    description = 'valid value types of SFNode/MFNode fields are known node types'
+
+    def checkNode(self, context, node):
+        findings = []
+        for field in context.getOwnFields(node):
+            if field.getType() in ('SFNode', 'MFNode'):
+                for valueType in field.getValidValueTypes():
+                    if not context.nodeDB.getNode(valueType):
+                        findings.append(self.finding(node, field, 'Field %s defined in the node "%s" refer to unknown node type "%s" in the valid node type list' % (field.getName(), node.getType(), valueType)))
+        return findings
+
+    def getDatabaseKey(self, context):
+        nodeTypes = [n.getType() for n in context.nodeDB.getNodeList()]
+        nodeTypes.sort()
+        return ','.join(nodeTypes)
+
+class EnumFieldRule(Rule):
+
+    name = 'enum-field'
+    description = '@enum annotation is used only on SFInt32/MFInt32 fields'
+
+    def checkNode(self, context, node):
+        findings = []
+        for field in context.getOwnFields(node):
+            if field.getAnnotations().getAnnotation('enum') and \
+               field.getType() not in ('SFInt32', 'MFInt32'):
+                findings.append(self.finding(node, field, 'Field %s defined in the node "%s" has @enum annotation but type %s' % (field.getName(), node.getType(), field.getType())))
+        return findings
+
+class NodeDefaultRule(Rule):
+
+    name = 'sfnode-default'
+    description = 'default value of SFNode fields is NULL'
+
+    def checkNode(self, context, node):
+        findings = []
+        for field in context.getOwnFields(node):
+            if field.getType() != 'SFNode' or \
+               field.getAccessType() not in (nodedb.INITIALIZE_ONLY,
+                                             nodedb.INPUT_OUTPUT):
+                continue
+            value = field.getValue()
+            if value is None or nodedb.normalizeVRMLValue(value) != 'NULL':
+                findings.append(self.finding(node, field, 'Field %s defined in the node "%s" has default value %s instead of NULL' % (field.getName(), node.getType(), value)))
+        return findings
+
+class ContainerFieldRule(Rule):
+    """only databases prepared for XML parsing (see x3dfix.py) contain
+    containerField fields, other databases are not checked"""
+
+    name = 'container-field'
+    severity = WARNING
+    description = 'non-abstract nodes declare containerField field'
+
+    def checkNode(self, context, node):
+        if node.isAbstract() or node.findField('containerField'):
+            return []
+        if not context.hasContainerFields:
+            return []
+        return [self.finding(node, None, 'Node "%s" does not declare containerField field' % node.getType())]
+
+    def getDatabaseKey(self, context):
+        return str(context.hasContainerFields)
+
+class EncodingIdRule(Rule):
+
+    name = 'encoding-id'
+    description = 'encodingId attributes of nodes and @encodingId annotations of fields of a node are unique'
+
+    def checkNode(self, context, node):
+        findings = []
+        # encoding id : field name
+        fieldIds = {}
+        for field in node.getFields():
+            annot = field.getAnnotations().getAnnotation('encodingId')
+            if not annot or not annot.getValueList():
+                continue
+            encodingId = annot.getValueList()[0]
+            if encodingId in fieldIds:
+                findings.append(self.finding(node, field, 'Field %s of the node "%s" uses encodingId %s of field %s' % (field.getName(), node.getType(), encodingId, fieldIds[encodingId])))
+            else:
+                fieldIds[encodingId] = field.getName()
+        return findings
+
+    def checkDatabase(self, context):
+        findings = []
+        # encoding id : node type
+        nodeIds = {}
+        for node in context.nodeDB.getNodeList():
+            encodingId = node.getAttribute('encodingId')
+            if encodingId is None:
+                continue
+            if encodingId in nodeIds:
+                findings.append(self.finding(node, None, 'Node "%s" uses encodingId %s of node "%s"' % (node.getType(), encodingId, nodeIds[encodingId])))
+            else:
+                nodeIds[encodingId] = node.getType()
+        return findings
+
+registerRule(InheritedFieldRule())
+registerRule(ValidValueTypesRule())
+registerRule(EnumFieldRule())
+registerRule(NodeDefaultRule())
+registerRule(ContainerFieldRule())
+registerRule(EncodingIdRule())
+
+def checkNodes(context, checkRules, nodeTypes):
+    """returns list of tuples (node type, findings of node rules)"""
+    result = []
+    for nodeType in nodeTypes:
+        node = context.nodeDB.getNode(nodeType)
+        findings = []
+        for rule in checkRules:
+            findings.extend(rule.checkNode(context, node))
+        result.append((nodeType, findings))
+    return result
+
+# state of worker processes
+workerContext = None
+workerRules = None
+
+def initWorker(nodeDB, names, ruleModules):
+    global workerContext, workerRules
+    for m in ruleModules:
+        loadRuleModule(m)
+    workerContext = CheckContext(nodeDB)
+    workerRules = map(getRule, names)
+
+def checkNodesInWorker(nodeTypes):
+    return checkNodes(workerContext, workerRules, nodeTypes)
+
+# Check cache
+
+CHECK_CACHE_VERSION = 1
+
+def getRulesetKey(context, checkRules):
+    return hashlib.md5(repr([(r.name, r.version, r.getDatabaseKey(context))
+                             for r in checkRules])).digest()
+
+def getNodeKeys(context):
+    """returns dictionary node type : key of the node and its super nodes"""
+    keys = {}
+    for node in context.topologicalOrder:
+        h = hashlib.md5(node.getFingerprint())
+        h.update('\0'.join([f.getName() for f in node.getFields()]))
+        for n in context.nodeDB.getSuperNodes(node):
+            h.update(keys[n.getType()])
+        keys[node.getType()] = h.digest()
+    return keys
+
+def getCheckCacheFileName(nodeDBFileName):
+    return nodeDBFileName + '.checkcache'
+
+class CheckCache(object):
+    """findings of node rules of every node stored in a file, the file
+    is ignored when it cannot be read or was written for another ruleset"""
+
+    def __init__(self, fileName, rulesetKey):
+        self.fileName = fileName
+        self.rulesetKey = rulesetKey
+        # node type : (node key, list of finding tuples)
+        self.nodes = {}
+        self.modified = False
+        try:
+            fd = open(fileName, 'rb')
+        except IOError:
+            return
+        try:
+            try:
+                data = pickle.load(fd)
+            except Exception:
+                return
+        finally:
+            fd.close()
+        if isinstance(data, dict) and \
+           data.get('version') == CHECK_CACHE_VERSION and \
+           data.get('ruleset') == rulesetKey:
+            self.nodes = data['nodes']
+
+    def getFindings(self, nodeType, nodeKey):
+        """returns cached findings or None"""
+        entry = self.nodes.get(nodeType)
+        if entry is None or entry[0] != nodeKey:
+            return None
+        return [Finding(*f) for f in entry[1]]
+
+    def setFindings(self, nodeType, nodeKey, findings):
+        self.nodes[nodeType] = (nodeKey,
+                                [(f.ruleName, f.severity, f.nodeType,
+                                  f.fieldName, f.messages) for f in findings])
+        self.modified = True
+
+    def removeUnknownNodes(self, nodeKeys):
+        for nodeType in self.nodes.keys():
+            if nodeType not in nodeKeys:
+                del self.nodes[nodeType]
+                self.modified = True
+
+    def save(self):
+        """writes cache file when it was modified, raises NodeDBException
+        when it cannot be written"""
+        if not self.modified:
+            return
+        try:
+            fd = open(self.fileName, 'wb')
+            try:
+                pickle.dump({'version' : CHECK_CACHE_VERSION,
+                             'ruleset' : self.rulesetKey,
+                             'nodes' : self.nodes}, fd, 2)
+            finally:
+                fd.close()
+        except (IOError, OSError), e:
+            raise nodedb.NodeDBException('Cannot write check cache %s: %s' % \
+                                         (self.fileName, e))
+        self.modified = False
+
+def checkNodeDB(nodeDB, nodeList=None, checkRules=None, processes=None,
+                ruleModules=[], cacheFile=None):
+    """returns list of findings of nodes of nodeList and their super nodes
+    (by default of all nodes) sorted in the order of the database.
+
+    checkRules is a list of rules (by default all registered rules). Node
+    rules are run by processes worker processes (by default number of
+    CPUs), which import ruleModules before checking. When cacheFile is
+    specified node rules are run only for nodes without cached findings,
+    NodeDBException is raised when the cache file cannot be written.
+    """
+    if checkRules is None:
+        checkRules = getRules()
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+
+    context = CheckContext(nodeDB)
+
+    # node type : True
+    checkedNodes = {}
+    if nodeList is None:
+        nodeList = nodeDB.getNodeList()
+    pending = list(nodeList)
+    while pending:
+        node = pending.pop()
+        if node.getType() not in checkedNodes:
+            checkedNodes[node.getType()] = True
+            pending.extend(node.getSuperNodes())
+    nodeTypes = [n.getType() for n in nodeDB.getNodeList()
+                 if n.getType() in checkedNodes]
+
+    findings = []
+    uncheckedTypes = nodeTypes
+    if cacheFile is not None:
+        cache = CheckCache(cacheFile, getRulesetKey(context, checkRules))
+        nodeKeys = getNodeKeys(context)
+        cache.removeUnknownNodes(nodeKeys)
+        uncheckedTypes = []
+        for nodeType in nodeTypes:
+            cachedFindings = cache.getFindings(nodeType, nodeKeys[nodeType])
+            if cachedFindings is None:
+                uncheckedTypes.append(nodeType)
+            else:
+                findings.extend(cachedFindings)
+
+    if processes == 1 or len(uncheckedTypes) < 2:
+        results = checkNodes(context, checkRules, uncheckedTypes)
+    else:
+        numParts = min(processes * 4, len(uncheckedTypes))
+        parts = [uncheckedTypes[i::numParts] for i in xrange(numParts)]
+        pool = multiprocessing.Pool(processes, initWorker,
+                                    (nodeDB, [r.name for r in checkRules],
+                                     ruleModules))
+        try:
+            results = []
+            for part in pool.map(checkNodesInWorker, parts):
+                results.extend(part)
+        finally:
+            pool.close()
+            pool.join()
+
+    for nodeType, nodeFindings in results:
+        findings.extend(nodeFindings)
+        if cacheFile is not None:
+            cache.setFindings(nodeType, nodeKeys[nodeType], nodeFindings)
+    if cacheFile is not None:
+        cache.save()
+
+    for rule in checkRules:
+        findings.extend([f for f in rule.checkDatabase(context)
+                         if f.nodeType in checkedNodes])
+
+    # sort by node order, then by rule order
+    nodeIndex = {}
+    for i, nodeType in enumerate(nodeTypes):
+        nodeIndex[nodeType] = i
+    ruleIndex = {}
+    for i, rule in enumerate(checkRules):
+        ruleIndex[rule.name] = i
+    result = [(nodeIndex[f.nodeType], ruleIndex[f.ruleName], i, f)
+              for i, f in enumerate(findings)]
+    result.sort()
+    return [r[3] for r in result]
+
+def groupFindings(findings):
+    """returns list of tuples (node type, findings of the node)"""
+    result = []
+    for f in findings:
+        if not result or result[-1][0] != f.nodeType:
+            result.append((f.nodeType, []))
+        result[-1][1].append(f)
+    return result
+
+def usage(exitCode = 0):
+    print 'Usage:',sys.argv[0],'[options] node-db-file'
+    print '-h | --help                     Print this message and exit.'
+    print '-n | --node-types list          Check only specified node types and their super'
+    print '                                types, list is separated by commas'
+    print '-r | --rules module             Load custom rules from module or Python file'
+    print '                                (can be specified multiple times)'
+    print '-s | --select list              Run only specified rules, list is separated by commas'
+    print '-p | --processes n              Number of worker processes (default: number of CPUs)'
+    print '-j | --json                     Print findings in JSON format'
+    print '-l | --list-rules               Print list of rules and exit'
+    print '--cache                         Cache findings in file <node-db-file>.checkcache'
+    print '--cache-file file               Cache findings in the specified file'
+    print 'Exit status is 1 when errors were found.'
+    sys.exit(exitCode)
+
+def error(msg, exitCode = 2, exit = True):
+    sys.stderr.write('Error: ')
+    sys.stderr.write(msg)
+    sys.stderr.write('\n')
+    if exit:
+        sys.exit(exitCode)
+
+def main():
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], 'hn:r:s:p:jl',
+                                   ['help', 'node-types=', 'rules=',
+                                    'select=', 'processes=', 'json',
+                                    'list-rules', 'cache', 'cache-file='])
+    except getopt.GetoptError, e:
+        error(str(e), exit = False)
+        usage(2)
+
+    nodeTypes = None
+    ruleModules = []
+    selectedRules = None
+    processes = None
+    printJSON = False
+    listRules = False
+    cacheFile = None
+    useCache = False
+
+    for o, a in opts:
+        if o in ('-h', '--help'):
+            usage()
+        elif o in ('-n', '--node-types'):
+            nodeTypes = a.split(',')
+        elif o in ('-r', '--rules'):
+            ruleModules.append(a)
+        elif o in ('-s', '--select'):
+            selectedRules = a.split(',')
+        elif o in ('-p', '--processes'):
+            try:
+                processes = int(a)
+            except ValueError:
+                processes = 0
+            if processes < 1:
+                error('invalid number of processes %s' % a)
+        elif o in ('-j', '--json'):
+            printJSON = True
+        elif o in ('-l', '--list-rules'):
+            listRules = True
+        elif o == '--cache':
+            useCache = True
+        elif o == '--cache-file':
+            cacheFile = a
+
+    for m in ruleModules:
+        try:
+            loadRuleModule(m)
+        except (ImportError, IOError), e:
+            error('cannot load rule module %s: %s' % (m, e))
+
+    if selectedRules is None:
+        checkRules = getRules()
+    else:
+        try:
+            checkRules = map(getRule, selectedRules)
+        except nodedb.NodeDBException, e:
+            error(str(e))
+
+    if listRules:
+        for rule in checkRules:
+            print '%-20s %-8s %s' % (rule.name, severityNames[rule.severity],
+                                     rule.description)
+        sys.exit(0)
+
+    if len(args) != 1:
+        error('you must specify node database file')
+
+    f = args[0]
+    print >>sys.stderr, 'NodeDB file:', f
+    nodeDB = nodedb.load(f)
+
+    nodeList = None
+    if nodeTypes is not None:
+        nodeList = []
+        for nt in nodeTypes:
+            node = nodeDB.getNode(nt)
+            if node:
+                nodeList.append(node)
+            else:
+                print >>sys.stderr, 'Unknown node "%s"' % nt
+
+    if useCache and cacheFile is None:
+        cacheFile = getCheckCacheFileName(f)
+    try:
+        findings = checkNodeDB(nodeDB, nodeList, checkRules, processes,
+                               ruleModules, cacheFile)
+    except nodedb.NodeDBException, e:
+        error(str(e))
+
+    if printJSON:
+        print findingsToJSON(findings)
+    else:
+        for nodeType, nodeFindings in groupFindings(findings):
+            print '=== Node %s ===' % nodeType
+            for f in nodeFindings:
+                print '[%s] %s' % (f.ruleName, f)
+
+    for f in findings:
+        if f.severity == ERROR:
+            sys.exit(1)
+
+if __name__ == '__main__':
+    # rule modules register their rules in this module
+    sys.modules['ndbcheck'] = sys.modules['__main__']
+    main()
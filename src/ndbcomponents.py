@@ -0,0 +1,303 @@
+#!/usr/bin/env python
+
+# ndbcomponents.py -- Components of X3D Type Hierarchy
+#
+# Author: Dmitri Rubinstein <rubinstein@cs.uni-saarland.de>
+#
+# Copyright (C) 2008 Saarland University
+# Copyright (C) 2009, 2010, 2011, 2012 German Research Center for
+# Artificial Intelligence (DFKI)
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+
+import sys
+import getopt
+import json
+import nodedb
+
+# A component depends on another component when one of its nodes is
+# derived from a node of the other component or declares a field whose
+# valid value types contain a node of the other component.
+
+class Dependency(object):
+    """reason of a dependency: node of the dependent component and field
+    (None for super types) referencing node type of the other component"""
+
+    def __init__(self, nodeType, fieldName, referencedType):
+        self.nodeType = nodeType
+        self.fieldName = fieldName
+        self.referencedType = referencedType
+
+    def toJSONObject(self):
+        return {'node' : self.nodeType, 'field' : self.fieldName,
+                'references' : self.referencedType}
+
+    def __str__(self):
+        if self.fieldName is None:
+            return '%s derives %s' % (self.nodeType, self.referencedType)
+        return '%s.%s accepts %s' % (self.nodeType, self.fieldName,
+                                     self.referencedType)
+
+class ComponentIndex(object):
+    """nodes of every component and dependencies between components.
+    Components are ordered by their first node in the database, nodes of
+    a component in the order of the database."""
+
+    def __init__(self, nodeDB):
+        self.nodeDB = nodeDB
+        self.componentNames = []
+        # component name : list of nodes
+        self.nodesOfComponent = {}
+        # node type : position in the database
+        self.nodeOrder = {}
+        # component name : {component name : list of Dependency}
+        self.dependencies = {}
+
+        for node in nodeDB.getNodeList():
+            componentName = node.getComponentName()
+            self.nodeOrder[node.getType()] = len(self.nodeOrder)
+            nodes = self.nodesOfComponent.get(componentName)
+            if nodes is None:
+                self.componentNames.append(componentName)
+                self.nodesOfComponent[componentName] = nodes = []
+                self.dependencies[componentName] = {}
+            nodes.append(node)
+
+        for node in nodeDB.getNodeList():
+            for superType in node.getSuperTypes():
+                self._addDependency(node, None, superType)
+
+        # fields are found in the valid value type index of the database,
+        # inherited fields are dependencies of the declaring node only
+        for valueType in nodeDB.index.getValues('validValueType'):
+            if nodeDB.getNode(valueType) is None:
+                continue
+            for node, field in nodeDB.index.getFieldsByValidValueType(
+                    valueType):
+                if nodedb.containsObject(field.getDeclarationNodes(), node):
+                    self._addDependency(node, field.getName(), valueType)
+
+        # node type : {field name : position in the node}
+        fieldOrders = {}
+        for componentName in self.componentNames:
+            for dependencies in self.dependencies[componentName].values():
+                dependencies.sort(key=lambda d: self._getDependencyKey(
+                    d, fieldOrders))
+
+    def _addDependency(self, node, fieldName, referencedType):
+        referencedNode = self.nodeDB.getNode(referencedType)
+        if referencedNode is None:
+            return
+        componentName = node.getComponentName()
+        otherName = referencedNode.getComponentName()
+        if componentName == otherName:
+            return
+        self.dependencies[componentName].setdefault(otherName, []).append(
+            Dependency(node.getType(), fieldName, referencedType))
+
+    def _getDependencyKey(self, dependency, fieldOrders):
+        """super types first, then fields in the order of the node"""
+        fieldIndex = -1
+        if dependency.fieldName is not None:
+            fieldOrder = fieldOrders.get(dependency.nodeType)
+            if fieldOrder is None:
+                fieldOrder = fieldOrders[dependency.nodeType] = {}
+                node = self.nodeDB.getNode(dependency.nodeType)
+                for i, field in enumerate(node.getFields()):
+                    fieldOrder[field.getName()] = i
+            fieldIndex = fieldOrder[dependency.fieldName]
+        return (self.nodeOrder[dependency.nodeType], fieldIndex)
+
+    def getComponentNames(self):
+        return self.componentNames
+
+    def hasComponent(self, componentName):
+        return componentName in self.nodesOfComponent
+
+    def getNodes(self, componentName):
+        return self.nodesOfComponent.get(componentName, [])
+
+    def getNodesOfComponents(self, componentNames):
+        """returns nodes of all components in the order of the database"""
+        nodes = []
+        for componentName in self.sortComponentNames(componentNames):
+            nodes.extend(self.getNodes(componentName))
+        if len(componentNames) > 1:
+            nodes.sort(key=lambda n: self.nodeOrder[n.getType()])
+        return nodes
+
+    def sortComponentNames(self, componentNames):
+        """returns known component names of componentNames without
+        duplicates in the order of components"""
+        return [c for c in self.componentNames if c in componentNames]
+
+    def getDependencies(self, componentName):
+        """returns names of components componentName depends on"""
+        return self.sortComponentNames(self.dependencies[componentName])
+
+    def getDependents(self, componentName):
+        """returns names of components depending on componentName"""
+        return [c for c in self.componentNames
+                if componentName in self.dependencies[c]]
+
+    def getDependencyReasons(self, componentName, otherName):
+        """returns list of Dependency objects of componentName on
+        otherName"""
+        return self.dependencies[componentName].get(otherName, [])
+
+    def getRequiredComponents(self, componentNames):
+        """returns names of components of componentNames and all
+        components they depend on directly or indirectly"""
+        required = {}
+        pending = list(componentNames)
+        while pending:
+            componentName = pending.pop()
+            if componentName not in required:
+                required[componentName] = True
+                pending.extend(self.dependencies[componentName].keys())
+        return self.sortComponentNames(required)
+
+    def toJSONObject(self, componentNames=None):
+        if componentNames is None:
+            componentNames = self.componentNames
+        components = []
+        for componentName in componentNames:
+            dependencies = []
+            for otherName in self.getDependencies(componentName):
+                dependencies.append(
+                    {'component' : otherName,
+                     'reasons' : [d.toJSONObject() for d in
+                                  self.getDependencyReasons(componentName,
+                                                            otherName)]})
+            components.append(
+                {'name' : componentName,
+                 'nodes' : [n.getType() for n in self.getNodes(componentName)],
+                 'dependencies' : dependencies})
+        return {'components' : components}
+
+    def writeText(self, out, componentNames=None, printNodes=False,
+                  printReasons=False):
+        """writes line 'component : dependencies' for every component,
+        followed by lines of nodes and dependency reasons"""
+        if componentNames is None:
+            componentNames = self.componentNames
+        for componentName in componentNames:
+            dependencies = self.getDependencies(componentName)
+            if dependencies:
+                print >>out, '%s : %s' % (componentName,
+                                          ', '.join(map(str, dependencies)))
+            else:
+                print >>out, componentName
+            if printNodes:
+                for node in self.getNodes(componentName):
+                    print >>out, '    %s' % node.getType()
+            if printReasons:
+                for otherName in dependencies:
+                    for d in self.getDependencyReasons(componentName,
+                                                       otherName):
+                        print >>out, '    %s: %s' % (otherName, d)
+
+    def writeDOT(self, out, componentNames=None):
+        """writes graph with edges from components to their dependencies,
+        labeled with the number of reasons"""
+        if componentNames is None:
+            componentNames = self.componentNames
+        print >>out, 'digraph components {'
+        for componentName in componentNames:
+            print >>out, '"%s" [ label="%s\\n%i nodes" ];' % \
+                  (componentName, componentName,
+                   len(self.getNodes(componentName)))
+        for componentName in componentNames:
+            for otherName in self.getDependencies(componentName):
+                print >>out, '"%s" -> "%s" [ label="%i" ];' % \
+                      (componentName, otherName,
+                       len(self.getDependencyReasons(componentName,
+                                                     otherName)))
+        print >>out, '}'
+
+def usage(exitCode = 0):
+    print 'Usage:',sys.argv[0],'[options] <node-db-file>'
+    print '-h | --help                     Print this message and exit.'
+    print '-c | --components list          Output only components of list separated by commas'
+    print '                                and all components they depend on'
+    print '-n | --nodes                    Print nodes of every component'
+    print '-r | --reasons                  Print nodes and fields causing dependencies'
+    print '-j | --json                     Print components in JSON format'
+    print '--dot                           Print dependency graph in Graphviz DOT format'
+    print 'Prints line "component : components it depends on" for every component.'
+    sys.exit(exitCode)
+
+def error(msg, exitCode = 1, exit = True):
+    sys.stderr.write('Error: ')
+    sys.stderr.write(msg)
+    sys.stderr.write('\n')
+    if exit:
+        sys.exit(exitCode)
+
+def main():
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], 'hc:nrj',
+                                   ['help', 'components=', 'nodes',
+                                    'reasons', 'json', 'dot'])
+    except getopt.GetoptError, e:
+        error(str(e), exit = False)
+        usage(1)
+
+    componentNames = None
+    printNodes = False
+    printReasons = False
+    outputFormat = 'text'
+
+    for o, a in opts:
+        if o in ('-h', '--help'):
+            usage()
+        elif o in ('-c', '--components'):
+            if componentNames is None:
+                componentNames = []
+            componentNames.extend(a.split(','))
+        elif o in ('-n', '--nodes'):
+            printNodes = True
+        elif o in ('-r', '--reasons'):
+            printReasons = True
+        elif o in ('-j', '--json'):
+            outputFormat = 'json'
+        elif o == '--dot':
+            outputFormat = 'dot'
+
+    if len(args) != 1:
+        error('you must specify node database file')
+
+    f = args[0]
+    print >>sys.stderr, 'NodeDB file:', f
+
+    nodeDB = nodedb.load(f)
+    index = ComponentIndex(nodeDB)
+
+    if componentNames is not None:
+        for componentName in componentNames:
+            if not index.hasComponent(componentName):
+                error('unknown component %s' % componentName)
+        componentNames = index.getRequiredComponents(componentNames)
+
+    if outputFormat == 'json':
+        print json.dumps(index.toJSONObject(componentNames),
+                         sort_keys=True, indent=4)
+    elif outputFormat == 'dot':
+        index.writeDOT(sys.stdout, componentNames)
+    else:
+        index.writeText(sys.stdout, componentNames, printNodes, printReasons)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+
+# ndbcompress.py -- X3D Node Database Compression Tool
+#
+# Author: Dmitri Rubinstein <rubinstein@cs.uni-saarland.de>
+#
+# Copyright (C) 2008 Saarland University
+# Copyright (C) 2009, 2010, 2011, 2012 German Research Center for
+# Artificial Intelligence (DFKI)
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+
+import sys
+import getopt
+import time
+import StringIO
+import cPickle as pickle
+import nodedb
+
+def usage(exitCode = 0):
+    print 'Usage:',sys.argv[0],'[options] <node-db-file>'
+    print '-h | --help                     Print this message and exit.'
+    print '-c | --codec name               Write node database compressed with the'
+    print '                                specified codec to stdout (%s)' % \
+          ', '.join(['none'] + nodedb.getCodecNames())
+    print '-b | --benchmark                Compare size and speed of all available codecs'
+    sys.exit(exitCode)
+
+def error(msg, exitCode = 1, exit = True):
+    sys.stderr.write('Error: ')
+    sys.stderr.write(msg)
+    sys.stderr.write('\n')
+    if exit:
+        sys.exit(exitCode)
+
+def benchmark(ndb, repeat=3):
+    """returns list of tuples (codec, size, save time, load time),
+    times are the best of repeat runs, load time does not include
+    NodeDB.updateHierarchy
+    """
+    result = []
+    for codec in ['none'] + nodedb.getCodecNames():
+        saveTime = loadTime = None
+        for i in xrange(repeat):
+            out = StringIO.StringIO()
+            t = time.time()
+            ndb.save(out, codec)
+            t = time.time() - t
+            if saveTime is None or t < saveTime:
+                saveTime = t
+            data = out.getvalue()
+
+            t = time.time()
+            fd = nodedb.openDecompressedReader(StringIO.StringIO(data))
+            pickle.load(fd)
+            t = time.time() - t
+            if loadTime is None or t < loadTime:
+                loadTime = t
+        result.append((codec, len(data), saveTime, loadTime))
+    return result
+
+def main():
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], 'hc:b',
+                                   ['help', 'codec=', 'benchmark'])
+    except getopt.GetoptError, e:
+        error(str(e), exit = False)
+        usage(1)
+
+    codec = None
+    runBenchmark = False
+
+    for o, a in opts:
+        if o in ('-h', '--help'):
+            usage()
+        elif o in ('-c', '--codec'):
+            codec = a
+        elif o in ('-b', '--benchmark'):
+            runBenchmark = True
+
+    if len(args) != 1:
+        error('you must specify node database file')
+
+    if codec is None and not runBenchmark:
+        error('you must specify codec or benchmark mode')
+
+    if codec is not None and codec != 'none' and \
+       codec not in nodedb.getCodecNames():
+        error('unknown compression codec %s' % codec)
+
+    f = args[0]
+    print >>sys.stderr, 'NodeDB file:', f
+
+    ndb = nodedb.load(f)
+
+    if runBenchmark:
+        result = benchmark(ndb)
+        uncompressedSize = result[0][1]
+        print '%-8s %12s %8s %10s %10s' % ('codec', 'size', 'ratio',
+                                          'save [s]', 'load [s]')
+        for codec, size, saveTime, loadTime in result:
+            print '%-8s %12i %7.1f%% %10.3f %10.3f' % \
+                  (codec, size, 100.0 * size / uncompressedSize,
+                   saveTime, loadTime)
+    else:
+        ndb.save(sys.stdout, codec)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,262 @@
+#!/usr/bin/env python
+
+# ndbd.py -- X3D Type Hierarchy Query Daemon
+#
+# Author: Dmitri Rubinstein <rubinstein@cs.uni-saarland.de>
+#
+# Copyright (C) 2008 Saarland University
+# Copyright (C) 2009, 2010, 2011, 2012 German Research Center for
+# Artificial Intelligence (DFKI)
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+
+import sys
+import os
+import getopt
+import signal
+import json
+import socket
+import threading
+import traceback
+import Queue
+import SocketServer
+import cStringIO
+import nodedb
+import ndbinfo
+import ndbancestry
+import ndbsearch
+import ndbcomponents
+
+# Protocol: the client sends a request as JSON object in a single line
+#
+#   {"command" : "ndbinfo", "file" : absolute path of node database,
+#    "options" : ndbinfo options (see ndbinfo.Options)}
+#
+# the daemon answers with a JSON object and closes the connection
+#
+#   {"exitCode" : number, "stdout" : text, "stderr" : text}
+#
+# Node databases are loaded on the first request and kept resident. When
+# the file was modified since it was loaded the next request loads it
+# again, requests in progress keep using the old snapshot.
+
+class Snapshot(object):
+    """node database with precomputed data, not modified after loading"""
+
+    def __init__(self, fileName):
+        self.fileName = fileName
+        self.stamp = getFileStamp(fileName)
+        self.nodeDB = nodedb.load(fileName)
+        self.ancestry = ndbancestry.Ancestry(self.nodeDB)
+        self.searchIndex = ndbsearch.SearchIndex(self.nodeDB)
+        self.componentIndex = ndbcomponents.ComponentIndex(self.nodeDB)
+
+def getFileStamp(fileName):
+    stat = os.stat(fileName)
+    return (stat.st_mtime, stat.st_size)
+
+class SnapshotStore(object):
+
+    def __init__(self):
+        # protects snapshots and loadLocks
+        self.lock = threading.Lock()
+        # file name : Snapshot
+        self.snapshots = {}
+        # file name : lock held while the file is loaded
+        self.loadLocks = {}
+
+    def _getCurrent(self, fileName, stamp):
+        self.lock.acquire()
+        try:
+            snapshot = self.snapshots.get(fileName)
+            if snapshot is not None and snapshot.stamp == stamp:
+                return snapshot, None
+            return None, self.loadLocks.setdefault(fileName,
+                                                   threading.Lock())
+        finally:
+            self.lock.release()
+
+    def getSnapshot(self, fileName):
+        """returns snapshot of the current version of the file"""
+        fileName = os.path.abspath(fileName)
+        stamp = getFileStamp(fileName)
+        snapshot, loadLock = self._getCurrent(fileName, stamp)
+        if snapshot is not None:
+            return snapshot
+
+        loadLock.acquire()
+        try:
+            # file could be loaded by another thread in the meantime
+            snapshot, loadLock2 = self._getCurrent(fileName, stamp)
+            if snapshot is not None:
+                return snapshot
+            print >>sys.stderr, 'Loading NodeDB file:', fileName
+            snapshot = Snapshot(fileName)
+            self.lock.acquire()
+            try:
+                self.snapshots[fileName] = snapshot
+            finally:
+                self.lock.release()
+            return snapshot
+        finally:
+            loadLock.release()
+
+def ndbinfoCommand(store, request, out, err):
+    options = ndbinfo.optionsFromJSONObject(request['options'])
+    snapshot = store.getSnapshot(str(request['file']))
+    # worker processes are not forked from threads of the daemon
+    return ndbinfo.runQuery(snapshot.nodeDB, options, snapshot.fileName,
+                            out, err, snapshot.ancestry, processes=1,
+                            searchIndex=snapshot.searchIndex,
+                            componentIndex=snapshot.componentIndex)
+
+# command name : function(store, request, out, err) returning exit code
+COMMANDS = {'ndbinfo' : ndbinfoCommand}
+
+def registerCommand(name, function):
+    COMMANDS[name] = function
+
+class RequestHandler(SocketServer.StreamRequestHandler):
+
+    def handle(self):
+        out = cStringIO.StringIO()
+        err = cStringIO.StringIO()
+        try:
+            request = json.loads(self.rfile.readline())
+            command = COMMANDS.get(request.get('command'))
+            if command is None:
+                raise ValueError('unknown command %s' % \
+                                 request.get('command'))
+            exitCode = command(self.server.store, request, out, err)
+        except (ValueError, KeyError, EnvironmentError,
+                nodedb.NodeDBException), e:
+            err.write('Error: %s\n' % e)
+            exitCode = 2
+        except Exception:
+            traceback.print_exc(file=err)
+            traceback.print_exc()
+            exitCode = 2
+        response = {'exitCode' : exitCode,
+                    'stdout' : out.getvalue().decode('utf-8', 'replace'),
+                    'stderr' : err.getvalue().decode('utf-8', 'replace')}
+        self.wfile.write(json.dumps(response))
+        self.wfile.write('\n')
+
+class ThreadPoolServer(SocketServer.UnixStreamServer):
+    """serves requests by a fixed number of threads"""
+
+    def __init__(self, socketPath, store, numThreads):
+        SocketServer.UnixStreamServer.__init__(self, socketPath,
+                                               RequestHandler)
+        self.store = store
+        self.requests = Queue.Queue()
+        for i in xrange(numThreads):
+            thread = threading.Thread(target=self.processRequests)
+            thread.setDaemon(True)
+            thread.start()
+
+    def process_request(self, request, clientAddress):
+        self.requests.put((request, clientAddress))
+
+    def processRequests(self):
+        while True:
+            request, clientAddress = self.requests.get()
+            try:
+                self.finish_request(request, clientAddress)
+            except Exception:
+                self.handle_error(request, clientAddress)
+            self.close_request(request)
+
+def removeStaleSocket(socketPath):
+    """removes socket file when no daemon listens on it"""
+    if not os.path.exists(socketPath):
+        return
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        try:
+            sock.connect(socketPath)
+        except socket.error:
+            os.unlink(socketPath)
+            return
+    finally:
+        sock.close()
+    raise nodedb.NodeDBException('Daemon already listens on %s' % socketPath)
+
+def usage(exitCode = 0):
+    print 'Usage:',sys.argv[0],'[options] socket [node-db-file ...]'
+    print '-h | --help                     Print this message and exit.'
+    print '-t | --threads n                Number of threads serving requests (default: 4)'
+    print 'Listens on the Unix socket for queries of ndbinfo.py --server socket.'
+    print 'Specified node database files are loaded on start, other files on'
+    print 'the first request.'
+    sys.exit(exitCode)
+
+def error(msg, exitCode = 1, exit = True):
+    sys.stderr.write('Error: ')
+    sys.stderr.write(msg)
+    sys.stderr.write('\n')
+    if exit:
+        sys.exit(exitCode)
+
+def main():
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], 'ht:',
+                                   ['help', 'threads='])
+    except getopt.GetoptError, e:
+        error(str(e), exit = False)
+        usage(1)
+
+    numThreads = 4
+
+    for o, a in opts:
+        if o in ('-h', '--help'):
+            usage()
+        elif o in ('-t', '--threads'):
+            try:
+                numThreads = int(a)
+            except ValueError:
+                numThreads = 0
+            if numThreads < 1:
+                error('invalid number of threads %s' % a)
+
+    if len(args) < 1:
+        error('you must specify socket')
+
+    socketPath = args[0]
+    store = SnapshotStore()
+    for f in args[1:]:
+        store.getSnapshot(f)
+
+    try:
+        removeStaleSocket(socketPath)
+    except nodedb.NodeDBException, e:
+        error(str(e))
+    server = ThreadPoolServer(socketPath, store, numThreads)
+    # only the user running the daemon can send requests
+    os.chmod(socketPath, 0600)
+    print >>sys.stderr, 'Listening on', socketPath
+    # terminate by SIGTERM like by SIGINT, removing the socket
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+    finally:
+        server.server_close()
+        os.unlink(socketPath)
+
+if __name__ == '__main__':
+    main()
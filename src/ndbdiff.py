@@ -25,11 +25,20 @@
 import sys
 import getopt
 import nodedb
+import ndbhierarchy
 
 def usage(exitCode = 0):
     print 'Usage:',sys.argv[0],'[options] node-db-file-1 node-db-file-2'
     print '-h | --help                     Print this message and exit.'
     print '-a | --all                      Print all differences, also unimportant like source file.'
+    print '-m | --moves                    Detect renamed fields and fields moved to other nodes of'
+    print '                                the hierarchy.'
+    print '--effective                     Compare resolved fields of non-abstract nodes including'
+    print '                                inherited fields.'
+    print '--stream                        Compare files written by ndb2json.py -l node by node'
+    print '                                without loading the databases.'
+    print '-j | --json                     Print differences as JSON patch that can be applied'
+    print '                                with ndbpatch.py.'
     sys.exit(exitCode)
 
 def error(msg, exitCode = 1, exit = True):
@@ -41,34 +50,77 @@ def error(msg, exitCode = 1, exit = True):
 
 def main():
     try:
-        opts, args = getopt.getopt(sys.argv[1:], 'ha',
-                                   ['help','all'])
+        opts, args = getopt.getopt(sys.argv[1:], 'hajm',
+                                   ['help','all','json','moves',
+                                    'effective', 'stream'])
     except getopt.GetoptError, e:
         error(str(e), exit = False)
         usage(1)
 
     nodes = []
     printAll = False
+    printJSON = False
+    detectMoves = False
+    effective = False
+    stream = False
 
     for o, a in opts:
         if o in ('-h', '--help'):
             usage()
         elif o in ('-a', '--all'):
             printAll = True
+        elif o in ('-j', '--json'):
+            printJSON = True
+        elif o in ('-m', '--moves'):
+            detectMoves = True
+        elif o in ('--effective',):
+            effective = True
+        elif o in ('--stream',):
+            stream = True
 
     if len(args) != 2:
         error('you must specify two node database files')
 
+    if effective and (printJSON or detectMoves):
+        error('--effective cannot be combined with -j and -m')
+
     f1 = args[0]
     f2 = args[1]
 
+    if stream and (printJSON or detectMoves or effective):
+        error('--stream cannot be combined with -j, -m and --effective')
+
+    if stream:
+        print '---', f1
+        print '+++', f2
+        print
+        fd1 = open(f1, 'rb')
+        fd2 = open(f2, 'rb')
+        try:
+            for i in nodedb.diffJSONLines(fd1, fd2, printAll):
+                print i
+        except nodedb.NodeDBException, e:
+            error(str(e))
+        fd1.close()
+        fd2.close()
+        return
+
+    ndb1 = nodedb.load(f1)
+    ndb2 = nodedb.load(f2)
+
+    if printJSON:
+        print nodedb.changesToJSON(ndb1.compare(ndb2, printAll,
+                                                      detectMoves))
+        return
+
     print '---', f1
     print '+++', f2
     print
 
-    ndb1 = nodedb.load(f1)
-    ndb2 = nodedb.load(f2)
-    result = ndb1.diff(ndb2, printAll)
+    if effective:
+        result = ndbhierarchy.compareEffectiveInterfaces(ndb1, ndb2)
+    else:
+        result = ndb1.diff(ndb2, printAll, detectMoves)
     for i in result:
         print i
 
@@ -0,0 +1,259 @@
+#!/usr/bin/env python
+
+# ndbevolution.py -- Evolution of X3D Type Hierarchy over multiple editions
+#
+# Author: Dmitri Rubinstein <rubinstein@cs.uni-saarland.de>
+#
+# Copyright (C) 2008 Saarland University
+# Copyright (C) 2009, 2010, 2011, 2012 German Research Center for
+# Artificial Intelligence (DFKI)
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+
+import sys
+import os.path
+import getopt
+import json
+import multiprocessing
+import nodedb
+
+# compared field properties reported as details of field changes
+FIELD_PROPERTIES = ['type', 'accessType', 'value', 'validValueTypes',
+                    'annotations', 'info']
+
+def getFieldDifferences(field1, field2):
+    # Note: Annotations does not implement __ne__
+    return [name for name in FIELD_PROPERTIES
+            if not getattr(field1, name) == getattr(field2, name)]
+
+def changesToEvents(changes):
+    """converts changes returned by NodeDB.compare to list of events
+    (nodeType, fieldName, event, details), fieldName is None for events
+    of nodes"""
+    events = []
+    for change in changes:
+        op = change[0]
+        nodeType = change[1]
+        if op in ('addNode', 'removeNode'):
+            event = (op == 'addNode' and 'added') or 'removed'
+            events.append((nodeType, None, event, []))
+            events.extend([(nodeType, f.getName(), event, [])
+                           for f in change[2].getFields()])
+        elif op == 'setNodeProperty':
+            events.append((nodeType, None, 'changed', [change[2]]))
+        elif op == 'replaceField':
+            events.append((nodeType, change[2].getName(), 'changed',
+                           getFieldDifferences(change[2], change[3])))
+        elif op == 'addField':
+            events.append((nodeType, change[2].getName(), 'added', []))
+        elif op == 'removeField':
+            events.append((nodeType, change[2].getName(), 'removed', []))
+    return events
+
+def computeEditionEvents(files):
+    """returns events of the edition stored in files[1] relative to the
+    previous edition stored in files[0], when files[0] is None all nodes
+    of the edition are added.
+    Runs in the worker processes, so only plain tuples are returned.
+    """
+    oldFile, newFile = files
+    if oldFile is None:
+        oldNodeDB = nodedb.NodeDB()
+    else:
+        oldNodeDB = nodedb.load(oldFile)
+    newNodeDB = nodedb.load(newFile)
+    return changesToEvents(oldNodeDB.compare(newNodeDB))
+
+class Evolution(object):
+
+    def __init__(self, editionNames):
+        self.editionNames = editionNames
+        # nodeType : list of (edition index, event, details)
+        self.nodeHistory = {}
+        # nodeType : {fieldName : list of (edition index, event, details)}
+        self.fieldHistory = {}
+
+    def addEvents(self, editionIndex, events):
+        for nodeType, fieldName, event, details in events:
+            if fieldName is None:
+                history = self.nodeHistory.setdefault(nodeType, [])
+            else:
+                fields = self.fieldHistory.setdefault(nodeType, {})
+                history = fields.setdefault(fieldName, [])
+            history.append((editionIndex, event, details))
+
+    def getNodeTypes(self):
+        nodeTypes = self.nodeHistory.keys()
+        nodeTypes.sort()
+        return nodeTypes
+
+    def getFieldNames(self, nodeType):
+        fieldNames = self.fieldHistory.get(nodeType, {}).keys()
+        fieldNames.sort()
+        return fieldNames
+
+    def getNodeHistory(self, nodeType):
+        return self.nodeHistory.get(nodeType, [])
+
+    def getFieldHistory(self, nodeType, fieldName):
+        return self.fieldHistory[nodeType][fieldName]
+
+    def formatHistory(self, history):
+        parts = []
+        for editionIndex, event, details in history:
+            s = '%s in %s' % (event, self.editionNames[editionIndex])
+            if details:
+                s += ' (%s)' % ', '.join(details)
+            parts.append(s)
+        return ', '.join(parts)
+
+    def _isInteresting(self, history, changedOnly):
+        if not changedOnly:
+            return True
+        for editionIndex, event, details in history:
+            if editionIndex > 0:
+                return True
+        return False
+
+    def write(self, out, changedOnly=False):
+        for nodeType in self.getNodeTypes():
+            history = self.getNodeHistory(nodeType)
+            if self._isInteresting(history, changedOnly):
+                print >>out, '%s %s' % (nodeType, self.formatHistory(history))
+            for fieldName in self.getFieldNames(nodeType):
+                history = self.getFieldHistory(nodeType, fieldName)
+                if self._isInteresting(history, changedOnly):
+                    print >>out, '%s.%s %s' % \
+                          (nodeType, fieldName, self.formatHistory(history))
+
+    def toJSON(self, changedOnly=False):
+        def historyToJSON(history):
+            return [{'edition' : self.editionNames[editionIndex],
+                     'event' : event,
+                     'details' : details}
+                    for editionIndex, event, details in history]
+
+        nodes = {}
+        for nodeType in self.getNodeTypes():
+            fields = {}
+            for fieldName in self.getFieldNames(nodeType):
+                history = self.getFieldHistory(nodeType, fieldName)
+                if self._isInteresting(history, changedOnly):
+                    fields[fieldName] = historyToJSON(history)
+            history = self.getNodeHistory(nodeType)
+            if fields or self._isInteresting(history, changedOnly):
+                nodes[nodeType] = {'history' : historyToJSON(history),
+                                   'fields' : fields}
+        return json.dumps({'editions' : self.editionNames,
+                           'nodes' : nodes},
+                          sort_keys=True, indent=4)
+
+def computeEvolution(editions, processes=None):
+    """editions is a list of tuples (edition name, node database file),
+    consecutive editions are compared in parallel by processes worker
+    processes (by default number of CPUs), when processes is 1 no
+    worker processes are used.
+    """
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    files = [e[1] for e in editions]
+    tasks = zip([None] + files[:-1], files)
+    if processes == 1 or len(tasks) == 1:
+        # every database is loaded only once
+        results = []
+        oldNodeDB = nodedb.NodeDB()
+        for f in files:
+            newNodeDB = nodedb.load(f)
+            results.append(changesToEvents(oldNodeDB.compare(newNodeDB)))
+            oldNodeDB = newNodeDB
+    else:
+        pool = multiprocessing.Pool(processes)
+        try:
+            results = pool.map(computeEditionEvents, tasks)
+        finally:
+            pool.close()
+            pool.join()
+    evolution = Evolution([e[0] for e in editions])
+    for i in xrange(len(results)):
+        evolution.addEvents(i, results[i])
+    return evolution
+
+def usage(exitCode = 0):
+    print 'Usage:',sys.argv[0],'[options] [name=]node-db-file ...'
+    print '-h | --help                     Print this message and exit.'
+    print '-j | --json                     Print evolution table in JSON format'
+    print '-c | --changed-only             Print only nodes and fields changed after the first edition'
+    print '-p | --processes n              Number of worker processes (default: number of CPUs)'
+    print 'Node database files must be specified in the order of editions, edition name'
+    print 'is the file name without extension when not specified.'
+    sys.exit(exitCode)
+
+def error(msg, exitCode = 1, exit = True):
+    sys.stderr.write('Error: ')
+    sys.stderr.write(msg)
+    sys.stderr.write('\n')
+    if exit:
+        sys.exit(exitCode)
+
+def main():
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], 'hjcp:',
+                                   ['help', 'json', 'changed-only',
+                                    'processes='])
+    except getopt.GetoptError, e:
+        error(str(e), exit = False)
+        usage(1)
+
+    printJSON = False
+    changedOnly = False
+    processes = None
+
+    for o, a in opts:
+        if o in ('-h', '--help'):
+            usage()
+        elif o in ('-j', '--json'):
+            printJSON = True
+        elif o in ('-c', '--changed-only'):
+            changedOnly = True
+        elif o in ('-p', '--processes'):
+            try:
+                processes = int(a)
+            except ValueError:
+                processes = 0
+            if processes < 1:
+                error('invalid number of processes %s' % a)
+
+    if len(args) < 1:
+        error('you must specify node database files')
+
+    editions = []
+    for arg in args:
+        if '=' in arg:
+            name, f = arg.split('=', 1)
+        else:
+            f = arg
+            name = os.path.splitext(os.path.basename(f))[0]
+        editions.append((name, f))
+        print >>sys.stderr, 'NodeDB file:', f
+
+    evolution = computeEvolution(editions, processes)
+
+    if printJSON:
+        print evolution.toJSON(changedOnly)
+    else:
+        evolution.write(sys.stdout, changedOnly)
+
+if __name__ == '__main__':
+    main()
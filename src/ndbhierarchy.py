@@ -0,0 +1,169 @@
+# ndbhierarchy.py -- Resolved X3D Type Hierarchy
+#
+# Author: Dmitri Rubinstein <rubinstein@cs.uni-saarland.de>
+#
+# Copyright (C) 2008 Saarland University
+# Copyright (C) 2009, 2010, 2011, 2012 German Research Center for
+# Artificial Intelligence (DFKI)
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+
+import nodedb
+
+def topologicalOrder(nodeDB):
+    """returns list of nodes of nodeDB where every node follows all its
+    super nodes, nodes without ordering constraints keep the order of
+    the database"""
+    nodeList = nodeDB.getNodeList()
+    # node type : number of super nodes not yet in the result
+    pending = {}
+    for node in nodeList:
+        pending[node.getType()] = len(nodeDB.getSuperNodes(node))
+
+    result = [node for node in nodeList if pending[node.getType()] == 0]
+    i = 0
+    while i < len(result):
+        for derivedNode in nodeDB.getDerivedNodes(result[i]):
+            derivedType = derivedNode.getType()
+            pending[derivedType] -= 1
+            if pending[derivedType] == 0:
+                result.append(derivedNode)
+        i += 1
+
+    if len(result) != len(nodeList):
+        cycle = [node.getType() for node in nodeList
+                 if pending[node.getType()] > 0]
+        raise nodedb.NodeDBException('Cyclic inheritance between nodes %s' % \
+                                     ', '.join(cycle))
+    return result
+
+# Resolved fields are tuples
+# (type, accessType, value, validValueTypes, declaringNodeTypes)
+
+def makeFieldEntry(field):
+    declNodes = field.getDeclarationNodes() or []
+    return (field.getType(), field.getAccessType(), field.getValue(),
+            tuple(field.getValidValueTypes()),
+            tuple([n.getType() for n in declNodes]))
+
+def formatFieldEntry(fieldName, entry):
+    fieldType, accessType, value, validValueTypes, declNodeTypes = entry
+    s = '%s %s %s' % (fieldType, nodedb.Field.accessTypeNames[accessType],
+                      fieldName)
+    if value is not None:
+        s += ' ' + value
+    if validValueTypes:
+        s += ' [%s]' % ','.join(validValueTypes)
+    return s + ' # declared in ' + ', '.join(declNodeTypes)
+
+def resolveFieldTables(nodeDB):
+    """returns dictionary node type : field table of all fields of the node
+    including inherited fields missing in the node. Field tables are
+    dictionaries field name : resolved field tuple (see makeFieldEntry).
+
+    Tables and field tuples are computed once per database: equal field
+    tuples are shared, a node that does not add or change any field of
+    its only super node shares the table of the super node. Returned
+    tables must not be modified.
+    """
+    tables = {}
+    # resolved field tuple : the same tuple
+    entries = {}
+
+    for node in topologicalOrder(nodeDB):
+        superNodes = nodeDB.getSuperNodes(node)
+        if len(superNodes) == 0:
+            baseTable = {}
+        elif len(superNodes) == 1:
+            baseTable = tables[superNodes[0].getType()]
+        else:
+            baseTable = {}
+            # fields of the first super nodes take precedence
+            for superNode in reversed(superNodes):
+                baseTable.update(tables[superNode.getType()])
+
+        changed = {}
+        for field in node.getFields():
+            entry = makeFieldEntry(field)
+            entry = entries.setdefault(entry, entry)
+            if baseTable.get(field.getName()) is not entry:
+                changed[field.getName()] = entry
+
+        if len(superNodes) > 1:
+            # merged table is not shared
+            table = baseTable
+            table.update(changed)
+        elif changed:
+            table = baseTable.copy()
+            table.update(changed)
+        else:
+            table = baseTable
+        tables[node.getType()] = table
+
+    return tables
+
+def sameFieldEntries(entry1, entry2):
+    """compares resolved field tuples ignoring the declaring nodes, a field
+    moved to another node of the hierarchy does not change the interface"""
+    if entry1 is None or entry2 is None:
+        return entry1 is entry2
+    return entry1[:-1] == entry2[:-1]
+
+def compareEffectiveInterfaces(nodeDB1, nodeDB2):
+    """returns list of text lines describing differences of the resolved
+    field tables of non-abstract nodes"""
+    tables1 = resolveFieldTables(nodeDB1)
+    tables2 = resolveFieldTables(nodeDB2)
+
+    concrete1 = dict([(n.getType(), True) for n in nodeDB1.getNodeList()
+                      if not n.isAbstract()])
+    concrete2 = dict([(n.getType(), True) for n in nodeDB2.getNodeList()
+                      if not n.isAbstract()])
+    nodeTypes = concrete1.keys() + [t for t in concrete2 if t not in concrete1]
+    nodeTypes.sort()
+
+    result = []
+    for nodeType in nodeTypes:
+        if nodeType not in concrete2:
+            result.append('- node %s' % nodeType)
+            continue
+        if nodeType not in concrete1:
+            result.append('+ node %s' % nodeType)
+            continue
+        table1 = tables1[nodeType]
+        table2 = tables2[nodeType]
+        if table1 == table2:
+            continue
+        fieldNames = table1.keys() + [n for n in table2 if n not in table1]
+        fieldNames.sort()
+        lines = []
+        for fieldName in fieldNames:
+            entry1 = table1.get(fieldName)
+            entry2 = table2.get(fieldName)
+            if not sameFieldEntries(entry1, entry2):
+                if entry1 is not None:
+                    lines.append('- field %s' % \
+                                 formatFieldEntry(fieldName, entry1))
+                if entry2 is not None:
+                    lines.append('+ field %s' % \
+                                 formatFieldEntry(fieldName, entry2))
+        if not lines:
+            continue
+        if result and result[-1]:
+            result.append('')
+        result.append('@@ node %s @@' % nodeType)
+        result.extend(lines)
+        result.append('')
+    return result
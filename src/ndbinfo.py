@@ -23,38 +23,15 @@
 # Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
 
 import sys
+import os.path
 import getopt
-import cPickle as pickle
-
-nodeDB = None
-
-def getAllBases(node, basesList, virtualBasesList):
-    superNodes = node.getSuperNodes()
-    
-    for n in superNodes:
-        if n in basesList:
-            if n not in virtualBasesList:
-                virtualBasesList.append(n)
-        else:
-            basesList.append(n)
-            getAllBases(n, basesList, virtualBasesList)
-
-def getAllDerivedNodes(node, derivedList):
-    derivedNodes = node.getDerivedNodes()
-    for n in derivedNodes:
-        if n not in derivedList:
-            derivedList.append(n)
-            getAllDerivedNodes(n, derivedList)
-
-def findFirstFieldDeclNodes(node, fieldName):
-    if node.findField(fieldName) is None:
-        return []
-    result = []
-    for n in node.getSuperNodes():
-        result.extend(findFirstFieldDeclNodes(n, fieldName))
-    if len(result) == 0:
-        result = [node]
-    return result
+import socket
+import json
+import nodedb
+import ndbcheck
+import ndbancestry
+import ndbsearch
+import ndbcomponents
 
 def error(msg, exitCode = 1, exit = True):
     sys.stderr.write('Error: ')
@@ -63,60 +40,6 @@ def error(msg, exitCode = 1, exit = True):
     if exit:
         sys.exit(exitCode)
 
-### Node Checker ###
-
-def equalFields(f1, f2):
-    return f1.type == f2.type and \
-           f1.accessType == f2.accessType and \
-           f1.name == f2.name
-
-
-def checkFieldSet(node, fieldNodeDict, errors):
-    global nodeDB
-
-    superNodes = node.getSuperNodes()
-    fieldSuperNodeDict = {}
-    for n in superNodes:
-        checkFieldSet(n, fieldSuperNodeDict, errors)
-
-    # check fields of this node which are already defined in one
-    # of the super nodes
-    superFieldNames = []
-    for fieldName, fieldAndNode in fieldSuperNodeDict.items():
-
-        superFieldNames.append(fieldName)
-
-        f = node.findField(fieldName)
-        if f is None:
-            errors.append('Field %s declared in the node "%s" is not declared in node "%s"' % (fieldName, fieldAndNode[1].getType(), node.getType()))
-            continue
-        if not equalFields(f, fieldAndNode[0]):
-            errors.append('Field %s defined in the node "%s" differ to the declaration in node "%s"' % (fieldName, fieldAndNode[1].getType(), node.getType()))
-            errors.append('  in %s : %s' % (fieldAndNode[1].getType(), fieldAndNode[0]))
-            errors.append('  in %s : %s' % (node.getType(), f))
-            
-
-    # check all SFNode/MFNode fields for incorrect validValueTypes
-    for field in node.getFields():
-        if field.getName() not in superFieldNames:
-        
-            if field.getType() in ('SFNode', 'MFNode'):
-                for valueType in field.getValidValueTypes():
-                    if not nodeDB.getNode(valueType):
-                        errors.append('Field %s defined in the node "%s" refer to unknown node type "%s" in the valid node type list' % (field.getName(), node.getType(), valueType))
-        
-    
-    # update fieldNodeDict
-    fieldNodeDict.update(fieldSuperNodeDict)
-    for field in node.getFields():
-        if not fieldNodeDict.has_key(field.getName()):
-            fieldNodeDict[field.getName()] = (field, node)
-
-def checkNode(node, errors):
-    assert len(node.getSuperNodes()) == len(node.getSuperTypes())
-    fieldNodeDict = {}
-    checkFieldSet(node, fieldNodeDict, errors)
-
 ####################
 
 def usage(exitCode = 0):
@@ -124,7 +47,12 @@ def usage(exitCode = 0):
     print '-h | --help                     Print this message and exit.'
     print '-n | --node-types list          Output info only for specified node types list separated by commas'
     print '-l | --list                     Print nodes in the X3D specification format'
-    print '-c | --check                    Check node database for errors'
+    print '-c | --check                    Check node database for errors with all rules of ndbcheck.py'
+    print '--check-cache                   Cache findings of the check in file <node-db-file>.checkcache'
+    print '--check-cache-file file         Cache findings of the check in the specified file'
+    print '--search-index                  Suggest node types for unknown nodes with index file <node-db-file>.search'
+    print '--search-index-file file        Suggest node types with the specified index file'
+    print '                                (not with --server, the daemon keeps the index in memory)'
     print '-i | --info                     Print node information'
     print '-s | --sort                     Sort node list on type name'
     print '-b | --bases                    Print bases (super types)'
@@ -134,71 +62,106 @@ def usage(exitCode = 0):
     print '--list-nodes-of-component component-name'
     print '                               Print list of all nodes that' \
           'belongs to the specified component'
+    print '--server socket                 Send query to ndbd.py daemon listening on socket'
     sys.exit(exitCode)
 
-def main():
-    global nodeDB
-    
-    try:
-        opts, args = getopt.getopt(sys.argv[1:], 'hn:clisbvd',
-                                   ['help', 'nodes-types=',
-                                    'check', 'list', 'info', 'sort', 'bases',
-                                    'virtual-bases', 'derived',
-                                    'list-components',
-                                    'list-nodes-of-component='])
-    except getopt.GetoptError, e:
-        error(str(e), exit = False)
-        usage(1)
-
-    listNodes = False
-    checkNodes = False
-    printInfo = False
-    sortNodes = False
-    printBases = False
-    printVirtualBases = False
-    printDerivedNodes = False
-    listComponents = False
-
-    nodeTypes = []
-    listNodesOfComponent = []
-
-    exitCode = 0
-
+class Options(object):
+
+    def __init__(self):
+        self.listNodes = False
+        self.checkNodes = False
+        self.printInfo = False
+        self.sortNodes = False
+        self.printBases = False
+        self.printVirtualBases = False
+        self.printDerivedNodes = False
+        self.listComponents = False
+        self.useCheckCache = False
+        self.checkCacheFile = None
+        self.useSearchIndex = False
+        self.searchIndexFile = None
+        self.nodeTypes = []
+        self.listNodesOfComponent = []
+        self.server = None
+        self.printHelp = False
+
+    def toJSONObject(self):
+        return self.__dict__.copy()
+
+def optionsFromJSONObject(obj):
+    options = Options()
+    for name, value in obj.items():
+        name = str(name)
+        if not hasattr(options, name):
+            raise ValueError('Unknown option %s' % name)
+        if isinstance(value, list):
+            value = [str(v) for v in value]
+        elif isinstance(value, unicode):
+            value = str(value)
+        setattr(options, name, value)
+    return options
+
+def parseOptions(argv):
+    """returns tuple (Options, arguments), raises getopt.GetoptError"""
+    opts, args = getopt.getopt(argv, 'hn:clisbvd',
+                               ['help', 'nodes-types=',
+                                'check', 'list', 'info', 'sort', 'bases',
+                                'virtual-bases', 'derived',
+                                'list-components',
+                                'list-nodes-of-component=',
+                                'check-cache', 'check-cache-file=',
+                                'search-index', 'search-index-file=',
+                                'server='])
+    options = Options()
     for o, a in opts:
         if o in ('-h', '--help'):
-            usage()
+            options.printHelp = True
         elif o in ('-c', '--check'):
-            checkNodes = True
+            options.checkNodes = True
+        elif o == '--check-cache':
+            options.useCheckCache = True
+        elif o == '--check-cache-file':
+            options.checkCacheFile = a
+        elif o == '--search-index':
+            options.useSearchIndex = True
+        elif o == '--search-index-file':
+            options.searchIndexFile = a
         elif o in ('-l', '--list'):
-            listNodes = True
+            options.listNodes = True
         elif o in ('-i', '--info'):
-            printInfo = True
+            options.printInfo = True
         elif o in ('-s', '--sort'):
-            sortNodes = True
+            options.sortNodes = True
         elif o in ('-b', '--bases'):
-            printBases = True
+            options.printBases = True
         elif o in ('-v', '--virtual-bases'):
-            printVirtualBases = True
+            options.printVirtualBases = True
         elif o in ('-n', '--node-types'):
-            nodeTypes.extend(a.split(','))
+            options.nodeTypes.extend(a.split(','))
         elif o in ('-d', '--derived'):
-            printDerivedNodes = True
+            options.printDerivedNodes = True
         elif o in ('--list-components',):
-            listComponents = True
+            options.listComponents = True
         elif o in ('--list-nodes-of-component',):
-            listNodesOfComponent.extend(a.split(','))
-
-    if len(args) != 1:
-        error('you must specify node database file')
-
-    f = args[0]
-    print >>sys.stderr, 'NodeDB file:', f
-
-    fd = open(f, 'r')
-    nodeDB = pickle.load(fd)
-    fd.close()
-
-    nodeDB.updateHierarchy()
+            options.listNodesOfComponent.extend(a.split(','))
+        elif o == '--server':
+            options.server = a
+    return options, args
+
+def runQuery(nodeDB, options, fileName, out, err, ancestry=None,
+             processes=None, searchIndex=None, componentIndex=None):
+    """writes information about nodeDB selected by options to the file
+    objects out and err, returns exit code.
+    fileName is the file of nodeDB, ancestry is an ndbancestry.Ancestry
+    of nodeDB computed when it is needed and not specified, processes is
+    the number of worker processes used by the check, searchIndex is an
+    ndbsearch.SearchIndex of nodeDB used for suggestions for unknown
+    nodes, built when it is needed and not specified (read from the index
+    file selected by options if there is one), componentIndex is an
+    ndbcomponents.ComponentIndex of nodeDB computed when it is needed and
+    not specified.
+    """
+    exitCode = 0
 
     numNodes = len(nodeDB.getNodeList())
     numAbstractNodes = 0
@@ -206,128 +169,188 @@ def main():
         if n.isAbstract():
             numAbstractNodes+=1
 
-    print >>sys.stderr, '%i concrete nodes' % (numNodes-numAbstractNodes)
-    print >>sys.stderr, '%i abstract nodes' % numAbstractNodes
-    print >>sys.stderr, '%i nodes in total' % numNodes
+    print >>err, '%i concrete nodes' % (numNodes-numAbstractNodes)
+    print >>err, '%i abstract nodes' % numAbstractNodes
+    print >>err, '%i nodes in total' % numNodes
 
-    if not nodeTypes:
+    if not options.nodeTypes:
         nodeList = nodeDB.getNodeList()
     else:
         nodeList = []
-        for nt in nodeTypes:
+        for nt in options.nodeTypes:
             node = nodeDB.getNode(nt)
             if node:
                 nodeList.append(node)
             else:
-                print >>sys.stderr, 'Unknown node "%s"' % nt
-
-    if checkNodes:
-        for node in nodeList:
-            errors = []
-            checkNode(node, errors)
-            if len(errors) > 0:
-                print '=== Errors in node %s ===' % node.getType()
-                for err in errors:
-                    print err
-                exitCode = 1
-
-    if listNodes:
+                if searchIndex is None:
+                    indexFile = options.searchIndexFile
+                    if options.useSearchIndex and indexFile is None:
+                        indexFile = ndbsearch.getSearchIndexFileName(fileName)
+                    try:
+                        searchIndex = ndbsearch.loadSearchIndex(nodeDB,
+                                                                indexFile)
+                    except nodedb.NodeDBException, e:
+                        print >>err, 'Error: %s' % e
+                        searchIndex = ndbsearch.SearchIndex(nodeDB)
+                        exitCode = 1
+                suggestions = searchIndex.suggest(nt, limit=3)
+                if suggestions:
+                    print >>err, 'Unknown node "%s", did you mean %s?' % \
+                          (nt, ndbsearch.formatSuggestions(suggestions))
+                else:
+                    print >>err, 'Unknown node "%s"' % nt
+
+    if options.checkNodes:
+        cacheFile = options.checkCacheFile
+        if options.useCheckCache and cacheFile is None:
+            cacheFile = ndbcheck.getCheckCacheFileName(fileName)
+        try:
+            findings = ndbcheck.checkNodeDB(nodeDB, nodeList,
+                                            processes=processes,
+                                            cacheFile=cacheFile)
+        except nodedb.NodeDBException, e:
+            print >>err, 'Error: %s' % e
+            findings = []
+            exitCode = 1
+        for nodeType, nodeFindings in ndbcheck.groupFindings(findings):
+            print >>out, '=== Errors in node %s ===' % nodeType
+            for finding in nodeFindings:
+                print >>out, finding
+                if finding.severity == ndbcheck.ERROR:
+                    exitCode = 1
+
+    if options.listNodes:
         specFile = None
 
-        if sortNodes:
+        if options.sortNodes:
             nodeList = nodeList[:]
             nodeList.sort(cmp=lambda x,y:cmp(x.getType(),y.getType()))
-        
+
         for node in nodeList:
             if node.getSpecFile() != specFile:
                 specFile = node.getSpecFile()
-                print '# file : %s' % specFile
-                print
-            print node
-            print
-            
-    if printInfo:
+                out.write('# file : %s\n\n' % specFile)
+            node.write(out)
+            out.write('\n\n')
+
+    if options.printInfo:
         for node in nodeList:
-            print '=== %s ===' % node.getType()
-
-            # type accessTypeName name value validValueTypes
-            maxLen = [0, 0, 0, 0, 0]
-            myLen = lambda s: len(s or ())
-            for field in node.getFields():
-                maxLen[0] = max(maxLen[0], myLen(field.type))
-                maxLen[1] = max(maxLen[1], myLen(field.getAccessTypeName()))
-                maxLen[2] = max(maxLen[2], myLen(field.name))
-                maxLen[3] = max(maxLen[3], myLen(field.value))
-                maxLen[4] = max(maxLen[4], myLen(field.getValidValueTypesStr()))
-
-            fieldStr = []
-            declFieldNodes = []
-            maxFieldStrLen = 0
-
-            for field in node.getFields():
-                fs = field.toString(*maxLen)
-                fieldStr.append(fs)
-                maxFieldStrLen = max(len(fs), maxFieldStrLen)
-                declFieldNodes.append(findFirstFieldDeclNodes(node, field.getName()))
-
-            for i in xrange(len(fieldStr)):
-                fs = fieldStr[i]
-                declNodes = declFieldNodes[i]
-                print '%s declared in %s' % (fs.ljust(maxFieldStrLen), ','.join([n.getType() for n in declNodes]))
-        
-    if printBases or printVirtualBases:
+            out.write('=== %s ===\n' % node.getType())
+
+            # declaration nodes are computed by NodeDB.updateHierarchy
+            fields = node.getFields()
+            formatter = nodedb.FieldFormatter(fields)
+            for i in xrange(len(fields)):
+                formatter.write(out, i, formatter.lineWidth)
+                out.write(' declared in %s\n' % \
+                          ','.join([n.getType() for n in
+                                    fields[i].getDeclarationNodes()]))
+
+    if ancestry is None and (options.printBases or
+                             options.printVirtualBases or
+                             options.printDerivedNodes):
+        ancestry = ndbancestry.Ancestry(nodeDB)
+
+    if options.printBases or options.printVirtualBases:
         for node in nodeList:
-            bases = []
-            virtualBases = []
-            getAllBases(node, bases, virtualBases)
-
-            if (printBases and bases) or (printVirtualBases and virtualBases):
-                print '=== %s ===' % (node.getType())
-            
-            if printBases and bases:
-                print '* Bases *'
+            bases, virtualBases = ancestry.getBases(node)
+
+            if (options.printBases and bases) or \
+               (options.printVirtualBases and virtualBases):
+                print >>out, '=== %s ===' % (node.getType())
+
+            if options.printBases and bases:
+                print >>out, '* Bases *'
                 for b in bases:
-                    print b.getType()
-            if printVirtualBases and virtualBases:
-                print '* Virtual bases *'
+                    print >>out, b.getType()
+            if options.printVirtualBases and virtualBases:
+                print >>out, '* Virtual bases *'
                 for b in virtualBases:
-                    print b.getType()
+                    print >>out, b.getType()
 
-    if printDerivedNodes:
-        from sets import Set
-        
-        derivedNodeSet = None
-        for node in nodeList:
-            derivedNodes = []
-            getAllDerivedNodes(node, derivedNodes)
-            if derivedNodeSet is None:
-                derivedNodeSet = Set(derivedNodes)
-            else:
-                derivedNodeSet = derivedNodeSet.intersection(derivedNodes)
-            
-        print '=== All nodes derived from %s node(s) ===' % \
+    if options.printDerivedNodes:
+        derivedNodes = ancestry.getCommonDerivedNodes(nodeList)
+
+        print >>out, '=== All nodes derived from %s node(s) ===' % \
               (','.join([n.getType() for n in nodeList]))
-        
-        if len(derivedNodeSet):
-            for n in derivedNodeSet:
-                print n.getType()
+
+        if derivedNodes:
+            for n in derivedNodes:
+                print >>out, n.getType()
         else:
-            print 'No nodes'
+            print >>out, 'No nodes'
 
-    if listComponents:
-        components = {}
-        for n in nodeDB.getNodeList():
-            componentName = n.getComponentName()
-            if componentName not in components:
-                components[componentName] = True
-                print componentName
+    if componentIndex is None and (options.listComponents or
+                                   options.listNodesOfComponent):
+        componentIndex = ndbcomponents.ComponentIndex(nodeDB)
 
-    if listNodesOfComponent:
-        for n in nodeDB.getNodeList():
-            if n.getComponentName() in listNodesOfComponent:
-                print n.getType()
+    if options.listComponents:
+        for componentName in componentIndex.getComponentNames():
+            print >>out, componentName
 
-    sys.exit(exitCode)
+    if options.listNodesOfComponent:
+        for n in componentIndex.getNodesOfComponents(
+                options.listNodesOfComponent):
+            print >>out, n.getType()
+
+    return exitCode
+
+def queryServer(socketPath, request):
+    """sends request to ndbd.py daemon listening on socketPath, returns
+    response, see ndbd.py"""
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(socketPath)
+        sock.sendall(json.dumps(request) + '\n')
+        sock.shutdown(socket.SHUT_WR)
+        chunks = []
+        while True:
+            data = sock.recv(65536)
+            if not data:
+                break
+            chunks.append(data)
+    finally:
+        sock.close()
+    return json.loads(''.join(chunks))
+
+def main():
+    try:
+        options, args = parseOptions(sys.argv[1:])
+    except getopt.GetoptError, e:
+        error(str(e), exit = False)
+        usage(1)
+
+    if options.printHelp:
+        usage()
+
+    if len(args) != 1:
+        error('you must specify node database file')
+
+    f = args[0]
+    print >>sys.stderr, 'NodeDB file:', f
+
+    if options.server is not None:
+        if options.useSearchIndex or options.searchIndexFile is not None:
+            error('--search-index and --search-index-file cannot be' \
+                  ' combined with --server, the daemon keeps the index in' \
+                  ' memory')
+        # the daemon resolves file names relative to its own directory
+        if options.checkCacheFile is not None:
+            options.checkCacheFile = os.path.abspath(options.checkCacheFile)
+        try:
+            response = queryServer(options.server,
+                                   {'command' : 'ndbinfo',
+                                    'file' : os.path.abspath(f),
+                                    'options' : options.toJSONObject()})
+        except (socket.error, ValueError), e:
+            error('cannot query server %s: %s' % (options.server, e))
+        sys.stdout.write(response['stdout'].encode('utf-8'))
+        sys.stderr.write(response['stderr'].encode('utf-8'))
+        sys.exit(response['exitCode'])
+
+    nodeDB = nodedb.load(f)
+
+    sys.exit(runQuery(nodeDB, options, f, sys.stdout, sys.stderr))
 
 if __name__ == '__main__':
     main()
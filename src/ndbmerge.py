@@ -0,0 +1,331 @@
+#!/usr/bin/env python
+
+# ndbmerge.py -- Three-way merge of X3D Type Hierarchies
+#
+# Author: Dmitri Rubinstein <rubinstein@cs.uni-saarland.de>
+#
+# Copyright (C) 2008 Saarland University
+# Copyright (C) 2009, 2010, 2011, 2012 German Research Center for
+# Artificial Intelligence (DFKI)
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+
+import sys
+import getopt
+import json
+import nodedb
+
+# Both sides are compared with the base database, changes are matched by
+# node type and by field or property name. Changes done only on one side
+# are applied, equal changes on both sides are applied once, different
+# changes are conflicts resolved in favor of the preferred side.
+#
+# Removing or adding a node conflicts with any different change of the same
+# node on the other side. Field and node order are merged after all other
+# changes: the order of the preferred side is used when it was changed
+# there, fields and nodes missing in that order keep their positions at
+# the end.
+#
+# Only nodes with different fingerprints are compared, but by default the
+# result is a copy of the whole base database with updated hierarchy.
+# When base is not needed any more (like in main) the changes are applied
+# to base in place and the hierarchy is not updated, so the cost of
+# applying depends only on the size of the changes.
+
+class Conflict(object):
+
+    def __init__(self, kind, nodeType, name, oursChanges, theirsChanges,
+                 resolution):
+        # kind is one of 'node', 'property', 'field', 'fieldOrder',
+        # 'nodeOrder'
+        self.kind = kind
+        self.nodeType = nodeType
+        self.name = name
+        self.oursChanges = oursChanges
+        self.theirsChanges = theirsChanges
+        self.resolution = resolution
+
+    def toJSONObject(self):
+        return {'kind' : self.kind,
+                'node' : self.nodeType,
+                'name' : self.name,
+                'ours' : map(nodedb.changeToJSONObject, self.oursChanges),
+                'theirs' : map(nodedb.changeToJSONObject,
+                               self.theirsChanges),
+                'resolution' : self.resolution}
+
+    def __str__(self):
+        if self.kind == 'nodeOrder':
+            return 'CONFLICT (nodeOrder): using %s' % self.resolution
+        if self.name is None:
+            return 'CONFLICT (%s): %s, using %s' % \
+                   (self.kind, self.nodeType, self.resolution)
+        return 'CONFLICT (%s): %s.%s, using %s' % \
+               (self.kind, self.nodeType, self.name, self.resolution)
+
+def conflictsToJSON(conflicts):
+    return json.dumps([c.toJSONObject() for c in conflicts],
+                      sort_keys=True, indent=4, cls=nodedb.NodeDBEncoder)
+
+def getChangeKey(change):
+    """returns tuple (kind, name) identifying the changed entity
+    inside of the node"""
+    op = change[0]
+    if op in ('addNode', 'removeNode'):
+        return ('node', None)
+    if op == 'setNodeProperty':
+        return ('property', change[2])
+    return ('field', change[-1].getName())
+
+def isSameChange(change1, change2):
+    """returns True when both changes have the same result"""
+    op = change1[0]
+    if op != change2[0]:
+        return False
+    if op in ('removeField', 'removeNode'):
+        return True
+    if op == 'setNodeProperty':
+        return change1[4] == change2[4]
+    if op == 'addNode':
+        node1 = change1[2]
+        node2 = change2[2]
+        return node1.hasSameFingerprint(node2, True)
+    field1 = change1[-1]
+    field2 = change2[-1]
+    return field1.getName() == field2.getName() and field1 == field2
+
+def isSameChangeList(changes1, changes2):
+    if len(changes1) != len(changes2):
+        return False
+    for change1, change2 in zip(changes1, changes2):
+        if not isSameChange(change1, change2):
+            return False
+    return True
+
+def groupChanges(changes):
+    """returns tuple (dictionary node type : changes, node type list,
+    field order changes, node order change)"""
+    nodeChanges = {}
+    nodeTypes = []
+    fieldOrderChanges = {}
+    nodeOrderChange = None
+    for change in changes:
+        if change[0] == 'setNodeOrder':
+            nodeOrderChange = change
+        elif change[0] == 'setNodeProperty' and change[2] == 'fieldOrder':
+            fieldOrderChanges[change[1]] = change
+        else:
+            if change[1] not in nodeChanges:
+                nodeChanges[change[1]] = []
+                nodeTypes.append(change[1])
+            nodeChanges[change[1]].append(change)
+    return nodeChanges, nodeTypes, fieldOrderChanges, nodeOrderChange
+
+def mergeOrder(currentOrder, preferredOrder):
+    """returns currentOrder sorted by preferredOrder, names missing in
+    preferredOrder are appended in their current order"""
+    current = dict.fromkeys(currentOrder)
+    order = [name for name in preferredOrder if name in current]
+    used = dict.fromkeys(order)
+    order.extend([name for name in currentOrder if name not in used])
+    return order
+
+def mergeNodeChanges(nodeType, oursChanges, theirsChanges, preferTheirs,
+                     conflicts):
+    """returns list of merged changes of a single node"""
+    resolution = (preferTheirs and 'theirs') or 'ours'
+    if not oursChanges:
+        return theirsChanges
+    if not theirsChanges:
+        return oursChanges
+
+    nodeOps = ('addNode', 'removeNode')
+    if oursChanges[0][0] in nodeOps or theirsChanges[0][0] in nodeOps:
+        if isSameChangeList(oursChanges, theirsChanges):
+            return oursChanges
+        conflicts.append(Conflict('node', nodeType, None, oursChanges,
+                                  theirsChanges, resolution))
+        return (preferTheirs and theirsChanges) or oursChanges
+
+    theirsByKey = {}
+    for change in theirsChanges:
+        theirsByKey[getChangeKey(change)] = change
+
+    merged = []
+    oursKeys = {}
+    for change in oursChanges:
+        key = getChangeKey(change)
+        oursKeys[key] = True
+        theirsChange = theirsByKey.get(key)
+        if theirsChange is None or isSameChange(change, theirsChange):
+            merged.append(change)
+        else:
+            conflicts.append(Conflict(key[0], nodeType, key[1], [change],
+                                      [theirsChange], resolution))
+            merged.append((preferTheirs and theirsChange) or change)
+    merged.extend([c for c in theirsChanges
+                   if getChangeKey(c) not in oursKeys])
+    return merged
+
+def merge(base, ours, theirs, preferTheirs=False, inPlace=False):
+    """returns tuple (merged NodeDB, list of Conflict instances).
+    When inPlace is True the changes are applied to base, which is
+    returned without updated hierarchy."""
+    resolution = (preferTheirs and 'theirs') or 'ours'
+    conflicts = []
+
+    # Note: compare skips nodes with equal fingerprints
+    oursNodeChanges, oursTypes, oursFieldOrders, oursNodeOrder = \
+                     groupChanges(base.compare(ours, True))
+    theirsNodeChanges, theirsTypes, theirsFieldOrders, theirsNodeOrder = \
+                       groupChanges(base.compare(theirs, True))
+
+    changes = []
+    for nodeType in oursTypes + [t for t in theirsTypes
+                                 if t not in oursNodeChanges]:
+        changes.extend(mergeNodeChanges(nodeType,
+                                        oursNodeChanges.get(nodeType, []),
+                                        theirsNodeChanges.get(nodeType, []),
+                                        preferTheirs, conflicts))
+
+    if inPlace:
+        result = base
+    else:
+        result = base.copy()
+    result.applyChanges(changes, updateHierarchy=not inPlace)
+
+    # field order
+    nodeTypes = oursFieldOrders.keys() + \
+                [t for t in theirsFieldOrders if t not in oursFieldOrders]
+    nodeTypes.sort()
+    for nodeType in nodeTypes:
+        node = result.getNode(nodeType)
+        if node is None:
+            continue
+        oursChange = oursFieldOrders.get(nodeType)
+        theirsChange = theirsFieldOrders.get(nodeType)
+        if oursChange and theirsChange and \
+           oursChange[4] != theirsChange[4]:
+            conflicts.append(Conflict('fieldOrder', nodeType, None,
+                                      [oursChange], [theirsChange],
+                                      resolution))
+        if preferTheirs:
+            change = theirsChange or oursChange
+        else:
+            change = oursChange or theirsChange
+        node.setFieldOrder(mergeOrder(node.getProperty('fieldOrder'),
+                                      change[4]))
+
+    # node order
+    if oursNodeOrder and theirsNodeOrder and \
+       oursNodeOrder[3] != theirsNodeOrder[3]:
+        conflicts.append(Conflict('nodeOrder', None, None,
+                                  [oursNodeOrder], [theirsNodeOrder],
+                                  resolution))
+    if preferTheirs:
+        change = theirsNodeOrder or oursNodeOrder
+    else:
+        change = oursNodeOrder or theirsNodeOrder
+    if change:
+        result.setNodeOrder(mergeOrder([n.getType()
+                                        for n in result.getNodeList()],
+                                       change[3]))
+
+    return result, conflicts
+
+def usage(exitCode = 0):
+    print 'Usage:',sys.argv[0],'[options] base-node-db-file our-node-db-file their-node-db-file'
+    print '-h | --help                     Print this message and exit.'
+    print '-o | --output file              Write merged node database to file instead of stdout'
+    print '-c | --codec name               Compress output node database with'
+    print '                                the specified codec (%s)' % \
+          ', '.join(nodedb.getCodecNames())
+    print '-t | --theirs                   Resolve conflicts with their changes instead of ours'
+    print '-j | --json file                Write conflicts in JSON format to file'
+    print 'Exit status is 1 when there were conflicts.'
+    sys.exit(exitCode)
+
+def error(msg, exitCode = 2, exit = True):
+    sys.stderr.write('Error: ')
+    sys.stderr.write(msg)
+    sys.stderr.write('\n')
+    if exit:
+        sys.exit(exitCode)
+
+def main():
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], 'ho:c:tj:',
+                                   ['help', 'output=', 'codec=', 'theirs',
+                                    'json='])
+    except getopt.GetoptError, e:
+        error(str(e), exit = False)
+        usage(2)
+
+    outputFile = None
+    codec = None
+    preferTheirs = False
+    jsonFile = None
+
+    for o, a in opts:
+        if o in ('-h', '--help'):
+            usage()
+        elif o in ('-o', '--output'):
+            outputFile = a
+        elif o in ('-c', '--codec'):
+            codec = a
+        elif o in ('-t', '--theirs'):
+            preferTheirs = True
+        elif o in ('-j', '--json'):
+            jsonFile = a
+
+    if codec is not None and codec != 'none' and \
+       codec not in nodedb.getCodecNames():
+        error('unknown compression codec %s' % codec)
+
+    if len(args) != 3:
+        error('you must specify base, our and their node database files')
+
+    ndbs = []
+    for f in args:
+        print >>sys.stderr, 'NodeDB file:', f
+        ndbs.append(nodedb.load(f))
+
+    try:
+        result, conflicts = merge(ndbs[0], ndbs[1], ndbs[2], preferTheirs,
+                                  inPlace=True)
+    except nodedb.NodeDBException, e:
+        error('cannot merge: %s' % e)
+
+    for conflict in conflicts:
+        print >>sys.stderr, conflict
+
+    if jsonFile is not None:
+        fd = open(jsonFile, 'w')
+        try:
+            fd.write(conflictsToJSON(conflicts))
+            fd.write('\n')
+        finally:
+            fd.close()
+
+    if outputFile is not None:
+        result.save(outputFile, codec)
+    else:
+        result.save(sys.stdout, codec)
+
+    if conflicts:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
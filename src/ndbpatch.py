@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+
+# ndbpatch.py -- Apply JSON patches to X3D Type Hierarchy
+#
+# Author: Dmitri Rubinstein <rubinstein@cs.uni-saarland.de>
+#
+# Copyright (C) 2008 Saarland University
+# Copyright (C) 2009, 2010, 2011, 2012 German Research Center for
+# Artificial Intelligence (DFKI)
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+
+import sys
+import getopt
+import nodedb
+
+def usage(exitCode = 0):
+    print 'Usage:',sys.argv[0],'[options] node-db-file patch-file'
+    print '-h | --help                     Print this message and exit.'
+    print '-o | --output file              Write patched node database to file instead of stdout'
+    print '-c | --codec name               Compress output node database with'
+    print '                                the specified codec (%s)' % \
+          ', '.join(nodedb.getCodecNames())
+    print '-f | --force                    Do not check that the old values stored in the patch'
+    print '                                match the node database'
+    print 'Patches are created with ndbdiff.py -j, use - as patch-file to read it from stdin.'
+    sys.exit(exitCode)
+
+def error(msg, exitCode = 1, exit = True):
+    sys.stderr.write('Error: ')
+    sys.stderr.write(msg)
+    sys.stderr.write('\n')
+    if exit:
+        sys.exit(exitCode)
+
+def main():
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], 'ho:c:f',
+                                   ['help', 'output=', 'codec=', 'force'])
+    except getopt.GetoptError, e:
+        error(str(e), exit = False)
+        usage(1)
+
+    outputFile = None
+    codec = None
+    strict = True
+
+    for o, a in opts:
+        if o in ('-h', '--help'):
+            usage()
+        elif o in ('-o', '--output'):
+            outputFile = a
+        elif o in ('-c', '--codec'):
+            codec = a
+        elif o in ('-f', '--force'):
+            strict = False
+
+    if codec is not None and codec != 'none' and \
+       codec not in nodedb.getCodecNames():
+        error('unknown compression codec %s' % codec)
+
+    if len(args) != 2:
+        error('you must specify node database file and patch file')
+
+    f = args[0]
+    pf = args[1]
+    print >>sys.stderr, 'NodeDB file:', f
+    print >>sys.stderr, 'Patch file:', pf
+
+    ndb = nodedb.load(f)
+
+    try:
+        if pf == '-':
+            changes = nodedb.changesFromJSON(sys.stdin)
+        else:
+            fd = open(pf, 'r')
+            try:
+                changes = nodedb.changesFromJSON(fd)
+            finally:
+                fd.close()
+        ndb.applyChanges(changes, strict)
+    except (nodedb.NodeDBException, ValueError), e:
+        error('cannot apply patch %s: %s' % (pf, e))
+
+    print >>sys.stderr, 'Applied %i changes' % len(changes)
+
+    if outputFile is not None:
+        ndb.save(outputFile, codec)
+    else:
+        ndb.save(sys.stdout, codec)
+
+if __name__ == '__main__':
+    main()
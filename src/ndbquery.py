@@ -0,0 +1,506 @@
+#!/usr/bin/env python
+
+# ndbquery.py -- Queries of X3D Type Hierarchy
+#
+# Author: Dmitri Rubinstein <rubinstein@cs.uni-saarland.de>
+#
+# Copyright (C) 2008 Saarland University
+# Copyright (C) 2009, 2010, 2011, 2012 German Research Center for
+# Artificial Intelligence (DFKI)
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+
+import sys
+import re
+import getopt
+import fnmatch
+import nodedb
+import ndbancestry
+
+# Query syntax:
+#
+#   query     := ('nodes' | 'fields') ['where' expr]
+#   expr      := term ('or' term)*
+#   term      := factor ('and' factor)*
+#   factor    := 'not' factor | '(' expr ')' | predicate
+#   predicate := attribute ('=' | '!=') value
+#              | attribute 'in' '(' value (',' value)* ')'
+#              | ['node'] 'derives' value
+#
+# Values may contain * and ? wildcards. Field attributes are type, access,
+# name, annotation and accepts (valid value type), node attributes are
+# node, component and abstract; node attributes select all fields of
+# the matching nodes in field queries. Node queries support node
+# attributes, type or name as synonyms of node and field (nodes with
+# a field of that name). Values can be quoted with ".
+#
+# e.g. fields where type in (SFNode,MFNode) and access=[in,out] and
+#      node derives X3DChildNode and component=Rendering
+#
+# Queries are compiled into plans of index lookups combined by set
+# operations, intersections start with the smallest set and negated terms
+# of intersections are subtracted.
+
+class QueryException(nodedb.NodeDBException):
+    pass
+
+FIELD_ATTRIBUTES = ['type', 'access', 'name', 'annotation', 'accepts']
+NODE_ATTRIBUTES = ['node', 'component', 'abstract']
+
+# field attribute : attribute of nodedb.NodeDBIndex
+INDEX_ATTRIBUTES = {'type' : 'type', 'access' : 'accessType',
+                    'name' : 'name', 'annotation' : 'annotation',
+                    'accepts' : 'validValueType'}
+
+ACCESS_TYPE_NAMES = {'initializeOnly' : nodedb.INITIALIZE_ONLY,
+                     'inputOnly' : nodedb.INPUT_ONLY,
+                     'outputOnly' : nodedb.OUTPUT_ONLY,
+                     'inputOutput' : nodedb.INPUT_OUTPUT}
+
+class QueryIndex(object):
+    """inverted indexes of a node database. Fields are identified by
+    tuples (node type, field name), nodes by node type. Field lookups
+    use the indexes of the database (see nodedb.NodeDBIndex)."""
+
+    def __init__(self, nodeDB):
+        self.nodeDB = nodeDB
+        self.ancestry = ndbancestry.Ancestry(nodeDB)
+        # field key or node type : position in the database
+        self.order = {}
+        self.allNodes = set()
+        self.allFields = set()
+        # node type : field keys
+        self.fieldsOfNode = {}
+        # node attribute : {value : node types}
+        self.nodeIndexes = {'component' : {}, 'abstract' : {}}
+
+        for node in nodeDB.getNodeList():
+            nodeType = node.getType()
+            self.order[nodeType] = len(self.order)
+            self.allNodes.add(nodeType)
+            self._add(self.nodeIndexes['component'], node.getComponentName(),
+                      nodeType)
+            self._add(self.nodeIndexes['abstract'],
+                      str(bool(node.isAbstract())).lower(), nodeType)
+            fieldKeys = []
+            for field in node.getFields():
+                key = (nodeType, field.getName())
+                self.order[key] = len(self.order)
+                fieldKeys.append(key)
+            self.fieldsOfNode[nodeType] = fieldKeys
+            self.allFields.update(fieldKeys)
+
+    def _add(self, index, value, key):
+        keys = index.get(value)
+        if keys is None:
+            index[value] = keys = set()
+        keys.add(key)
+
+    def _lookup(self, index, value):
+        if isinstance(value, str) and ('*' in value or '?' in value):
+            result = set()
+            for v, keys in index.items():
+                if fnmatch.fnmatchcase(str(v), value):
+                    result.update(keys)
+            return result
+        return index.get(value, set())
+
+    def _lookupPostings(self, attribute, value):
+        values = [value]
+        if isinstance(value, str) and ('*' in value or '?' in value):
+            values = [v for v in self.nodeDB.index.getValues(attribute)
+                      if fnmatch.fnmatchcase(str(v), value)]
+        result = set()
+        for v in values:
+            result.update([(node.getType(), field.getName()) for node, field
+                           in self.nodeDB.index.getFields(attribute, v)])
+        return result
+
+    def lookupFields(self, attribute, value):
+        if attribute == 'access':
+            value = parseAccessType(value)
+        return self._lookupPostings(INDEX_ATTRIBUTES[attribute], value)
+
+    def lookupNodes(self, attribute, value):
+        if attribute == 'node':
+            if '*' in value or '?' in value:
+                return set(fnmatch.filter(self.allNodes, value))
+            if value in self.allNodes:
+                return set([value])
+            return set()
+        if attribute == 'field':
+            return set([key[0] for key in self.lookupFields('name', value)])
+        if attribute == 'abstract':
+            value = value.lower()
+        return self._lookup(self.nodeIndexes[attribute], value)
+
+    def lookupDerivedNodes(self, value):
+        result = set()
+        for nodeType in self.lookupNodes('node', value):
+            node = self.nodeDB.getNode(nodeType)
+            result.update([n.getType() for n in self.ancestry.nodesFromBits(
+                self.ancestry.getDescendantBits(node))])
+        return result
+
+    def getFieldsOfNodes(self, nodeTypes):
+        result = set()
+        for nodeType in nodeTypes:
+            result.update(self.fieldsOfNode[nodeType])
+        return result
+
+    def sortKeys(self, keys):
+        keys = list(keys)
+        keys.sort(key=self.order.__getitem__)
+        return keys
+
+def parseAccessType(value):
+    if value in ACCESS_TYPE_NAMES:
+        return ACCESS_TYPE_NAMES[value]
+    if '*' in value or '?' in value:
+        raise QueryException('Wildcards are not supported in access types')
+    accessType = nodedb.convertAccessTypeNameToId(value)
+    if accessType < 0:
+        raise QueryException('Unknown access type %s' % value)
+    return accessType
+
+# Parser
+
+TOKEN_PATTERN = re.compile(r'\s*(?:(\[[^\]]*\])|(!=|[=(),])|"([^"]*)"|([^\s=!(),"]+))')
+
+KEYWORDS = ['nodes', 'fields', 'where', 'and', 'or', 'not', 'in',
+            'derives']
+
+class QuotedValue(str):
+    """value token which is never a keyword or an operator"""
+    pass
+
+def tokenize(query):
+    tokens = []
+    pos = 0
+    query = query.strip()
+    while pos < len(query):
+        m = TOKEN_PATTERN.match(query, pos)
+        if m is None:
+            raise QueryException('Invalid character at position %i of query' \
+                                 ' "%s"' % (pos, query))
+        if m.group(3) is not None:
+            # quoted value
+            tokens.append(QuotedValue(m.group(3)))
+        else:
+            tokens.append(m.group(1) or m.group(2) or m.group(4))
+        pos = m.end()
+    return tokens
+
+class Parser(object):
+    """compiles query into plan, plans are tuples:
+    ('fields', attribute, values), ('nodes', attribute, values),
+    ('derives', values), ('and', plans), ('or', plans), ('not', plan),
+    ('all',) and ('fieldsOfNodes', plan)"""
+
+    def __init__(self, query):
+        self.query = query
+        self.tokens = tokenize(query)
+        self.pos = 0
+
+    def error(self, msg):
+        raise QueryException('%s in query "%s"' % (msg, self.query))
+
+    def peek(self):
+        if self.pos < len(self.tokens):
+            return self.tokens[self.pos]
+        return None
+
+    def next(self):
+        token = self.peek()
+        if token is None:
+            self.error('Unexpected end')
+        self.pos += 1
+        return token
+
+    def expect(self, token):
+        t = self.next()
+        if t != token:
+            self.error('Expected "%s" but found "%s"' % (token, t))
+
+    def parse(self):
+        """returns tuple (result kind 'nodes' or 'fields', plan)"""
+        self.kind = self.next()
+        if self.kind not in ('nodes', 'fields'):
+            self.error('Query must start with "nodes" or "fields"')
+        if self.peek() is None:
+            return self.kind, ('all',)
+        self.expect('where')
+        plan = self.parseExpr()
+        if self.peek() is not None:
+            self.error('Unexpected "%s"' % self.peek())
+        return self.kind, plan
+
+    def parseExpr(self):
+        plans = [self.parseTerm()]
+        while self.peek() == 'or':
+            self.next()
+            plans.append(self.parseTerm())
+        if len(plans) == 1:
+            return plans[0]
+        return ('or', plans)
+
+    def parseTerm(self):
+        plans = [self.parseFactor()]
+        while self.peek() == 'and':
+            self.next()
+            plans.append(self.parseFactor())
+        if len(plans) == 1:
+            return plans[0]
+        return ('and', plans)
+
+    def parseFactor(self):
+        token = self.peek()
+        if token == 'not':
+            self.next()
+            return ('not', self.parseFactor())
+        if token == '(':
+            self.next()
+            plan = self.parseExpr()
+            self.expect(')')
+            return plan
+        return self.parsePredicate()
+
+    def parseValue(self):
+        value = self.next()
+        if isinstance(value, QuotedValue):
+            return str(value)
+        if value in ('(', ')', ',', '=', '!=') or value in KEYWORDS:
+            self.error('Expected value but found "%s"' % value)
+        return value
+
+    def parsePredicate(self):
+        attribute = self.next()
+        if attribute == 'node' and self.peek() == 'derives':
+            attribute = self.next()
+        if attribute == 'derives':
+            return self.makePredicate(attribute, [self.parseValue()])
+
+        op = self.next()
+        if op in ('=', '!='):
+            values = [self.parseValue()]
+        elif op == 'in':
+            self.expect('(')
+            values = [self.parseValue()]
+            while self.peek() == ',':
+                self.next()
+                values.append(self.parseValue())
+            self.expect(')')
+        else:
+            self.error('Expected "=", "!=" or "in" but found "%s"' % op)
+        plan = self.makePredicate(attribute, values)
+        if op == '!=':
+            plan = ('not', plan)
+        return plan
+
+    def makePredicate(self, attribute, values):
+        if self.kind == 'nodes' and attribute in ('type', 'name'):
+            attribute = 'node'
+        if attribute == 'derives':
+            plan = ('derives', values)
+        elif attribute in NODE_ATTRIBUTES or \
+             (attribute == 'field' and self.kind == 'nodes'):
+            plan = ('nodes', attribute, values)
+        elif attribute in FIELD_ATTRIBUTES and self.kind == 'fields':
+            return ('fields', attribute, values)
+        else:
+            self.error('Unknown attribute %s of %s' % (attribute, self.kind))
+        if self.kind == 'fields':
+            return ('fieldsOfNodes', plan)
+        return plan
+
+def compileQuery(query):
+    """returns tuple (result kind 'nodes' or 'fields', plan)"""
+    return Parser(query).parse()
+
+def formatPlan(plan, indent=''):
+    op = plan[0]
+    if op in ('and', 'or'):
+        lines = [indent + op]
+        for p in plan[1]:
+            lines.extend(formatPlan(p, indent + '  '))
+        return lines
+    if op in ('not', 'fieldsOfNodes'):
+        return [indent + op] + formatPlan(plan[1], indent + '  ')
+    if op == 'derives':
+        return [indent + 'derived nodes of %s' % ','.join(plan[1])]
+    if op == 'all':
+        return [indent + 'all']
+    return [indent + 'lookup %s %s %s' % (op, plan[1], ','.join(plan[2]))]
+
+def evaluatePlan(index, kind, plan):
+    """returns set of node types or field keys"""
+    op = plan[0]
+    if op == 'all':
+        if kind == 'fields':
+            return set(index.allFields)
+        return set(index.allNodes)
+    if op == 'fields':
+        result = set()
+        for value in plan[2]:
+            result.update(index.lookupFields(plan[1], value))
+        return result
+    if op == 'nodes':
+        result = set()
+        for value in plan[2]:
+            result.update(index.lookupNodes(plan[1], value))
+        return result
+    if op == 'derives':
+        result = set()
+        for value in plan[1]:
+            result.update(index.lookupDerivedNodes(value))
+        return result
+    if op == 'fieldsOfNodes':
+        return index.getFieldsOfNodes(evaluatePlan(index, 'nodes', plan[1]))
+    if op == 'not':
+        return evaluatePlan(index, kind, ('all',)) - \
+               evaluatePlan(index, kind, plan[1])
+    if op == 'or':
+        result = set()
+        for p in plan[1]:
+            result.update(evaluatePlan(index, kind, p))
+        return result
+    if op == 'and':
+        positive = [evaluatePlan(index, kind, p) for p in plan[1]
+                    if p[0] != 'not']
+        negative = [evaluatePlan(index, kind, p[1]) for p in plan[1]
+                    if p[0] == 'not']
+        if positive:
+            positive.sort(key=len)
+            result = positive[0]
+            for s in positive[1:]:
+                if not result:
+                    break
+                result = result.intersection(s)
+        else:
+            result = evaluatePlan(index, kind, ('all',))
+        for s in negative:
+            result = result - s
+        return result
+    raise QueryException('Invalid plan %s' % op)
+
+def runQuery(index, query):
+    """returns tuple (result kind, list of node types or field keys in
+    the order of the database)"""
+    kind, plan = compileQuery(query)
+    return kind, index.sortKeys(evaluatePlan(index, kind, plan))
+
+def usage(exitCode = 0):
+    print 'Usage:',sys.argv[0],'[options] node-db-file [query ...]'
+    print '-h | --help                     Print this message and exit.'
+    print '-f | --file file                Read queries from file, one per line (- for stdin)'
+    print '-l | --long                     Print field declarations instead of names'
+    print '-c | --count                    Print only number of results'
+    print '-e | --explain                  Print query plans'
+    print 'Queries are run on a single loaded database, e.g.'
+    print '  "fields where type in (SFNode,MFNode) and access=[in,out]'
+    print '   and node derives X3DChildNode and component=Rendering"'
+    print '  "nodes where abstract=false and field=url"'
+    sys.exit(exitCode)
+
+def error(msg, exitCode = 1, exit = True):
+    sys.stderr.write('Error: ')
+    sys.stderr.write(msg)
+    sys.stderr.write('\n')
+    if exit:
+        sys.exit(exitCode)
+
+def main():
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], 'hf:lce',
+                                   ['help', 'file=', 'long', 'count',
+                                    'explain'])
+    except getopt.GetoptError, e:
+        error(str(e), exit = False)
+        usage(1)
+
+    queryFiles = []
+    printLong = False
+    printCount = False
+    explain = False
+
+    for o, a in opts:
+        if o in ('-h', '--help'):
+            usage()
+        elif o in ('-f', '--file'):
+            queryFiles.append(a)
+        elif o in ('-l', '--long'):
+            printLong = True
+        elif o in ('-c', '--count'):
+            printCount = True
+        elif o in ('-e', '--explain'):
+            explain = True
+
+    if len(args) < 1:
+        error('you must specify node database file')
+
+    queries = args[1:]
+    for f in queryFiles:
+        if f == '-':
+            fd = sys.stdin
+        else:
+            fd = open(f)
+        try:
+            for line in fd:
+                line = line.strip()
+                if line and not line.startswith('#'):
+                    queries.append(line)
+        finally:
+            if fd is not sys.stdin:
+                fd.close()
+
+    if not queries:
+        error('you must specify queries')
+
+    f = args[0]
+    print >>sys.stderr, 'NodeDB file:', f
+    nodeDB = nodedb.load(f)
+    index = QueryIndex(nodeDB)
+
+    out = sys.stdout
+    exitCode = 0
+    for query in queries:
+        if len(queries) > 1:
+            out.write('=== %s ===\n' % query)
+        try:
+            kind, plan = compileQuery(query)
+        except QueryException, e:
+            error(str(e), exit = False)
+            exitCode = 1
+            continue
+        if explain:
+            for line in formatPlan(plan):
+                out.write('# %s\n' % line)
+        result = index.sortKeys(evaluatePlan(index, kind, plan))
+        if printCount:
+            out.write('%i\n' % len(result))
+        elif kind == 'nodes':
+            for nodeType in result:
+                out.write('%s\n' % nodeType)
+        else:
+            for nodeType, fieldName in result:
+                if printLong:
+                    field = nodeDB.getNode(nodeType).findField(fieldName)
+                    out.write('%s : %s\n' % (nodeType, field))
+                else:
+                    out.write('%s.%s\n' % (nodeType, fieldName))
+    sys.exit(exitCode)
+
+if __name__ == '__main__':
+    main()
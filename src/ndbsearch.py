@@ -0,0 +1,347 @@
+#!/usr/bin/env python
+
+# ndbsearch.py -- Full-text search in X3D Type Hierarchy
+#
+# Author: Dmitri Rubinstein <rubinstein@cs.uni-saarland.de>
+#
+# Copyright (C) 2008 Saarland University
+# Copyright (C) 2009, 2010, 2011, 2012 German Research Center for
+# Artificial Intelligence (DFKI)
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+
+import sys
+import getopt
+import hashlib
+import cPickle as pickle
+import nodedb
+
+# Searched texts are node types, names of fields, info strings of fields
+# and annotations of fields. Every distinct lower case text of a kind is
+# a term. Terms are padded with two spaces in front and one space at the
+# end and indexed by all their trigrams (substrings of length 3), so
+# substrings of terms are found by intersecting the term sets of the
+# trigrams of the substring, and similar terms by counting common
+# trigrams.
+
+KINDS = ['node', 'field', 'info', 'annotation']
+
+SEARCH_INDEX_VERSION = 1
+
+def getTrigrams(text):
+    """returns list of distinct trigrams of the lower case text"""
+    text = text.lower()
+    trigrams = {}
+    for i in xrange(len(text) - 2):
+        trigrams[text[i:i+3]] = True
+    return trigrams.keys()
+
+def padTerm(text):
+    return '  ' + text.lower() + ' '
+
+def getEditDistance(a, b):
+    """returns Levenshtein distance of strings a and b"""
+    previous = range(len(b) + 1)
+    for i, ca in enumerate(a):
+        current = [i + 1]
+        for j, cb in enumerate(b):
+            current.append(min(previous[j + 1] + 1, current[j] + 1,
+                               previous[j] + (ca != cb)))
+        previous = current
+    return previous[-1]
+
+def getDatabaseKey(nodeDB):
+    """returns MD5 digest of the searched content of nodeDB"""
+    h = hashlib.md5()
+    for node in nodeDB.getNodeList():
+        h.update(node.getFingerprint())
+        h.update('\0'.join([f.getName() for f in node.getOwnFields()]))
+    return h.digest()
+
+def getSearchIndexFileName(nodeDBFileName):
+    return nodeDBFileName + '.search'
+
+class SearchIndex(object):
+    """trigram index of the texts of a node database. Matches are tuples
+    (kind, node type, field name or None, text) in the order of the
+    database."""
+
+    def __init__(self, nodeDB=None):
+        self.databaseKey = None
+        # term id : (kind, lower case text)
+        self.terms = []
+        # term id : number of trigrams of the padded term
+        self.numTrigrams = []
+        # term id : list of matches
+        self.matches = []
+        # kind : {trigram : list of term ids}
+        self.trigrams = {}
+        for kind in KINDS:
+            self.trigrams[kind] = {}
+
+        if nodeDB is not None:
+            self._build(nodeDB)
+
+    def _build(self, nodeDB):
+        self.databaseKey = getDatabaseKey(nodeDB)
+        # (kind, lower case text) : term id
+        termIds = {}
+        for node in nodeDB.getNodeList():
+            nodeType = node.getType()
+            self._add(termIds, ('node', nodeType, None, nodeType))
+            for field in node.getOwnFields():
+                fieldName = field.getName()
+                self._add(termIds, ('field', nodeType, fieldName, fieldName))
+                if field.getInfo():
+                    self._add(termIds, ('info', nodeType, fieldName,
+                                        field.getInfo()))
+                annotations = field.getAnnotations().annotDict.items()
+                annotations.sort()
+                for name, annotation in annotations:
+                    self._add(termIds, ('annotation', nodeType, fieldName,
+                                        annotation.toString()))
+
+    def _add(self, termIds, match):
+        term = (match[0], match[3].lower())
+        termId = termIds.get(term)
+        if termId is None:
+            termId = termIds[term] = len(self.terms)
+            self.terms.append(term)
+            self.matches.append([])
+            trigrams = getTrigrams(padTerm(term[1]))
+            self.numTrigrams.append(len(trigrams))
+            kindTrigrams = self.trigrams[term[0]]
+            for trigram in trigrams:
+                termList = kindTrigrams.get(trigram)
+                if termList is None:
+                    kindTrigrams[trigram] = termList = []
+                termList.append(termId)
+        self.matches[termId].append(match)
+
+    def _getMatches(self, termIds):
+        """returns matches of terms sorted by kind and database order"""
+        termIds = list(termIds)
+        termIds.sort()
+        kindOrder = dict([(kind, i) for i, kind in enumerate(KINDS)])
+        termIds.sort(key=lambda termId: kindOrder[self.terms[termId][0]])
+        result = []
+        for termId in termIds:
+            result.extend(self.matches[termId])
+        return result
+
+    def search(self, text, kinds=None):
+        """returns list of matches whose texts contain text, case is
+        ignored. kinds is the list of searched kinds (by default all)."""
+        if kinds is None:
+            kinds = KINDS
+        text = text.lower()
+        trigrams = getTrigrams(text)
+        termIds = []
+        for kind in kinds:
+            kindTrigrams = self.trigrams[kind]
+            if trigrams:
+                termLists = [kindTrigrams.get(t, []) for t in trigrams]
+                termLists.sort(key=len)
+                candidates = set(termLists[0])
+                for termList in termLists[1:]:
+                    if not candidates:
+                        break
+                    candidates.intersection_update(termList)
+            else:
+                # texts shorter than a trigram are searched in all terms
+                candidates = [termId for termId in xrange(len(self.terms))
+                              if self.terms[termId][0] == kind]
+            termIds.extend([termId for termId in candidates
+                            if text in self.terms[termId][1]])
+        return self._getMatches(termIds)
+
+    def suggest(self, text, kinds=['node'], limit=5, minScore=0.3):
+        """returns list of (score, text) tuples of the at most limit
+        texts of kinds most similar to text, best first. The score is the
+        number of common trigrams divided by the number of all trigrams
+        of both padded texts, between minScore and 1. The best scored
+        texts are returned in the order of their edit distance to text."""
+        trigrams = getTrigrams(padTerm(text))
+        # term id : number of common trigrams
+        common = {}
+        for kind in kinds:
+            kindTrigrams = self.trigrams[kind]
+            for trigram in trigrams:
+                for termId in kindTrigrams.get(trigram, ()):
+                    common[termId] = common.get(termId, 0) + 1
+        scores = []
+        for termId, count in common.iteritems():
+            score = float(count) / (len(trigrams) + self.numTrigrams[termId]
+                                    - count)
+            if score >= minScore:
+                scores.append((-score, termId))
+        scores.sort()
+        # the best candidates by trigrams are ranked by edit distance,
+        # because trigrams do not tell apart texts differing in a single
+        # letter of short texts
+        numCandidates = limit * 4
+        if len(scores) > numCandidates:
+            cutoff = scores[numCandidates - 1][0]
+            scores = [s for s in scores if s[0] <= cutoff]
+        text = text.lower()
+        scores.sort(key=lambda s: (getEditDistance(
+            text, self.terms[s[1]][1]), s[0]))
+        result = []
+        # texts found in terms of several kinds are returned once
+        texts = {}
+        for score, termId in scores:
+            matchText = self.matches[termId][0][3]
+            if matchText not in texts:
+                texts[matchText] = True
+                result.append((-score, matchText))
+                if len(result) == limit:
+                    break
+        return result
+
+def loadSearchIndex(nodeDB, fileName=None):
+    """returns search index of nodeDB read from fileName. When the file
+    cannot be read or was written for another content of nodeDB the index
+    is built and written to fileName, NodeDBException is raised when it
+    cannot be written. Without fileName the index is only built."""
+    if fileName is None:
+        return SearchIndex(nodeDB)
+    databaseKey = getDatabaseKey(nodeDB)
+    try:
+        fd = open(fileName, 'rb')
+        try:
+            data = pickle.load(fd)
+        finally:
+            fd.close()
+        if isinstance(data, dict) and \
+           data.get('version') == SEARCH_INDEX_VERSION and \
+           data['index']['databaseKey'] == databaseKey:
+            index = SearchIndex()
+            index.__dict__.update(data['index'])
+            return index
+    except Exception:
+        pass
+
+    index = SearchIndex(nodeDB)
+    try:
+        fd = open(fileName, 'wb')
+        try:
+            pickle.dump({'version' : SEARCH_INDEX_VERSION,
+                         'index' : index.__dict__}, fd, 2)
+        finally:
+            fd.close()
+    except (IOError, OSError), e:
+        raise nodedb.NodeDBException('Cannot write search index %s: %s' % \
+                                     (fileName, e))
+    return index
+
+def formatSuggestions(suggestions):
+    """returns 'A', 'A or B', 'A, B or C' for suggestions of suggest"""
+    texts = [text for score, text in suggestions]
+    if len(texts) < 2:
+        return ''.join(texts)
+    return ', '.join(texts[:-1]) + ' or ' + texts[-1]
+
+def formatMatch(match):
+    kind, nodeType, fieldName, text = match
+    if fieldName is None:
+        location = nodeType
+    else:
+        location = '%s.%s' % (nodeType, fieldName)
+    if kind in ('info', 'annotation'):
+        return '%-10s %s: %s' % (kind, location, text)
+    return '%-10s %s' % (kind, location)
+
+def usage(exitCode = 0):
+    print 'Usage:',sys.argv[0],'[options] <node-db-file> text ...'
+    print '-h | --help                     Print this message and exit.'
+    print '-k | --kinds list               Search only texts of kinds separated by commas:'
+    print '                                node, field, info, annotation (default: all)'
+    print '-f | --fuzzy                    Print texts similar to text instead of texts containing it'
+    print '-m | --max-results n            Print at most n results (default: 10 with --fuzzy)'
+    print '--index                         Read and write index file <node-db-file>.search'
+    print '--index-file file               Read and write the specified index file'
+    print 'Searches case insensitive in node types, field names, info strings'
+    print 'and annotations of fields.'
+    sys.exit(exitCode)
+
+def error(msg, exitCode = 1, exit = True):
+    sys.stderr.write('Error: ')
+    sys.stderr.write(msg)
+    sys.stderr.write('\n')
+    if exit:
+        sys.exit(exitCode)
+
+def main():
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], 'hk:fm:',
+                                   ['help', 'kinds=', 'fuzzy',
+                                    'max-results=', 'index', 'index-file='])
+    except getopt.GetoptError, e:
+        error(str(e), exit = False)
+        usage(1)
+
+    kinds = None
+    fuzzy = False
+    maxResults = None
+    useIndexFile = False
+    indexFile = None
+
+    for o, a in opts:
+        if o in ('-h', '--help'):
+            usage()
+        elif o in ('-k', '--kinds'):
+            kinds = a.split(',')
+            for kind in kinds:
+                if kind not in KINDS:
+                    error('unknown kind %s' % kind)
+        elif o in ('-f', '--fuzzy'):
+            fuzzy = True
+        elif o in ('-m', '--max-results'):
+            try:
+                maxResults = int(a)
+            except ValueError:
+                maxResults = 0
+            if maxResults < 1:
+                error('invalid number of results %s' % a)
+        elif o == '--index':
+            useIndexFile = True
+        elif o == '--index-file':
+            indexFile = a
+
+    if len(args) < 2:
+        error('you must specify node database file and text')
+
+    f = args[0]
+    print >>sys.stderr, 'NodeDB file:', f
+
+    nodeDB = nodedb.load(f)
+    if useIndexFile and indexFile is None:
+        indexFile = getSearchIndexFileName(f)
+    try:
+        index = loadSearchIndex(nodeDB, indexFile)
+    except nodedb.NodeDBException, e:
+        error(str(e))
+
+    for text in args[1:]:
+        if fuzzy:
+            for score, match in index.suggest(text, kinds or KINDS,
+                                              maxResults or 10):
+                print '%.2f %s' % (score, match)
+        else:
+            for match in index.search(text, kinds)[:maxResults]:
+                print formatMatch(match)
+
+if __name__ == '__main__':
+    main()
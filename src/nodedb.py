@@ -21,10 +21,29 @@
 # along with this program; if not, write to the Free Software
 # Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
 
+import sys
 import cPickle as pickle
 import json
 import xml.sax.saxutils
 import re
+import zlib
+import hashlib
+import difflib
+import cStringIO
+import bz2
+
+try:
+    import lzma
+except ImportError:
+    try:
+        from backports import lzma
+    except ImportError:
+        lzma = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
 
 # field access types
 
@@ -33,6 +52,9 @@ INPUT_ONLY      = 1
 OUTPUT_ONLY     = 2
 INPUT_OUTPUT    = 3
 
+# version of the Python module format written by NodeDB.writePythonModule
+NDB_MODULE_VERSION = 1
+
 class NodeDBException(Exception):
     pass
 
@@ -287,6 +309,45 @@ def getObjectDict(obj):
         objectDict = obj.__dict__.copy()
     return objectDict
 
+def copyValue(value):
+    """copies lists in value, all other values are immutable"""
+    if isinstance(value, list):
+        return [copyValue(v) for v in value]
+    return value
+
+def copyChanges(changes):
+    """returns copy of changes returned by the compare methods, nodes and
+    fields are copied without references to the hierarchy of the compared
+    databases"""
+    result = []
+    for change in changes:
+        values = []
+        for value in change:
+            if isinstance(value, (Node, Field)):
+                value = value.copy()
+            else:
+                value = copyValue(value)
+            values.append(value)
+        result.append(tuple(values))
+    return result
+
+def pythonValueRepr(value):
+    """repr of the parsed field value, where NULL_NODE is referenced
+    by name"""
+    if isinstance(value, list):
+        return '[' + ', '.join(map(pythonValueRepr, value)) + ']'
+    if isinstance(value, NullNode):
+        return 'NULL_NODE'
+    return repr(value)
+
+def containsObject(objList, obj):
+    """returns True when obj is in objList, unlike the in operator
+    objects are compared by identity and not with __eq__"""
+    for o in objList:
+        if o is obj:
+            return True
+    return False
+
 def makeObjectRepr(obj):
     objectDict = getObjectDict(obj)
     if not objectDict:
@@ -351,6 +412,18 @@ class Annotation(object):
     def __str__(self):
         return self.toString()
 
+    def toXML(self, xmlgen):
+        xmlgen.startElement('annotation', {'name' : self.name})
+        # annotation without value list has no values element
+        if self.valList is not None:
+            xmlgen.startElement('values', {})
+            for val in self.valList:
+                xmlgen.startElement('value', {})
+                xmlgen.characters(str(val))
+                xmlgen.endElement('value')
+            xmlgen.endElement('values')
+        xmlgen.endElement('annotation')
+
 class Annotations(object):
 
     __serialize__ = ['annotDict']
@@ -358,7 +431,9 @@ class Annotations(object):
     def __init__(self, annList = []):
 
         self.annotDict = {}
-        map(self.setAnnotation, annList)
+        # Note: setAnnotation is not used, it invalidates fingerprints
+        for ann in annList:
+            self.annotDict[ann.getName()] = ann
 
     def getAnnotation(self, name):
 
@@ -369,6 +444,8 @@ class Annotations(object):
 
     def setAnnotation(self, ann):
         self.annotDict[ann.getName()] = ann
+        # annotations do not know their field
+        Field.modificationCount += 1
 
     def __getstate__(self):
         """Serialization"""
@@ -383,7 +460,7 @@ class Annotations(object):
         return Annotations(self.annotDict.values())
 
     def __hash__(self):
-        h = hash(len.self.annotDict.keys())
+        h = hash(len(self.annotDict))
         for key in self.annotDict.keys():
             h = h ^ hash(self.annotDict[key])
         return h
@@ -418,6 +495,10 @@ class Field(object):
     accessTypeConsts = ['INITIALIZE_ONLY', 'INPUT_ONLY',
                         'OUTPUT_ONLY', 'INPUT_OUTPUT']
 
+    # incremented by field and annotation modifications, invalidates
+    # cached fingerprints of all fields and nodes, because annotations and
+    # fields do not know where they are stored
+    modificationCount = 0
 
     def __init__(self, type, accessType, name, value=None,
                  validValueTypes=None, annotations=None, info=None):
@@ -446,15 +527,24 @@ class Field(object):
         # intially declared.
         # self.declaredInNodes is filled by NodeDB.updateHierarchy
         self.declaredInNodes = None
+        # cached by getFingerprint as tuple
+        # (Field.modificationCount, fingerprint)
+        self.fingerprint = None
 
     def __getstate__(self):
         """Serialization"""
-        return self.__dict__
+        # cached fingerprint and declaration nodes are not stored,
+        # declaration nodes are computed by NodeDB.updateHierarchy
+        state = self.__dict__.copy()
+        del state['fingerprint']
+        state.pop('declaredInNodes', None)
+        return state
 
     def __setstate__(self, state):
         """Deserialization"""
         self.__dict__ = state
         self.declaredInNodes = None
+        self.fingerprint = None
         # fix deserialized info value :
         # make it None when it is empty string
         if self.info is not None:
@@ -476,14 +566,22 @@ class Field(object):
 
     def copy(self):
         """F.copy() -> a deep copy of F"""
-        return Field(self.type, self.accessType, self.name,
-                     self.value, self.validValueTypes, self.annotations,
-                     self.info)
+        # Note: parsed value is copied instead of parsing value again
+        field = Field.__new__(Field)
+        field.__setstate__({'type' : self.type,
+                            'accessType' : self.accessType,
+                            'name' : self.name,
+                            'value' : self.value,
+                            'parsedValue' : copyValue(self.parsedValue),
+                            'validValueTypes' : self.validValueTypes[:],
+                            'annotations' : self.annotations.copy(),
+                            'info' : self.info})
+        return field
 
     def addDeclarationNode(self, node):
         if self.declaredInNodes is None:
             self.declaredInNodes = []
-        if node not in self.declaredInNodes:
+        if not containsObject(self.declaredInNodes, node):
             self.declaredInNodes.append(node)
 
     def getDeclarationNodes(self):
@@ -513,6 +611,7 @@ class Field(object):
     def setValue(self, value):
         self.value = value
         self.parsedValue = parseFieldValue(self.type, value)
+        Field.modificationCount += 1
 
     def getValue(self):
         return self.value
@@ -525,6 +624,7 @@ class Field(object):
 
     def setValidValueTypes(self, validValueTypes):
         self.validValueTypes = validValueTypes
+        Field.modificationCount += 1
 
     def getValidValueTypesStr(self):
         if self.validValueTypes:
@@ -537,30 +637,39 @@ class Field(object):
     def getInfo(self):
         return self.info
 
-    def toString(self, typePadLen=0, accessTypeNamePadLen=0,
-                 namePadLen=0, valuePadLen=0, validValueTypesPadLen=0):
-        info = self.info
-
-        if self.validValueTypes:
-            vvt = self.getValidValueTypesStr().ljust(validValueTypesPadLen)+' '
-        else:
-            vvt = ''
-
-        info = vvt
+    def getFingerprint(self):
+        """returns MD5 digest of the field content, fields with equal
+        names and fingerprints are equal"""
+        if self.fingerprint is None or \
+           self.fingerprint[0] != Field.modificationCount:
+            annotations = self.annotations.annotDict.items()
+            annotations.sort()
+            digest = hashlib.md5(repr(
+                (self.type, self.accessType, self.name, self.value,
+                 self.validValueTypes,
+                 [(name, a.valList) for name, a in annotations],
+                 self.info))).digest()
+            self.fingerprint = (Field.modificationCount, digest)
+        return self.fingerprint[1]
+
+    def getColumns(self):
+        """returns tuple (type, access type name, name, value, valid value
+        types, comment) of strings written by toString"""
         if self.info is not None:
-            info += '# '+self.info
+            comment = '# '+self.info
         elif self.annotations is not None:
-            info += '# '+self.getAnnotations().toString()
-
-        if self.value:
-            value = self.value.ljust(valuePadLen)
+            comment = '# '+self.annotations.toString()
         else:
-            value = ' '*valuePadLen
-        
-        return self.type.ljust(typePadLen)+' '+\
-               self.getAccessTypeName().ljust(accessTypeNamePadLen)+' '+\
-               self.name.ljust(namePadLen)+' '+\
-               value+' '+info
+            comment = ''
+        return (self.type, self.getAccessTypeName(), self.name,
+                self.value or '', self.getValidValueTypesStr(), comment)
+
+    def toString(self, typePadLen=0, accessTypeNamePadLen=0,
+                 namePadLen=0, valuePadLen=0, validValueTypesPadLen=0):
+        return formatFieldColumns(self.getColumns(),
+                                  (typePadLen, accessTypeNamePadLen,
+                                   namePadLen, valuePadLen,
+                                   validValueTypesPadLen))
 
     def __hash__(self):
 
@@ -596,6 +705,17 @@ class Field(object):
                                                    repr(self.info))
         return s
 
+    def toPythonTable(self):
+        """returns Python source of the field table used by
+        NodeDB.writePythonModule"""
+        annotations = ', '.join(['(%s, %s)' % (repr(a.name), repr(a.valList))
+                                 for a in self.annotations.annotDict.values()])
+        return '(%s, %s, %s, %s, %s, %s, (%s), %s)' % \
+               (repr(self.type), self.accessType, repr(self.name),
+                repr(self.value), pythonValueRepr(self.parsedValue),
+                repr(self.validValueTypes), annotations and annotations + ',',
+                repr(self.info))
+
     def toXML(self, xmlgen):
         xmlgen.startElement('field', {'name' : self.name,
                                       'type' : self.type,
@@ -618,15 +738,68 @@ class Field(object):
         if self.info:
             xmlgen.characters(self.info)
         xmlgen.endElement('info')
-        
+
+        xmlgen.startElement('annotations', {})
+        for ann in self.annotations.annotDict.values():
+            ann.toXML(xmlgen)
+        xmlgen.endElement('annotations')
+
         xmlgen.endElement('field')
 
+def formatFieldColumns(columns, widths):
+    """returns field columns (see Field.getColumns) padded to widths"""
+    fieldType, accessTypeName, name, value, validValueTypes, comment = \
+               columns
+    if validValueTypes:
+        comment = '%-*s %s' % (widths[4], validValueTypes, comment)
+    return '%-*s %-*s %-*s %-*s %s' % (widths[0], fieldType,
+                                       widths[1], accessTypeName,
+                                       widths[2], name,
+                                       widths[3], value, comment)
+
+class FieldFormatter(object):
+    """formats fields in aligned columns, columns and their widths are
+    computed once"""
+
+    def __init__(self, fields):
+        self.columns = [f.getColumns() for f in fields]
+        # type accessTypeName name value validValueTypes
+        if self.columns:
+            self.widths = [max(map(len, c)) for c in zip(*self.columns)[:5]]
+        else:
+            self.widths = [0, 0, 0, 0, 0]
+        # length of the longest formatted field
+        self.lineWidth = 0
+        widths = self.widths
+        fixedWidth = widths[0] + widths[1] + widths[2] + widths[3] + 4
+        for c in self.columns:
+            lineWidth = fixedWidth + len(c[5])
+            if c[4]:
+                lineWidth += widths[4] + 1
+            if lineWidth > self.lineWidth:
+                self.lineWidth = lineWidth
+
+    def format(self, index):
+        return formatFieldColumns(self.columns[index], self.widths)
+
+    def write(self, out, index, lineWidth=0):
+        """writes field with index padded to lineWidth to out"""
+        out.write(self.format(index).ljust(lineWidth))
+
 class Node(object):
 
     __serialize__ = ['type', 'superTypes', 'fields', 'specFile',
                      'abstract', 'componentName',
                      'attributes']
 
+    # node properties reported by compare
+    COMPARED_PROPERTIES = ['type', 'superTypes', 'specFile', 'abstract',
+                           'componentName', 'attributes']
+
+    # incremented when fields of a node or nodes of a node database are
+    # added, removed or reordered, invalidates indexes of all databases
+    modificationCount = 0
+
     def __init__(self, type=None, superTypes=None, fields=None, specFile=None,
                  abstract=False, componentName=None, attributes=None):
         self.type = type
@@ -640,7 +813,7 @@ class Node(object):
             self.fields = fields[:]
             for field in self.fields:
                 fieldName = field.getName()
-                if field in self.fieldMap:
+                if fieldName in self.fieldMap:
                     raise NodeDBException('In node %s field %s'     \
                                           ' was already declared' % \
                                           (self.type, field.getName()))
@@ -660,9 +833,20 @@ class Node(object):
         # be sure that it is up-to-date before accessing it.
         self.superNodes = None
         self.derivedNodes = None
+        # cached by getFingerprint as tuple
+        # (Field.modificationCount, fingerprint)
+        self.fingerprint = None
 
     def __getstate__(self):
-        return self.__dict__
+        # fingerprint is stored, so databases loaded from files can be
+        # compared without hashing all fields. Super and derived nodes
+        # are computed by NodeDB.updateHierarchy, storing them would store
+        # the whole hierarchy with every single node.
+        state = self.__dict__.copy()
+        state['fingerprint'] = self.getFingerprint()
+        state.pop('superNodes', None)
+        state.pop('derivedNodes', None)
+        return state
 
     def __setstate__(self, state):
         self.__dict__ = state
@@ -670,12 +854,18 @@ class Node(object):
             self.attributes =  {}
         self.superNodes = None
         self.derivedNodes = None
+        fingerprint = self.__dict__.get('fingerprint')
+        if fingerprint is not None:
+            self.fingerprint = (Field.modificationCount, fingerprint)
+        else:
+            self.fingerprint = None
 
     def isAbstract(self):
         return self.abstract
 
     def setAbstract(self, abstract):
         self.abstract = bool(abstract)
+        self.fingerprint = None
 
     def setAttribute(self, name, value):
         if name == 'abstract':
@@ -684,6 +874,7 @@ class Node(object):
             self.setComponentName(value)
         else:
             self.attributes[name] = value
+            self.fingerprint = None
 
     def getAttribute(self, name):
         if name == 'abstract':
@@ -698,6 +889,7 @@ class Node(object):
 
     def setComponentName(self, componentName):
         self.componentName = str(componentName)
+        self.fingerprint = None
 
     def getType(self):
         return self.type
@@ -713,19 +905,37 @@ class Node(object):
 
     def setSuperTypes(self, superTypes):
         self.superTypes = superTypes[:]
+        self.fingerprint = None
 
     def addField(self, field):
         if field.name in self.fieldMap:
             return False
         self.fields.append(field)
         self.fieldMap[field.name] = field
+        self.fingerprint = None
+        Node.modificationCount += 1
         return True
 
     def removeField(self, field):
         if field.name not in self.fieldMap:
             return False
-        del self.fieldMap[field.name]
-        self.fields.remove(field)
+        field = self.fieldMap.pop(field.name)
+        # Note: Field.__eq__ ignores field names, so list.remove could
+        # remove another field with the same declaration
+        self.fields = [f for f in self.fields if f is not field]
+        self.fingerprint = None
+        Node.modificationCount += 1
+        return True
+
+    def replaceField(self, field):
+        """replaces field with the same name, keeping the field order"""
+        oldField = self.fieldMap.get(field.name)
+        if oldField is None:
+            return False
+        self.fieldMap[field.name] = field
+        self.fields = [(f is oldField and field) or f for f in self.fields]
+        self.fingerprint = None
+        Node.modificationCount += 1
         return True
 
     def findField(self, fieldName):
@@ -744,7 +954,8 @@ class Node(object):
     # results are valid only after NodeDB.updateHierarchy was called
 
     def getOwnFields(self):
-        return [f for f in self.getFields() if self in f.getDeclarationNodes()]
+        return [f for f in self.getFields()
+                if containsObject(f.getDeclarationNodes(), self)]
 
     def getDerivedNodes(self):
         return self.derivedNodes
@@ -752,7 +963,7 @@ class Node(object):
     def addDerivedNode(self, node):
         if self.derivedNodes is None:
             self.derivedNodes = [node]
-        elif node not in self.derivedNodes:
+        elif not containsObject(self.derivedNodes, node):
             self.derivedNodes.append(node)
 
     def hasDerivedNode(self, node):
@@ -767,7 +978,7 @@ class Node(object):
     def addSuperNode(self, node):
         if self.superNodes is None:
             self.superNodes = [node]
-        elif node not in self.superNodes:
+        elif not containsObject(self.superNodes, node):
             self.superNodes.append(node)
 
     def hasSuperNode(self, node):
@@ -776,65 +987,121 @@ class Node(object):
     def clearSuperNodes(self):
         self.superNodes = []
 
-    def diff(self, other, fullDiff=False):
-        # check differences
-        # - data unique to self
-        # + data unique to other
-
-        result = []
-        if self.type != other.type:
-            result.append('- type %s' % repr(self.type))
-            result.append('+ type %s' % repr(other.type))
-            
-        if self.superTypes != other.superTypes:
-            result.append('- superTypes %s' % repr(self.superTypes))
-            result.append('+ superTypes %s' % repr(other.superTypes))
-
-        if fullDiff and (self.specFile != other.specFile):
-            result.append('- specFile %s' % repr(self.specFile))
-            result.append('+ specFile %s' % repr(other.specFile))
-
-        if self.abstract != other.abstract:
-            result.append('- abstract %s' % repr(self.abstract))
-            result.append('+ abstract %s' % repr(other.abstract))
-
-        if self.componentName != other.componentName:
-            result.append('- componentName %s' % repr(self.componentName))
-            result.append('+ componentName %s' % repr(other.componentName))
-
-        if self.attributes != other.attributes:
-            result.append('- attributes %s' % repr(self.attributes))
-            result.append('+ attributes %s' % repr(other.attributes))
+    def getFingerprint(self):
+        """returns MD5 digest of the node content compared by compare
+        method, except specFile and field order. Nodes with equal
+        fingerprints have no differences.
+        """
+        if self.fingerprint is None or \
+           self.fingerprint[0] != Field.modificationCount:
+            attributes = self.attributes.items()
+            attributes.sort()
+            fieldFingerprints = [f.getFingerprint() for f in self.fields]
+            fieldFingerprints.sort()
+            h = hashlib.md5(repr((self.type, self.superTypes,
+                                  bool(self.abstract), self.componentName,
+                                  attributes)))
+            h.update(''.join(fieldFingerprints))
+            self.fingerprint = (Field.modificationCount, h.digest())
+        return self.fingerprint[1]
+
+    def hasSameFingerprint(self, other, fullDiff=False):
+        """returns True when compare would not report any change"""
+        if self.getFingerprint() != other.getFingerprint():
+            return False
+        if fullDiff:
+            if self.specFile != other.specFile:
+                return False
+            for f1, f2 in zip(self.fields, other.fields):
+                if f1.name != f2.name:
+                    return False
+        return True
 
-        # Note: we use built-in set here, it is available starting
-        # with Python 2.4.
+    def compare(self, other, fullDiff=False):
+        """N.compare(other) -> list of changes transforming N into other,
+        see formatChanges for the description of changes.
+        specFile and field order are only compared when fullDiff is True.
+        """
+        changes = []
+        nodeType = self.type
+
+        for name in self.COMPARED_PROPERTIES:
+            if name == 'specFile' and not fullDiff:
+                continue
+            value1 = getattr(self, name)
+            value2 = getattr(other, name)
+            if value1 != value2:
+                changes.append(('setNodeProperty', nodeType, name,
+                                value1, value2))
 
         # fields
-        self_fieldNames = set([f.getName() for f in self.fields])
-        other_fieldNames = set([f.getName() for f in other.fields])
-
-        commonFieldNames = self_fieldNames.intersection(other_fieldNames)
-        removedFieldNames = self_fieldNames.difference(other_fieldNames)
-        addedFieldNames = other_fieldNames.difference(self_fieldNames)
-
-        for fn in commonFieldNames:
-            field1 = self.findField(fn)
-            field2 = other.findField(fn)
+        removed = []
+        for field1 in self.fields:
+            field2 = other.findField(field1.getName())
+            if field2 is None:
+                removed.append(('removeField', nodeType, field1))
+            elif field1 != field2:
+                changes.append(('replaceField', nodeType, field1, field2))
+        changes.extend(removed)
+        added = [('addField', nodeType, field2) for field2 in other.fields
+                 if self.findField(field2.getName()) is None]
+        changes.extend(added)
+
+        if fullDiff:
+            # field order is only reported when it differs from the order
+            # resulting from the changes above
+            newOrder = [f.getName() for f in other.fields]
+            order = [f.getName() for f in self.fields
+                     if other.findField(f.getName()) is not None] + \
+                    [c[2].getName() for c in added]
+            if order != newOrder:
+                changes.append(('setNodeProperty', nodeType, 'fieldOrder',
+                                [f.getName() for f in self.fields],
+                                newOrder))
+
+        return changes
 
-            if field1 != field2:
-                result.append('- field %s' % str(field1))
-                result.append('+ field %s' % str(field2))
+    def diff(self, other, fullDiff=False):
+        # check differences
+        # - data unique to self
+        # + data unique to other
+        return formatChanges(self.compare(other, fullDiff))
+
+    def setProperty(self, name, value):
+        """sets node property compared by compare method"""
+        if name == 'fieldOrder':
+            self.setFieldOrder(value)
+        elif name in ('superTypes', 'specFile', 'abstract', 'componentName'):
+            setattr(self, name, copyValue(value))
+        elif name == 'attributes':
+            self.attributes = value.copy()
+        else:
+            raise NodeDBException('Cannot change property %s of node %s' % \
+                                  (name, self.type))
+        self.fingerprint = None
+
+    def getProperty(self, name):
+        """returns node property compared by compare method"""
+        if name == 'fieldOrder':
+            return [f.getName() for f in self.fields]
+        if name in self.COMPARED_PROPERTIES:
+            return getattr(self, name)
+        raise NodeDBException('Node %s has no property %s' % \
+                              (self.type, name))
+
+    def setFieldOrder(self, fieldNames):
+        """reorders fields, fieldNames must contain all field names"""
+        if len(fieldNames) != len(self.fields):
+            raise NodeDBException('Field order of node %s does not match' \
+                                  ' its fields' % self.type)
+        self.fields = [self.fieldMap[fn] for fn in fieldNames]
+        Node.modificationCount += 1
 
-        result.extend( [('- field %s' % str(self.findField(fn))) \
-                        for fn in removedFieldNames] )
-        result.extend( [('+ field %s' % str(other.findField(fn))) \
-                        for fn in addedFieldNames] )
-        
-        if len(result):
-            result.insert(0, '@@ node %s @@' % self.type)
-            result.append('')
-            
-        return result
+    def copy(self):
+        """N.copy() -> a deep copy of N without hierarchy information"""
+        return Node(self.type, self.superTypes,
+                    [f.copy() for f in self.fields], self.specFile,
+                    self.abstract, self.componentName, self.attributes)
 
     def __eq__(self, other):
         self_fields = self.fields[:]
@@ -856,17 +1123,19 @@ class Node(object):
         return not (self == other)
 
     # convert to X3D specification format
-        
-    def __str__(self):
-        s = str(self.type)
+
+    def write(self, out):
+        """writes node in X3D specification format to the file object out,
+        without newline after the closing brace"""
+        out.write(str(self.type))
         if len(self.superTypes) > 0:
-            s += ' : %s' % (','.join(self.superTypes),)
-        s += ' {\n'
+            out.write(' : %s' % (','.join(self.superTypes),))
+        out.write(' {\n')
 
         if self.isAbstract():
-            s += '  attribute abstract TRUE\n'
+            out.write('  attribute abstract TRUE\n')
 
-        s += '  attribute componentName "%s"\n' % self.componentName
+        out.write('  attribute componentName "%s"\n' % self.componentName)
 
         for k,v in self.attributes.items():
             if v == True:
@@ -875,42 +1144,43 @@ class Node(object):
                 v = 'FALSE'
             elif isinstance(v, str):
                 v = "\"%s\"" % v
-            s += '  attribute ' + k + ' ' + str(v) +'\n'
+            out.write('  attribute %s %s\n' % (k, v))
 
-        def myLen(s):
-            if s:
-                return len(s)
-            else:
-                return 0
+        formatter = FieldFormatter(self.fields)
+        for i in xrange(len(self.fields)):
+            out.write('  %s\n' % formatter.format(i))
+        out.write('}')
 
-        # type accessTypeName name value validValueTypes
-        maxLen = [0, 0, 0, 0, 0]
-        for field in self.fields:
-            maxLen[0] = max(maxLen[0], myLen(field.type))
-            maxLen[1] = max(maxLen[1], myLen(field.getAccessTypeName()))
-            maxLen[2] = max(maxLen[2], myLen(field.name))
-            maxLen[3] = max(maxLen[3], myLen(field.value))
-            maxLen[4] = max(maxLen[4], myLen(field.getValidValueTypesStr()))
-        
-        for field in self.fields:
-            s += '  ' + field.toString(*maxLen)+'\n'
-        s += '}'
-        return s
+    def __str__(self):
+        out = cStringIO.StringIO()
+        self.write(out)
+        return out.getvalue()
 
     def __repr__(self):
         return makeObjectRepr(self)
 
     def toPythonCode(self, var='_n'):
-        s = '################ %s ################\n' % self.type
-        s += '%s = Node(type=%s)\n' % (var, repr(self.type))
-        s += '%s.setSuperTypes(%s)\n' % (var, repr(self.superTypes))
-        s += '%s.setSpecFile(%s)\n' % (var, repr(self.specFile))
-        s += '%s.setAbstract(%s)\n' % (var, repr(self.abstract))
-        s += '%s.setComponentName(%s)\n' % (var, repr(self.componentName))
-        s += '# fields\n'
+        lines = ['################ %s ################' % self.type,
+                 '%s = Node(type=%s)' % (var, repr(self.type)),
+                 '%s.setSuperTypes(%s)' % (var, repr(self.superTypes)),
+                 '%s.setSpecFile(%s)' % (var, repr(self.specFile)),
+                 '%s.setAbstract(%s)' % (var, repr(self.abstract)),
+                 '%s.setComponentName(%s)' % (var, repr(self.componentName)),
+                 '# fields']
         for field in self.fields:
-            s+= '%s.addField(%s)\n' % (var, repr(field))
-        return s
+            lines.append('%s.addField(%s)' % (var, repr(field)))
+        lines.append('')
+        return '\n'.join(lines)
+
+    def toPythonTable(self):
+        """returns Python source of the node table used by
+        NodeDB.writePythonModule"""
+        fieldTables = ''.join(['\n        %s,' % f.toPythonTable()
+                               for f in self.fields])
+        return '(%s, %s, %s, %s, %s, %s, (%s\n     ))' % \
+               (repr(self.type), repr(self.superTypes), repr(self.specFile),
+                repr(self.abstract), repr(self.componentName),
+                repr(self.attributes), fieldTables)
 
     def toXML(self, xmlgen):
 
@@ -924,17 +1194,116 @@ class Node(object):
                                      'abstract' : abstract,
                                      'componentName' : self.componentName})
 
+        xmlgen.startElement('superTypes', {})
+        for t in self.superTypes:
+            xmlgen.startElement('type', {})
+            xmlgen.characters(t)
+            xmlgen.endElement('type')
+        xmlgen.endElement('superTypes')
+
+        xmlgen.startElement('attributes', {})
+        for k, v in self.attributes.items():
+            if isinstance(v, bool):
+                valueType = 'bool'
+                v = v and 'true' or 'false'
+            elif isinstance(v, int):
+                valueType = 'int'
+            elif isinstance(v, float):
+                valueType = 'float'
+                v = repr(v)
+            else:
+                valueType = 'string'
+            xmlgen.startElement('attribute', {'name' : k, 'type' : valueType})
+            xmlgen.characters(str(v))
+            xmlgen.endElement('attribute')
+        xmlgen.endElement('attributes')
+
         xmlgen.startElement('fields', {})
         for field in self.fields:
             field.toXML(xmlgen)
         xmlgen.endElement('fields')
 
         xmlgen.startElement('specFile', {})
-        xmlgen.characters(self.specFile)
+        if self.specFile:
+            xmlgen.characters(self.specFile)
         xmlgen.endElement('specFile')
 
         xmlgen.endElement('node')
 
+# field attribute : function returning indexed values of a field
+FIELD_INDEX_ATTRIBUTES = {
+    'name' : lambda field: [field.getName()],
+    'type' : lambda field: [field.getType()],
+    'accessType' : lambda field: [field.getAccessType()],
+    'annotation' : lambda field: field.getAnnotations().annotDict.keys(),
+    'validValueType' : lambda field: field.getValidValueTypes()
+    }
+
+class NodeDBIndex(object):
+    """inverted indexes of the fields of a node database, accessible as
+    NodeDB.index. Values of field attributes are mapped to postings, lists
+    of (node, field) tuples in the order of nodes and fields in the
+    database. An index is built on its first lookup and built again after
+    any modification of fields, nodes or databases (see
+    Field.modificationCount and Node.modificationCount). Returned postings
+    must not be modified."""
+
+    def __init__(self, nodeDB):
+        self.nodeDB = nodeDB
+        # modification counters the indexes were built for
+        self.stamp = None
+        # attribute : {value : postings}
+        self.indexes = {}
+
+    def _getIndex(self, attribute):
+        stamp = (Field.modificationCount, Node.modificationCount)
+        if stamp != self.stamp:
+            self.indexes = {}
+            self.stamp = stamp
+        index = self.indexes.get(attribute)
+        if index is not None:
+            return index
+
+        getValues = FIELD_INDEX_ATTRIBUTES.get(attribute)
+        if getValues is None:
+            raise NodeDBException('Fields are not indexed by %s' % attribute)
+        index = {}
+        for node in self.nodeDB.getNodeList():
+            for field in node.getFields():
+                for value in getValues(field):
+                    postings = index.get(value)
+                    if postings is None:
+                        index[value] = postings = []
+                    postings.append((node, field))
+        self.indexes[attribute] = index
+        return index
+
+    def getValues(self, attribute):
+        """returns list of all values of the field attribute"""
+        return self._getIndex(attribute).keys()
+
+    def getFields(self, attribute, value):
+        """returns postings of fields with the value of the attribute"""
+        return self._getIndex(attribute).get(value, [])
+
+    def getFieldsByName(self, name):
+        return self.getFields('name', name)
+
+    def getFieldsByType(self, fieldType):
+        return self.getFields('type', fieldType)
+
+    def getFieldsByAccessType(self, accessType):
+        """accessType is an access type id or name like '[in,out]'"""
+        if isinstance(accessType, basestring):
+            accessType = convertAccessTypeNameToId(accessType)
+        return self.getFields('accessType', accessType)
+
+    def getFieldsByAnnotation(self, annotationName):
+        return self.getFields('annotation', annotationName)
+
+    def getFieldsByValidValueType(self, nodeType):
+        return self.getFields('validValueType', nodeType)
+
 class NodeDB(object):
 
     __serialize__ = ['nodeList']
@@ -959,12 +1328,20 @@ class NodeDB(object):
         # list of root nodes, updated by updateHierarchy function
         self.rootNodes = []
 
+        # inverted indexes of fields, see NodeDBIndex
+        self.index = NodeDBIndex(self)
+
     def __getstate__(self):
-        return self.__dict__
+        # indexes and root nodes are not stored
+        state = self.__dict__.copy()
+        state.pop('index', None)
+        state.pop('rootNodes', None)
+        return state
 
     def __setstate__(self, state):
         self.__dict__ = state
         self.rootNodes = []
+        self.index = NodeDBIndex(self)
 
     def getNode(self, typeName):
         return self.nodeDict.get(typeName)
@@ -1000,34 +1377,180 @@ class NodeDB(object):
                                   % typeName)
         self.nodeList.append(node)
         self.nodeDict[typeName] = node
+        Node.modificationCount += 1
 
-
-    def diff(self, other, fullDiff=False):
+    def removeNode(self, node):
+        typeName = node.getType()
+        if self.nodeDict.get(typeName) is not node:
+            raise NodeDBException('Node %s is not in the database' % typeName)
+        del self.nodeDict[typeName]
+        self.nodeList = [n for n in self.nodeList if n is not node]
+        Node.modificationCount += 1
+
+    def setNodeOrder(self, typeNames):
+        """reorders nodes, typeNames must contain all node type names"""
+        if len(typeNames) != len(self.nodeList):
+            raise NodeDBException('Node order does not match nodes of the' \
+                                  ' database')
+        self.nodeList = [self.nodeDict[t] for t in typeNames]
+        Node.modificationCount += 1
+
+    def compare(self, other, fullDiff=False, detectMoves=False):
+        """D.compare(other) -> list of changes transforming D into other,
+        see formatChanges for the description of changes.
+        specFile, field and node order are only compared when fullDiff
+        is True, moved and renamed fields are only detected when
+        detectMoves is True (see findMovedFields).
+        Common nodes are compared in the order of their type names, only
+        nodes with different fingerprints are compared field by field.
+        """
+        changes = []
+
+        commonTypes = [t for t in self.nodeDict if t in other.nodeDict]
+        commonTypes.sort()
+        for nodeType in commonTypes:
+            node1 = self.nodeDict[nodeType]
+            node2 = other.nodeDict[nodeType]
+            if not node1.hasSameFingerprint(node2, fullDiff):
+                changes.extend(node1.compare(node2, fullDiff))
+
+        changes.extend([('removeNode', n.getType(), n) for n in self.nodeList
+                        if other.getNode(n.getType()) is None])
+        added = [('addNode', n.getType(), n) for n in other.nodeList
+                 if self.getNode(n.getType()) is None]
+        changes.extend(added)
+
+        if fullDiff:
+            # node order is only reported when it differs from the order
+            # resulting from the changes above
+            newOrder = [n.getType() for n in other.nodeList]
+            order = [n.getType() for n in self.nodeList
+                     if other.getNode(n.getType()) is not None] + \
+                    [c[1] for c in added]
+            if order != newOrder:
+                changes.append(('setNodeOrder', None,
+                                [n.getType() for n in self.nodeList],
+                                newOrder))
+
+        if detectMoves:
+            changes = findMovedFields(changes, self, other)
+
+        return changes
+
+    def diff(self, other, fullDiff=False, detectMoves=False):
         # check differences
         # - data unique to self
         # + data unique to other
+        return formatChanges(self.compare(other, fullDiff, detectMoves))
+
+    def _getChangedNode(self, typeName):
+        node = self.getNode(typeName)
+        if node is None:
+            raise NodeDBException('Cannot apply change to node %s,' \
+                                  ' it is not in the database' % typeName)
+        return node
+
+    def _checkChange(self, change):
+        """raises NodeDBException when the old values stored in change
+        do not match this database"""
+        op = change[0]
+        if op == 'addNode':
+            return
+        if op == 'setNodeOrder':
+            # old order is the order before nodes were added and removed
+            types = [n.getType() for n in self.nodeList]
+            types.sort()
+            if types != sorted(change[3]):
+                raise NodeDBException('Node order does not match')
+            return
+        node = self._getChangedNode(change[1])
+        if op == 'removeNode':
+            if node.getFingerprint() != change[2].getFingerprint():
+                raise NodeDBException('Removed node %s does not match' % \
+                                      change[1])
+        elif op == 'setNodeProperty' and change[2] == 'fieldOrder':
+            # old order is the order before fields were added and removed
+            if sorted(node.getProperty('fieldOrder')) != sorted(change[4]):
+                raise NodeDBException('Field order of node %s does not' \
+                                      ' match' % change[1])
+        elif op == 'setNodeProperty':
+            if node.getProperty(change[2]) != change[3]:
+                raise NodeDBException('Property %s of node %s does not' \
+                                      ' match' % (change[2], change[1]))
+        elif op in ('replaceField', 'removeField', 'renameField'):
+            field = node.findField(change[2].getName())
+            if field is None or field != change[2]:
+                raise NodeDBException('Field %s of node %s does not match' \
+                                      % (change[2].getName(), change[1]))
+        elif op == 'moveField' and change[5]:
+            field = self._getChangedNode(change[4]).findField(
+                change[2].getName())
+            if field is None or field != change[2]:
+                raise NodeDBException('Field %s of node %s does not match' \
+                                      % (change[2].getName(), change[4]))
+
+    def applyChanges(self, changes, strict=False, updateHierarchy=True):
+        """applies changes returned by compare to this database.
+        Nodes and fields are copied from the changes, the hierarchy is
+        updated once after all changes were applied unless updateHierarchy
+        is False. When strict is True old values stored in the changes must
+        match the database.
+        """
+        # field order changes are applied after all fields were moved
+        orderChanges = []
+        for change in changes:
+            op = change[0]
+            if op == 'setNodeProperty' and change[2] == 'fieldOrder':
+                orderChanges.append(change)
+                continue
+            if strict:
+                self._checkChange(change)
+            if op == 'addNode':
+                self.addNode(change[2].copy())
+            elif op == 'removeNode':
+                self.removeNode(self._getChangedNode(change[1]))
+            elif op == 'setNodeOrder':
+                orderChanges.append(change)
+            else:
+                node = self._getChangedNode(change[1])
+                if op == 'setNodeProperty':
+                    node.setProperty(change[2], change[4])
+                    ok = True
+                elif op == 'replaceField':
+                    ok = node.replaceField(change[3].copy())
+                elif op == 'removeField':
+                    ok = node.removeField(change[2])
+                elif op == 'addField':
+                    ok = node.addField(change[2].copy())
+                elif op == 'renameField':
+                    ok = node.removeField(change[2]) and \
+                         node.addField(change[3].copy())
+                elif op == 'moveField':
+                    field = change[3].copy()
+                    ok = node.replaceField(field) or node.addField(field)
+                    if ok and change[5]:
+                        ok = self._getChangedNode(change[4]).removeField(
+                            change[2])
+                else:
+                    raise NodeDBException('Unknown change %s' % repr(op))
+                if not ok:
+                    raise NodeDBException('Cannot apply change %s of field' \
+                                          ' %s to node %s' % \
+                                          (op, change[2].getName(),
+                                           node.getType()))
+        for change in orderChanges:
+            if strict:
+                self._checkChange(change)
+            if change[0] == 'setNodeOrder':
+                self.setNodeOrder(change[3])
+            else:
+                self._getChangedNode(change[1]).setFieldOrder(change[4])
+        if updateHierarchy:
+            self.updateHierarchy()
 
-        result = []
-
-        # Note: we use built-in set here, it is available starting
-        # with Python 2.4.
-
-        self_nodeTypes = set([n.getType() for n in self.nodeList])
-        other_nodeTypes = set([n.getType() for n in other.nodeList])
-
-        commonNodeTypes = self_nodeTypes.intersection(other_nodeTypes)
-        removedNodeTypes = self_nodeTypes.difference(other_nodeTypes)
-        addedNodeTypes = other_nodeTypes.difference(self_nodeTypes)
-
-        for nt in commonNodeTypes:
-            node1 = self.getNode(nt)
-            node2 = other.getNode(nt)
-            result.extend(node1.diff(node2, fullDiff))
-
-        result.extend( [('- node %s' % nt) for nt in removedNodeTypes] )
-        result.extend( [('+ node %s' % nt) for nt in addedNodeTypes] )
-
-        return result
+    def copy(self):
+        """D.copy() -> a deep copy of D, the hierarchy is not updated"""
+        return NodeDB([n.copy() for n in self.nodeList])
 
     def __eq__(self, other):
         self_nodeList = self.nodeList[:]
@@ -1047,14 +1570,33 @@ class NodeDB(object):
         return makeObjectRepr(self)
 
     def toPythonCode(self, var='_ndb'):
-        s = 'from nodedb import *\n'
-        s += '%s = NodeDB()\n' % var
+        parts = ['from nodedb import *\n',
+                 '%s = NodeDB()\n' % var]
         for node in self.nodeList:
-            s += '\n'
-            s += node.toPythonCode('_n')
-            s += '%s.addNode(_n)\n' % var
-        s += 'del _n\n'
-        return s
+            parts.append('\n')
+            parts.append(node.toPythonCode('_n'))
+            parts.append('%s.addNode(_n)\n' % var)
+        parts.append('del _n\n')
+        return ''.join(parts)
+
+    def writePythonModule(self, out):
+        """writes database as importable Python module containing
+        constant tables, the module is loaded with loadFromPythonModule
+        """
+        # Note: the tables are returned by a function, so all immutable
+        # parts are compiled into constants of the cached bytecode while
+        # lists and dictionaries are created anew on every call
+        print >>out, '# Generated with nodedb.py, do not edit'
+        print >>out
+        print >>out, 'from nodedb import NULL_NODE'
+        print >>out
+        print >>out, 'NDB_MODULE_VERSION = %i' % NDB_MODULE_VERSION
+        print >>out
+        print >>out, 'def getNodeTables():'
+        print >>out, '    return ('
+        for node in self.nodeList:
+            print >>out, '    %s,' % node.toPythonTable()
+        print >>out, '    )'
 
     def toXML(self, xmlgen):
         xmlgen.startElement('nodedb', {})
@@ -1107,17 +1649,23 @@ class NodeDB(object):
                 for n in declInNodes:
                     field.addDeclarationNode(n)
             
-    def save(self, filename):
+    def save(self, filename, codec=None):
+        """saves database in pickle format, when codec name is specified
+        the output is compressed with that codec (see getCodecNames)
+        """
         # check if the file object is provided instead of string
         if getattr(filename, 'write', None) is not None:
             fd = filename
             closeFile = False
         else:
-            fd = open(filename, 'w')
+            fd = open(filename, 'wb')
             closeFile = True
 
         try:
-            pickle.dump(self, fd)
+            out = openCompressedWriter(fd, codec)
+            pickle.dump(self, out)
+            if out is not fd:
+                out.close()
         finally:
             if closeFile:
                 fd.close()
@@ -1127,6 +1675,13 @@ class NodeDB(object):
         fd.write(repr(self)+'\n')
         fd.close()
 
+    def saveAsPythonModule(self, filename):
+        fd = open(filename, 'w')
+        try:
+            self.writePythonModule(fd)
+        finally:
+            fd.close()
+
 def loadFromPythonCode(filename):
     fd = open(filename, 'r')
     code = fd.read()
@@ -1135,7 +1690,58 @@ def loadFromPythonCode(filename):
     ndb.updateHierarchy()
     return ndb
 
+def fromPythonModuleTables(nodeTables):
+    """creates NodeDB from the tables of a module written by
+    NodeDB.writePythonModule"""
+    nodeList = []
+    for nodeTable in nodeTables:
+        nodeType, superTypes, specFile, abstract, componentName, \
+                  attributes, fieldTables = nodeTable
+        fields = []
+        for fieldType, accessType, name, value, parsedValue, \
+                validValueTypes, annotationTables, info in fieldTables:
+            annotations = Annotations([Annotation(n, v)
+                                       for n, v in annotationTables])
+            fields.append(_makeField({'type' : fieldType,
+                                      'accessType' : accessType,
+                                      'name' : name,
+                                      'value' : value,
+                                      'parsedValue' : parsedValue,
+                                      'validValueTypes' : validValueTypes,
+                                      'info' : info,
+                                      'annotations' : annotations}))
+        nodeList.append(Node(nodeType, superTypes, fields, specFile,
+                             abstract, componentName, attributes))
+    ndb = NodeDB(nodeList)
+    ndb.updateHierarchy()
+    return ndb
+
+def loadFromPythonModule(module):
+    """loads database from module written by NodeDB.saveAsPythonModule,
+    module is either a module object or a file name. Python caches the
+    compiled module in a .pyc file next to the module file.
+    """
+    if isinstance(module, basestring):
+        import imp
+        import os.path
+        # modules of equally named files in different directories must not
+        # replace each other in sys.modules
+        fileName = os.path.abspath(module)
+        name = '_ndbmodule_' + hashlib.md5(fileName).hexdigest()
+        try:
+            module = imp.load_source(name, fileName)
+        finally:
+            sys.modules.pop(name, None)
+    version = getattr(module, 'NDB_MODULE_VERSION', None)
+    if version != NDB_MODULE_VERSION:
+        raise NodeDBException('Unsupported NodeDB module version %s' % \
+                              repr(version))
+    return fromPythonModuleTables(module.getNodeTables())
+
 def load(filename):
+    """loads database in pickle format, compressed files are detected
+    automatically
+    """
 
     # check if the file object is provided instead of string
     if (getattr(filename, 'read', None) is not None and \
@@ -1143,11 +1749,11 @@ def load(filename):
         fd = filename
         closeFile = False
     else:
-        fd = open(filename, 'r')
+        fd = open(filename, 'rb')
         closeFile = True
 
     try:
-        ndb = pickle.load(fd)
+        ndb = pickle.load(openDecompressedReader(fd))
     finally:
         if closeFile:
             fd.close()
@@ -1156,6 +1762,395 @@ def load(filename):
         
     return ndb
 
+# compression codecs
+
+class Codec(object):
+
+    def __init__(self, name, magic, compressorFactory, decompressorFactory):
+        self.name = name
+        self.magic = magic
+        self.compressorFactory = compressorFactory
+        self.decompressorFactory = decompressorFactory
+
+    def getName(self):
+        return self.name
+
+    def createCompressor(self):
+        return self.compressorFactory()
+
+    def createDecompressor(self):
+        return self.decompressorFactory()
+
+CODECS = []
+
+def registerCodec(codec):
+    CODECS.append(codec)
+
+registerCodec(Codec('gzip', '\x1f\x8b',
+                    lambda: zlib.compressobj(9, zlib.DEFLATED,
+                                             16 + zlib.MAX_WBITS),
+                    lambda: zlib.decompressobj(16 + zlib.MAX_WBITS)))
+registerCodec(Codec('bz2', 'BZh',
+                    lambda: bz2.BZ2Compressor(9),
+                    bz2.BZ2Decompressor))
+if lzma is not None:
+    registerCodec(Codec('lzma', '\xfd7zXZ\x00',
+                        lzma.LZMACompressor,
+                        lzma.LZMADecompressor))
+if zstandard is not None:
+    registerCodec(Codec('zstd', '\x28\xb5\x2f\xfd',
+                        lambda: zstandard.ZstdCompressor().compressobj(),
+                        lambda: zstandard.ZstdDecompressor().decompressobj()))
+
+MAX_MAGIC_LEN = max([len(c.magic) for c in CODECS])
+
+def getCodecNames():
+    """returns names of all available compression codecs"""
+    return [c.getName() for c in CODECS]
+
+def getCodec(name):
+    for c in CODECS:
+        if c.getName() == name:
+            return c
+    raise NodeDBException('Unknown or unavailable compression codec %s, ' \
+                          'available codecs: %s' % \
+                          (name, ', '.join(getCodecNames())))
+
+def detectCodec(data):
+    """returns codec which magic bytes start data, or None"""
+    for c in CODECS:
+        if data.startswith(c.magic):
+            return c
+    return None
+
+class CompressedWriter(object):
+    """File-like object compressing all written data into fd"""
+
+    def __init__(self, fd, compressor):
+        self.fd = fd
+        self.compressor = compressor
+
+    def write(self, data):
+        data = self.compressor.compress(data)
+        if data:
+            self.fd.write(data)
+
+    def close(self):
+        """writes remaining compressed data, fd is not closed"""
+        if self.compressor is not None:
+            self.fd.write(self.compressor.flush())
+            self.compressor = None
+
+class DecompressedReader(object):
+    """File-like object decompressing data read from fd on the fly.
+    When decompressor is None data are passed unchanged.
+    """
+
+    BLOCK_SIZE = 65536
+
+    def __init__(self, fd, decompressor, data=''):
+        self.fd = fd
+        self.decompressor = decompressor
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+        self._feed(data)
+
+    def _feed(self, data):
+        if self.decompressor is not None:
+            data = self.decompressor.decompress(data)
+        if data:
+            # drop already consumed data
+            self.buffer = self.buffer[self.pos:] + data
+            self.pos = 0
+
+    def _fill(self):
+        data = self.fd.read(self.BLOCK_SIZE)
+        if not data:
+            self.eof = True
+        else:
+            self._feed(data)
+
+    def read(self, size=-1):
+        if size < 0:
+            while not self.eof:
+                self._fill()
+            end = len(self.buffer)
+        else:
+            while len(self.buffer) - self.pos < size and not self.eof:
+                self._fill()
+            end = min(self.pos + size, len(self.buffer))
+        data = self.buffer[self.pos:end]
+        self.pos = end
+        return data
+
+    def readline(self):
+        while True:
+            i = self.buffer.find('\n', self.pos)
+            if i >= 0:
+                end = i + 1
+                break
+            if self.eof:
+                end = len(self.buffer)
+                break
+            self._fill()
+        data = self.buffer[self.pos:end]
+        self.pos = end
+        return data
+
+def openCompressedWriter(fd, codec=None):
+    """returns file-like object writing to fd compressed with the
+    specified codec, or fd itself when codec is None or 'none'
+    """
+    if codec is None or codec == 'none':
+        return fd
+    if not isinstance(codec, Codec):
+        codec = getCodec(codec)
+    return CompressedWriter(fd, codec.createCompressor())
+
+def openDecompressedReader(fd):
+    """returns file-like object reading decompressed data from fd,
+    codec is detected from the magic bytes
+    """
+    magic = fd.read(MAX_MAGIC_LEN)
+    codec = detectCodec(magic)
+    if codec is not None:
+        return DecompressedReader(fd, codec.createDecompressor(), magic)
+    # uncompressed data, seek back if possible so the file can be
+    # used directly
+    try:
+        fd.seek(-len(magic), 1)
+        return fd
+    except (IOError, AttributeError):
+        return DecompressedReader(fd, None, magic)
+
+# minimal similarity of the field names of renamed fields
+RENAME_SIMILARITY = 0.75
+
+def getFieldMatchKey(field):
+    """returns key of fields that could be moved or renamed versions of
+    each other"""
+    return (field.getType(), field.getAccessType(), field.getValue())
+
+def _getAncestorTypes(nodeDB, nodeType, cache):
+    ancestors = cache.get(nodeType)
+    if ancestors is None:
+        ancestors = {}
+        node = nodeDB.getNode(nodeType)
+        if node is not None:
+            for superNode in nodeDB.getSuperNodes(node):
+                ancestors[superNode.getType()] = True
+                ancestors.update(_getAncestorTypes(nodeDB, superNode.getType(),
+                                                   cache))
+        cache[nodeType] = ancestors
+    return ancestors
+
+def _indexDeclaredFields(nodeDB):
+    """returns dictionary getFieldMatchKey(field) : list of (nodeType, field)
+    of all fields declared first time in the node"""
+    index = {}
+    for node in nodeDB.getNodeList():
+        for field in node.getFields():
+            if containsObject(field.getDeclarationNodes() or [], node):
+                index.setdefault(getFieldMatchKey(field), []).append(
+                    (node.getType(), field))
+    return index
+
+def _isDeclaredIn(nodeDB, nodeType, fieldName):
+    node = nodeDB.getNode(nodeType)
+    if node is None:
+        return False
+    field = node.findField(fieldName)
+    return field is not None and \
+           containsObject(field.getDeclarationNodes() or [], node)
+
+def findMovedFields(changes, oldNodeDB, newNodeDB):
+    """Replaces in changes returned by oldNodeDB.compare(newNodeDB)
+    pairs of removed and added fields of a node that differ only by
+    similar names with renameField changes, and fields whose first
+    declaration moved to an ancestor or descendant node with moveField
+    changes.
+    Candidates are looked up by getFieldMatchKey, so only fields with the
+    same type, access type and value are compared.
+    """
+    # renamed fields
+    removedByNode = {}
+    for change in changes:
+        if change[0] == 'removeField':
+            removedByNode.setdefault(change[1], {}).setdefault(
+                getFieldMatchKey(change[2]), []).append(change)
+
+    renamed = {}
+    renames = {}
+    for change in changes:
+        if change[0] != 'addField' or change[1] not in removedByNode:
+            continue
+        newField = change[2]
+        candidates = removedByNode[change[1]].get(getFieldMatchKey(newField),
+                                                  [])
+        best = None
+        bestRatio = RENAME_SIMILARITY
+        for candidate in candidates:
+            if id(candidate) in renamed:
+                continue
+            ratio = difflib.SequenceMatcher(None, candidate[2].getName(),
+                                            newField.getName()).ratio()
+            if ratio >= bestRatio:
+                best = candidate
+                bestRatio = ratio
+        if best is not None:
+            renamed[id(best)] = True
+            renamed[id(change)] = True
+            renames[id(best)] = ('renameField', change[1], best[2], newField)
+
+    changes = [renames.get(id(c), c) for c in changes
+               if id(c) not in renamed or id(c) in renames]
+
+    # moved fields
+    if not [c for c in changes if c[0] in ('addField', 'removeField')]:
+        return changes
+
+    oldIndex = _indexDeclaredFields(oldNodeDB)
+    newIndex = _indexDeclaredFields(newNodeDB)
+
+    ancestorCache = {}
+    def isRelated(nodeType1, nodeType2):
+        return nodeType2 in _getAncestorTypes(newNodeDB, nodeType1,
+                                              ancestorCache) or \
+               nodeType1 in _getAncestorTypes(newNodeDB, nodeType2,
+                                              ancestorCache)
+
+    removedChanges = {}
+    for change in changes:
+        if change[0] == 'removeField':
+            removedChanges[(change[1], change[2].getName())] = change
+
+    # Field declared first time in a node of the new database, and
+    # in a related node of the old database. When fields are stored with
+    # all inherited fields only the node declaring the field in the new
+    # database has a change.
+    moves = {}
+    for change in changes:
+        op = change[0]
+        if op == 'addField':
+            nodeType = change[1]
+            field = change[2]
+            fieldName = field.getName()
+            if not _isDeclaredIn(newNodeDB, nodeType, fieldName):
+                continue
+            for oldNodeType, oldField in oldIndex.get(getFieldMatchKey(field),
+                                                      []):
+                if oldField.getName() == fieldName and \
+                   oldNodeType != nodeType and \
+                   not _isDeclaredIn(newNodeDB, oldNodeType, fieldName) and \
+                   isRelated(oldNodeType, nodeType):
+                    removedChange = removedChanges.pop((oldNodeType,
+                                                        fieldName), None)
+                    if removedChange is not None:
+                        moves[id(removedChange)] = None
+                    moves[id(change)] = ('moveField', nodeType, oldField,
+                                         field, oldNodeType,
+                                         removedChange is not None)
+                    break
+
+    for change in changes:
+        op = change[0]
+        if op == 'removeField' and id(change) not in moves:
+            nodeType = change[1]
+            field = change[2]
+            fieldName = field.getName()
+            if not _isDeclaredIn(oldNodeDB, nodeType, fieldName):
+                continue
+            for newNodeType, newField in newIndex.get(getFieldMatchKey(field),
+                                                      []):
+                if newField.getName() == fieldName and \
+                   newNodeType != nodeType and \
+                   not _isDeclaredIn(oldNodeDB, newNodeType, fieldName) and \
+                   isRelated(nodeType, newNodeType):
+                    moves[id(change)] = ('moveField', newNodeType, field,
+                                         newField, nodeType, True)
+                    break
+
+    result = []
+    for change in changes:
+        if id(change) in moves:
+            change = moves[id(change)]
+            if change is None:
+                continue
+        result.append(change)
+    return result
+
+def formatChanges(changes):
+    """Converts list of changes returned by the compare methods of Node
+    and NodeDB to diff-like text lines. Changes are tuples starting with
+    the operation and the node type :
+
+    ('setNodeProperty', nodeType, propertyName, oldValue, newValue)
+    ('replaceField', nodeType, oldField, newField)
+    ('removeField', nodeType, oldField)
+    ('addField', nodeType, newField)
+    ('removeNode', nodeType, oldNode)
+    ('addNode', nodeType, newNode)
+    ('setNodeOrder', None, oldNodeTypes, newNodeTypes)
+
+    findMovedFields replaces some field changes with:
+
+    ('renameField', nodeType, oldField, newField)
+    ('moveField', nodeType, oldField, newField, oldNodeType,
+     removedFromOldNode)
+    """
+    result = []
+    sectionNodeType = None
+
+    for change in changes:
+        op = change[0]
+        if op in ('removeNode', 'addNode', 'setNodeOrder'):
+            if sectionNodeType is not None:
+                result.append('')
+                sectionNodeType = None
+            if op == 'removeNode':
+                result.append('- node %s' % change[1])
+            elif op == 'addNode':
+                result.append('+ node %s' % change[1])
+            else:
+                result.append('- nodeOrder %s' % repr(change[2]))
+                result.append('+ nodeOrder %s' % repr(change[3]))
+            continue
+
+        if change[1] != sectionNodeType:
+            if sectionNodeType is not None:
+                result.append('')
+            sectionNodeType = change[1]
+            result.append('@@ node %s @@' % sectionNodeType)
+
+        if op == 'setNodeProperty':
+            result.append('- %s %s' % (change[2], repr(change[3])))
+            result.append('+ %s %s' % (change[2], repr(change[4])))
+        elif op == 'replaceField':
+            result.append('- field %s' % str(change[2]))
+            result.append('+ field %s' % str(change[3]))
+        elif op == 'removeField':
+            result.append('- field %s' % str(change[2]))
+        elif op == 'addField':
+            result.append('+ field %s' % str(change[2]))
+        elif op == 'renameField':
+            result.append('~ field %s renamed to %s' % \
+                          (change[2].getName(), change[3].getName()))
+            if change[2] != change[3]:
+                result.append('- field %s' % str(change[2]))
+                result.append('+ field %s' % str(change[3]))
+        elif op == 'moveField':
+            result.append('~ field %s moved from node %s' % \
+                          (change[3].getName(), change[4]))
+            if change[2] != change[3]:
+                result.append('- field %s' % str(change[2]))
+                result.append('+ field %s' % str(change[3]))
+
+    if sectionNodeType is not None:
+        result.append('')
+
+    return result
+
 class NodeDBEncoder(json.JSONEncoder):
 
     def default(self, obj):
@@ -1176,6 +2171,65 @@ class NodeDBEncoder(json.JSONEncoder):
 def toJSON(ndb):
     return json.dumps(ndb, sort_keys=True, indent=4, cls=NodeDBEncoder)
 
+# JSON patches
+
+PATCH_FORMAT = 'ndbpatch'
+PATCH_VERSION = 1
+
+# keys of the change elements following the operation and the node type,
+# see formatChanges
+CHANGE_KEYS = {'setNodeProperty' : ('name', 'old', 'new'),
+               'replaceField' : ('old', 'new'),
+               'removeField' : ('old',),
+               'addField' : ('new',),
+               'removeNode' : ('old',),
+               'addNode' : ('new',),
+               'setNodeOrder' : ('old', 'new'),
+               'renameField' : ('old', 'new'),
+               'moveField' : ('old', 'new', 'from', 'removed')}
+
+def changeToJSONObject(change):
+    """returns dictionary representing change in JSON patches"""
+    d = {'op' : change[0], 'node' : change[1]}
+    for key, value in zip(CHANGE_KEYS[change[0]], change[2:]):
+        d[key] = value
+    return d
+
+def changesToJSON(changes):
+    """Converts list of changes returned by the compare methods to JSON
+    patch. Every change is stored as object with the keys op, node and
+    the keys from CHANGE_KEYS, nodes and fields are stored like in toJSON.
+    """
+    return json.dumps({'format' : PATCH_FORMAT,
+                       'version' : PATCH_VERSION,
+                       'changes' : map(changeToJSONObject, changes)},
+                      sort_keys=True, indent=4, cls=NodeDBEncoder)
+
+def changesFromJSON(source):
+    """Returns list of changes from the JSON patch produced by
+    changesToJSON, source is either a JSON string or a file object.
+    """
+    decoder = json.JSONDecoder(object_hook=_decodeJSONObject)
+    if getattr(source, 'read', None) is not None:
+        source = source.read()
+    patch = decoder.decode(source)
+    if not isinstance(patch, dict) or patch.get('format') != PATCH_FORMAT:
+        raise NodeDBException('JSON data does not contain a NodeDB patch')
+    if patch.get('version') != PATCH_VERSION:
+        raise NodeDBException('Unsupported patch version %s' % \
+                              patch.get('version'))
+    changes = []
+    for d in patch['changes']:
+        op = d.get('op')
+        if op not in CHANGE_KEYS:
+            raise NodeDBException('Unknown change %s' % repr(op))
+        try:
+            changes.append(tuple([op, d['node']] +
+                                 [d[key] for key in CHANGE_KEYS[op]]))
+        except KeyError, e:
+            raise NodeDBException('Change %s misses %s' % (op, e))
+    return changes
+
 def toXML(v, xmlgen=None):
     if not xmlgen:
         import StringIO
@@ -1185,3 +2239,246 @@ def toXML(v, xmlgen=None):
         return f.getvalue()
     else:
         return v.toXML(xmlgen)
+
+# JSON and XML importers
+
+def _str(s):
+    """converts unicode strings returned by the JSON and XML parsers
+    back to str, other values are returned unchanged"""
+    if isinstance(s, unicode):
+        return s.encode('utf-8')
+    return s
+
+def _strValue(v):
+    if isinstance(v, list):
+        return [_strValue(i) for i in v]
+    return _str(v)
+
+def _makeField(state):
+    """creates field from its serialized state, in the same way as
+    unpickling does, parsedValue is only computed when missing"""
+    field = Field.__new__(Field)
+    field.__setstate__(state)
+    return field
+
+def _decodeJSONObject(d):
+    # Note: objects are decoded bottom-up, so all nested objects
+    # are already converted when the enclosing object is decoded
+    className = d.get('__class__')
+    if className is None:
+        # attributes or annotations dictionary
+        return dict([(_str(k), _strValue(v)) for k, v in d.iteritems()])
+    if className == 'Field':
+        return _makeField({'type' : _str(d['type']),
+                           'accessType' : d['accessType'],
+                           'name' : _str(d['name']),
+                           'value' : _str(d['value']),
+                           'parsedValue' : _strValue(d['parsedValue']),
+                           'validValueTypes' : _strValue(d['validValueTypes']),
+                           'info' : _str(d['info']),
+                           'annotations' : d['annotations']})
+    if className == 'Annotation':
+        return Annotation(d['name'], _strValue(d['valList']))
+    if className == 'Annotations':
+        return Annotations(d['annotDict'].values())
+    if className == 'Node':
+        return Node(_str(d['type']), _strValue(d['superTypes']), d['fields'],
+                    _str(d['specFile']), d['abstract'],
+                    _str(d['componentName']), d['attributes'])
+    if className == 'NodeDB':
+        return NodeDB(d['nodeList'])
+    if className == 'NullNode':
+        return NULL_NODE
+    raise NodeDBException('Unknown class %s in JSON data' % className)
+
+def fromJSON(source):
+    """Creates NodeDB from the JSON representation produced by toJSON,
+    source is either a JSON string or a file object.
+    """
+    # Note: the decoder converts every object immediately when it was
+    # parsed, so no intermediate dictionaries are kept for the whole
+    # document.
+    decoder = json.JSONDecoder(object_hook=_decodeJSONObject)
+    if getattr(source, 'read', None) is not None:
+        source = source.read()
+    ndb = decoder.decode(source)
+    if not isinstance(ndb, NodeDB):
+        raise NodeDBException('JSON data does not contain a NodeDB')
+    ndb.updateHierarchy()
+    return ndb
+
+# JSON Lines format: a header line followed by one line per node sorted by
+# node type, every node line stores the position of the node in the
+# database, so a database can be processed one node at a time.
+
+JSON_LINES_FORMAT = 'ndb-jsonl'
+JSON_LINES_VERSION = 1
+
+def writeJSONLines(ndb, out):
+    """writes ndb to out in JSON Lines format"""
+    print >>out, json.dumps({'format' : JSON_LINES_FORMAT,
+                             'version' : JSON_LINES_VERSION,
+                             'nodes' : len(ndb.nodeList)},
+                            sort_keys=True)
+    indexedNodes = [(ndb.nodeList[i].getType(), i)
+                    for i in xrange(len(ndb.nodeList))]
+    indexedNodes.sort()
+    for nodeType, index in indexedNodes:
+        print >>out, json.dumps({'index' : index,
+                                 'node' : ndb.nodeList[index]},
+                                sort_keys=True, cls=NodeDBEncoder)
+
+def iterJSONLines(fd):
+    """generates tuples (index, node) from file object fd in JSON Lines
+    format written by writeJSONLines, compressed data are decompressed.
+    Only a single node is kept in memory.
+    """
+    fd = openDecompressedReader(fd)
+    decoder = json.JSONDecoder(object_hook=_decodeJSONObject)
+    header = decoder.decode(fd.readline())
+    if not isinstance(header, dict) or \
+       header.get('format') != JSON_LINES_FORMAT:
+        raise NodeDBException('Data are not in NodeDB JSON Lines format')
+    if header.get('version') != JSON_LINES_VERSION:
+        raise NodeDBException('Unsupported JSON Lines version %s' % \
+                              header.get('version'))
+    lastType = None
+    while True:
+        line = fd.readline()
+        if not line:
+            break
+        if not line.strip():
+            continue
+        d = decoder.decode(line)
+        node = d['node']
+        if lastType is not None and node.getType() <= lastType:
+            raise NodeDBException('Nodes in JSON Lines data are not sorted' \
+                                  ' by type: %s follows %s' % \
+                                  (node.getType(), lastType))
+        lastType = node.getType()
+        yield d['index'], node
+
+def diffJSONLines(fd1, fd2, fullDiff=False):
+    """generates the same lines as NodeDB.diff for databases stored in
+    JSON Lines format in file objects fd1 and fd2. Both files are read
+    in parallel in node type order, only the current node of every file
+    and the positions of nodes (for removed and added nodes and node
+    order) are kept in memory.
+    """
+    iter1 = iterJSONLines(fd1)
+    iter2 = iterJSONLines(fd2)
+    # lists of (index, nodeType)
+    order1 = []
+    order2 = []
+    common = {}
+    item1 = next(iter1, None)
+    item2 = next(iter2, None)
+    while item1 is not None or item2 is not None:
+        if item2 is None or \
+           (item1 is not None and item1[1].getType() < item2[1].getType()):
+            order1.append((item1[0], item1[1].getType()))
+            item1 = next(iter1, None)
+        elif item1 is None or item2[1].getType() < item1[1].getType():
+            order2.append((item2[0], item2[1].getType()))
+            item2 = next(iter2, None)
+        else:
+            nodeType = item1[1].getType()
+            order1.append((item1[0], nodeType))
+            order2.append((item2[0], nodeType))
+            common[nodeType] = True
+            for line in formatChanges(item1[1].compare(item2[1], fullDiff)):
+                yield line
+            item1 = next(iter1, None)
+            item2 = next(iter2, None)
+
+    order1.sort()
+    order2.sort()
+    changes = [('removeNode', t, None) for i, t in order1 if t not in common]
+    added = [('addNode', t, None) for i, t in order2 if t not in common]
+    changes.extend(added)
+    if fullDiff:
+        newOrder = [t for i, t in order2]
+        order = [t for i, t in order1 if t in common] + [c[1] for c in added]
+        if order != newOrder:
+            changes.append(('setNodeOrder', None, [t for i, t in order1],
+                            newOrder))
+    for line in formatChanges(changes):
+        yield line
+
+XML_ATTRIBUTE_CONVERTERS = {'bool' : lambda v: v == 'true',
+                            'int' : int,
+                            'float' : float,
+                            'string' : _str}
+
+def _textList(elem):
+    if elem is None:
+        return []
+    return [_str(e.text or '') for e in elem]
+
+def _xmlNodeFromElement(elem):
+    fields = []
+    for fieldElem in elem.find('fields'):
+        annotations = Annotations()
+        annotationsElem = fieldElem.find('annotations')
+        if annotationsElem is not None:
+            for annElem in annotationsElem:
+                valuesElem = annElem.find('values')
+                if valuesElem is not None:
+                    valList = _textList(valuesElem)
+                else:
+                    valList = None
+                annotations.setAnnotation(Annotation(annElem.get('name'),
+                                                     valList))
+        fields.append(_makeField({
+            'type' : _str(fieldElem.get('type')),
+            'accessType' : convertAccessTypeNameToId(fieldElem.get('accessType')),
+            'name' : _str(fieldElem.get('name')),
+            'value' : _str(fieldElem.findtext('value') or None),
+            'validValueTypes' : _textList(fieldElem.find('validValueTypes')),
+            'info' : _str(fieldElem.findtext('info') or None),
+            'annotations' : annotations}))
+
+    attributes = {}
+    attributesElem = elem.find('attributes')
+    if attributesElem is not None:
+        for attrElem in attributesElem:
+            conv = XML_ATTRIBUTE_CONVERTERS[attrElem.get('type', 'string')]
+            attributes[_str(attrElem.get('name'))] = conv(attrElem.text or '')
+
+    return Node(_str(elem.get('type')),
+                _textList(elem.find('superTypes')),
+                fields,
+                _str(elem.findtext('specFile') or None),
+                elem.get('abstract') == 'true',
+                _str(elem.get('componentName')),
+                attributes)
+
+def fromXML(source):
+    """Creates NodeDB from the XML representation produced by toXML,
+    source is either a XML string or a file object.
+    """
+    try:
+        import xml.etree.cElementTree as ElementTree
+    except ImportError:
+        import xml.etree.ElementTree as ElementTree
+
+    if getattr(source, 'read', None) is None:
+        import StringIO
+        source = StringIO.StringIO(source)
+
+    ndb = NodeDB()
+    nodeListElem = None
+    for event, elem in ElementTree.iterparse(source, ('start', 'end')):
+        if event == 'start':
+            if elem.tag == 'nodeList':
+                nodeListElem = elem
+        elif elem.tag == 'node':
+            ndb.addNode(_xmlNodeFromElement(elem))
+            # drop processed elements, so memory usage does not depend
+            # on the number of nodes
+            elem.clear()
+            if nodeListElem is not None:
+                nodeListElem.remove(elem)
+
+    ndb.updateHierarchy()
+    return ndb
@@ -29,6 +29,9 @@ import nodedb
 def usage(exitCode = 0):
     print 'Usage:',sys.argv[0],'[options] [<node-db-file>]'
     print '-h | --help                     Print this message and exit.'
+    print '-c | --codec name               Compress output node database with'
+    print '                                the specified codec (%s)' % \
+          ', '.join(nodedb.getCodecNames())
     sys.exit(exitCode)
 
 def error(msg, exitCode = 1, exit = True):
@@ -40,17 +43,24 @@ def error(msg, exitCode = 1, exit = True):
 
 def main():
     try:
-        opts, args = getopt.getopt(sys.argv[1:], 'h',
-                                   ['help'])
+        opts, args = getopt.getopt(sys.argv[1:], 'hc:',
+                                   ['help', 'codec='])
     except getopt.GetoptError, e:
         error(str(e), exit = False)
         usage(1)
 
     nodes = []
+    codec = None
 
     for o, a in opts:
         if o in ('-h', '--help'):
             usage()
+        elif o in ('-c', '--codec'):
+            codec = a
+
+    if codec is not None and codec != 'none' and \
+       codec not in nodedb.getCodecNames():
+        error('unknown compression codec %s' % codec)
 
     if len(args) > 0:
         f = args[0]
@@ -273,7 +283,7 @@ def main():
 
     # output ndb to stdout
 
-    ndb.save(sys.stdout)
+    ndb.save(sys.stdout, codec)
 
 if __name__ == '__main__':
     main()
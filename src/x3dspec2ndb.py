@@ -33,7 +33,6 @@ import getopt
 import glob
 import re
 from nodedb import *
-import cPickle as pickle
 
 DEBUG_MODE = False
 
@@ -1004,6 +1003,9 @@ def usage(exitCode = 0):
     print 'Usage:',sys.argv[0],'[options] <path-to-x3d-spec>'
     print '-h | --help                     Print this message and exit.'
     print '-p | --pickle                   Output node database in pickle format'
+    print '-c | --codec name               Compress pickled node database with'
+    print '                                the specified codec (%s)' % \
+          ', '.join(getCodecNames())
     print '-e | --errors                   Print all parsing errors to stderr'
     print '-t | --text                     Input is not a X3D spec in HTML format,'
     print '                                but a text file with a X3D-style node'
@@ -1012,14 +1014,15 @@ def usage(exitCode = 0):
 
 def main():
     try:
-        opts, args = getopt.getopt(sys.argv[1:], 'hpetd',
-                                   ['help', 'pickle', 'errors', 'text',
-                                    'debug'])
+        opts, args = getopt.getopt(sys.argv[1:], 'hpc:etd',
+                                   ['help', 'pickle', 'codec=', 'errors',
+                                    'text', 'debug'])
     except getopt.GetoptError, e:
         error(str(e), exit = False)
         usage(1)
 
     pickleNodeDB = False
+    codec = None
     printErrors = False
     textSpec = False
     global DEBUG_MODE
@@ -1029,6 +1032,8 @@ def main():
             usage()
         elif o in ('-p', '--pickle'):
             pickleNodeDB = True
+        elif o in ('-c', '--codec'):
+            codec = a
         elif o in ('-e', '--errors'):
             printErrors = True
         elif o in ('-t', '--text'):
@@ -1039,6 +1044,10 @@ def main():
     if len(args) != 1:
         error('you must specify path to X3D specification')
 
+    if codec is not None and codec != 'none' and \
+       codec not in getCodecNames():
+        error('unknown compression codec %s' % codec)
+
     pathToSpec = args[0]
     print >>sys.stderr, 'Path to X3D specification:', pathToSpec
 
@@ -1076,16 +1085,16 @@ def main():
     nodeDB = parser.getNodeDB()
     
     if pickleNodeDB:
-        pickle.dump(nodeDB, sys.stdout)
+        nodeDB.save(sys.stdout, codec)
     else:
         specFile = None
+        out = sys.stdout
         for node in nodeDB.getNodeList():
             if node.getSpecFile() != specFile:
                 specFile = node.getSpecFile()
-                print '# file : %s' % specFile
-                print
-            print node
-            print
+                out.write('# file : %s\n\n' % specFile)
+            node.write(out)
+            out.write('\n\n')
 
     if printErrors:
         for e in parser.collectedErrors:
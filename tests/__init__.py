@@ -0,0 +1,9 @@
+# Tests of the NodeDB tools, run from the top directory with
+#
+#   python -m unittest discover -s tests -t .
+
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir, 'src'))
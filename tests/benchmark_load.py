@@ -0,0 +1,103 @@
+# benchmark_load.py -- Load times of NodeDB serialization formats
+#
+# Author: Dmitri Rubinstein <rubinstein@cs.uni-saarland.de>
+#
+# Copyright (C) 2009, 2010, 2011, 2012 German Research Center for
+# Artificial Intelligence (DFKI)
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+
+# Run from the top directory:
+#
+#   python -m tests.benchmark_load [number of nodes [repetitions]]
+
+import sys
+import os
+import time
+import shutil
+import tempfile
+import nodedb
+import synthetic
+
+def savePickle(ndb, fileName):
+    ndb.save(fileName)
+
+def saveJSON(ndb, fileName):
+    writeFile(fileName, nodedb.toJSON(ndb))
+
+def saveXML(ndb, fileName):
+    writeFile(fileName, nodedb.toXML(ndb))
+
+def saveModule(ndb, fileName):
+    ndb.saveAsPythonModule(fileName)
+    # compile the module, the benchmark measures loading from the .pyc
+    nodedb.loadFromPythonModule(fileName)
+
+def loadJSON(fileName):
+    fd = open(fileName, 'rb')
+    try:
+        return nodedb.fromJSON(fd)
+    finally:
+        fd.close()
+
+def loadXML(fileName):
+    fd = open(fileName, 'rb')
+    try:
+        return nodedb.fromXML(fd)
+    finally:
+        fd.close()
+
+def writeFile(fileName, data):
+    fd = open(fileName, 'wb')
+    try:
+        fd.write(data)
+    finally:
+        fd.close()
+
+# name, file name, save function, load function
+FORMATS = [('pickle', 'spec.ndb', savePickle, nodedb.load),
+           ('JSON', 'spec.json', saveJSON, loadJSON),
+           ('XML', 'spec.xml', saveXML, loadXML),
+           ('module', 'spec.py', saveModule, nodedb.loadFromPythonModule)]
+
+def main():
+    numNodes = 2000
+    repetitions = 3
+    if len(sys.argv) > 1:
+        numNodes = int(sys.argv[1])
+    if len(sys.argv) > 2:
+        repetitions = int(sys.argv[2])
+
+    ndb = synthetic.makeNodeDB(numNodes)
+    directory = tempfile.mkdtemp()
+    try:
+        print '%i nodes, best of %i loads' % (numNodes, repetitions)
+        for name, fileName, save, load in FORMATS:
+            fileName = os.path.join(directory, fileName)
+            save(ndb, fileName)
+            times = []
+            for i in xrange(repetitions):
+                start = time.time()
+                loaded = load(fileName)
+                times.append(time.time() - start)
+            if synthetic.getNodeDBDifferences(ndb, loaded):
+                print '%-8s loaded database differs' % name
+            print '%-8s %8.3f s %10i bytes' % (name, min(times),
+                                                os.path.getsize(fileName))
+    finally:
+        shutil.rmtree(directory)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,147 @@
+# synthetic.py -- Synthetic node databases for tests and benchmarks
+#
+# Author: Dmitri Rubinstein <rubinstein@cs.uni-saarland.de>
+#
+# Copyright (C) 2009, 2010, 2011, 2012 German Research Center for
+# Artificial Intelligence (DFKI)
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+
+import random
+import nodedb
+from nodedb import Node, Field, Annotation
+
+FIELD_VALUES = [('SFFloat', '1.0'), ('SFInt32', '0'), ('SFBool', 'TRUE'),
+                ('SFVec3f', '0 0 0'), ('MFString', '["a" "b"]'),
+                ('SFNode', 'NULL'), ('MFNode', '[]'), ('SFString', '""'),
+                ('MFFloat', '[1 2 3]'), ('SFTime', None)]
+
+COMPONENTS = ['Core', 'Grouping', 'Rendering', 'Shape', 'Time',
+              'Texturing', 'Sound']
+
+def makeNodeDB(numNodes, seed=1):
+    """returns database of numNodes nodes Node0 ... with up to two super
+    types each, inherited fields are copied into the derived nodes like in
+    databases created from the specification"""
+    rand = random.Random(seed)
+    ndb = nodedb.NodeDB()
+    nodeTypes = []
+    for i in xrange(numNodes):
+        superTypes = []
+        candidates = nodeTypes[:min(i, 60)]
+        if candidates:
+            superTypes = rand.sample(candidates,
+                                     min(len(candidates), rand.randint(1, 2)))
+            superTypes.sort()
+        fields = []
+        fieldNames = {}
+        for superType in superTypes:
+            for field in ndb.getNode(superType).getFields():
+                if field.getName() not in fieldNames:
+                    fieldNames[field.getName()] = True
+                    fields.append(field.copy())
+        for k in xrange(rand.randint(1, 6)):
+            fieldType, value = rand.choice(FIELD_VALUES)
+            validValueTypes = []
+            if fieldType in ('SFNode', 'MFNode') and nodeTypes:
+                validValueTypes = [rand.choice(nodeTypes)]
+            annotations = []
+            if rand.random() < 0.2:
+                annotations.append(Annotation('isResource'))
+            if fieldType == 'SFInt32' and rand.random() < 0.3:
+                annotations.append(Annotation('enum', ['a', 'b']))
+            info = None
+            if rand.random() < 0.3:
+                info = 'info text %i' % k
+            fields.append(Field(fieldType, rand.randint(0, 3),
+                                'f%i_%i' % (i, k), value, validValueTypes,
+                                annotations, info))
+        attributes = {}
+        if i % 2:
+            attributes['encodingId'] = i
+        if i % 5 == 0:
+            attributes['auxTypeName'] = 'Aux%i' % i
+        nodeType = 'Node%i' % i
+        ndb.addNode(Node(nodeType, superTypes, fields,
+                         'spec%i.html' % (i // 50), i % 3 == 0,
+                         rand.choice(COMPONENTS), attributes))
+        nodeTypes.append(nodeType)
+    ndb.updateHierarchy()
+    return ndb
+
+def makeEdition(ndb, edition):
+    """returns copy of ndb with a few changed, added and removed fields
+    and nodes, like a revision of the specification"""
+    ndb = ndb.copy()
+    ndb.updateHierarchy()
+    nodes = ndb.getNodeList()
+    for i in xrange(edition, len(nodes), 17):
+        field = nodes[i].getFields()[-1]
+        if field.getType() == 'SFFloat':
+            field.setValue('%i.5' % edition)
+        else:
+            field.info = 'edition %i' % edition
+    for i in xrange(edition, len(nodes), 23):
+        nodes[i].addField(Field('SFBool', 3, 'e%i_%i' % (edition, i),
+                                'FALSE'))
+    leaves = [n for n in nodes if not n.getDerivedNodes()]
+    ndb.removeNode(leaves[edition])
+    ndb.addNode(Node('Edition%iNode' % edition, [nodes[0].getType()],
+                     [f.copy() for f in nodes[0].getFields()],
+                     'edition%i.html' % edition, False, 'Core'))
+    ndb.updateHierarchy()
+    return ndb
+
+def normalizeValue(value):
+    """replaces NullNode instances in parsed values by None, unpickled
+    values contain new instances instead of nodedb.NULL_NODE"""
+    if isinstance(value, nodedb.NullNode):
+        return None
+    if isinstance(value, list):
+        return map(normalizeValue, value)
+    return value
+
+def getNodeDBDifferences(a, b):
+    """returns list of differences between the databases a and b, including
+    the properties not compared by NodeDB.__eq__: node and field order,
+    field names, node attributes and parsed default values"""
+    differences = []
+    if a != b:
+        differences.append('databases are not equal')
+    types = [n.getType() for n in a.getNodeList()]
+    otherTypes = [n.getType() for n in b.getNodeList()]
+    if types != otherTypes:
+        differences.append('node order %s != %s' % (types, otherTypes))
+        return differences
+    for node, other in zip(a.getNodeList(), b.getNodeList()):
+        nodeType = node.getType()
+        for what, value, otherValue in [
+            ('super types', node.getSuperTypes(), other.getSuperTypes()),
+            ('fields', [f.getName() for f in node.getFields()],
+             [f.getName() for f in other.getFields()]),
+            ('attributes', node.attributes, other.attributes),
+            ('spec file', node.getSpecFile(), other.getSpecFile()),
+            ('fingerprint', node.getFingerprint(), other.getFingerprint())]:
+            if value != otherValue:
+                differences.append('%s of %s: %r != %r' % \
+                                   (what, nodeType, value, otherValue))
+        for field, otherField in zip(node.getFields(), other.getFields()):
+            if normalizeValue(field.getParsedValue()) != \
+               normalizeValue(otherField.getParsedValue()):
+                differences.append('parsed value of %s.%s: %r != %r' % \
+                                   (nodeType, field.getName(),
+                                    field.getParsedValue(),
+                                    otherField.getParsedValue()))
+    return differences
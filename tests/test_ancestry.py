@@ -0,0 +1,94 @@
+import unittest
+import nodedb
+import ndbancestry
+import synthetic
+from nodedb import Node
+
+def getAllBases(node, basesList, virtualBasesList):
+    """recursive walk of the super nodes like ndbinfo.py -b and -v did
+    before ndbancestry"""
+    for n in node.getSuperNodes():
+        if nodedb.containsObject(basesList, n):
+            if not nodedb.containsObject(virtualBasesList, n):
+                virtualBasesList.append(n)
+        else:
+            basesList.append(n)
+            getAllBases(n, basesList, virtualBasesList)
+
+def getAllDerivedNodes(node, derivedList):
+    for n in node.getDerivedNodes():
+        if not nodedb.containsObject(derivedList, n):
+            derivedList.append(n)
+            getAllDerivedNodes(n, derivedList)
+
+def makeDiamonds():
+    """returns database with diamond shaped inheritance"""
+    hierarchy = [('A', []), ('B', ['A']), ('C', ['A']), ('D', ['B', 'C']),
+                 ('E', ['D', 'C']), ('F', ['A']), ('G', ['E', 'F']),
+                 ('H', ['B']), ('I', ['H', 'G'])]
+    ndb = nodedb.NodeDB([Node(t, superTypes, [], 'spec.html', False, 'Core')
+                         for t, superTypes in hierarchy])
+    ndb.updateHierarchy()
+    return ndb
+
+def getTypes(nodes):
+    return [n.getType() for n in nodes]
+
+class AncestryTest(unittest.TestCase):
+
+    def checkBases(self, ndb):
+        ancestry = ndbancestry.Ancestry(ndb)
+        for node in ndb.getNodeList():
+            bases = []
+            virtualBases = []
+            getAllBases(node, bases, virtualBases)
+            result = ancestry.getBases(node)
+            self.assertEqual(getTypes(result[0]), getTypes(bases))
+            self.assertEqual(getTypes(result[1]), getTypes(virtualBases))
+
+    def checkDerivedNodes(self, ndb, nodeLists):
+        ancestry = ndbancestry.Ancestry(ndb)
+        for nodeList in nodeLists:
+            nodeList = map(ndb.getNode, nodeList)
+            common = None
+            for node in nodeList:
+                derived = []
+                getAllDerivedNodes(node, derived)
+                derived = getTypes(derived)
+                if common is None:
+                    common = derived
+                else:
+                    common = [t for t in common if t in derived]
+            # database order
+            expected = [t for t in getTypes(ndb.getNodeList())
+                        if t in common]
+            self.assertEqual(getTypes(ancestry.getCommonDerivedNodes(
+                nodeList)), expected)
+
+    def testDiamondBases(self):
+        ndb = makeDiamonds()
+        self.checkBases(ndb)
+        bases, virtualBases = ndbancestry.Ancestry(ndb).getBases(
+            ndb.getNode('I'))
+        self.assertEqual(getTypes(bases),
+                         ['H', 'B', 'A', 'G', 'E', 'D', 'C', 'F'])
+        self.assertEqual(getTypes(virtualBases), ['B', 'A', 'C'])
+
+    def testDiamondDerivedNodes(self):
+        ndb = makeDiamonds()
+        self.checkDerivedNodes(ndb, [['A'], ['B', 'C'], ['C', 'F'],
+                                     ['H', 'G'], ['I'], ['B', 'D', 'E']])
+        self.assertEqual(getTypes(ndbancestry.Ancestry(ndb)
+                                  .getCommonDerivedNodes(
+                                      [ndb.getNode('B'), ndb.getNode('C')])),
+                         ['D', 'E', 'G', 'I'])
+
+    def testSyntheticDatabase(self):
+        ndb = synthetic.makeNodeDB(200)
+        self.checkBases(ndb)
+        self.checkDerivedNodes(ndb, [['Node0'], ['Node1', 'Node2'],
+                                     ['Node3', 'Node5', 'Node8'],
+                                     ['Node199']])
+
+if __name__ == '__main__':
+    unittest.main()
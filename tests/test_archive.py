@@ -0,0 +1,77 @@
+import unittest
+import os
+import shutil
+import tempfile
+import cPickle as pickle
+import nodedb
+import ndbarchive
+import synthetic
+
+class ArchiveTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.editions = [synthetic.makeNodeDB(150)]
+        for i in xrange(1, 4):
+            self.editions.append(synthetic.makeEdition(self.editions[-1], i))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def makeArchive(self):
+        archive = ndbarchive.NDBArchive()
+        for i, ndb in enumerate(self.editions):
+            archive.addEdition('e%i' % i, ndb)
+        fileName = os.path.join(self.directory, 'editions.nda')
+        archive.save(fileName)
+        return fileName
+
+    def testEditionsAreRestored(self):
+        archive = ndbarchive.loadArchive(self.makeArchive())
+        self.assertEqual(archive.getEditionNames(), ['e0', 'e1', 'e2', 'e3'])
+        # latest edition first, so the whole chain is applied at once
+        for i in (3, 0, 1, 2):
+            ndb = archive.getEdition('e%i' % i)
+            self.assertEqual(synthetic.getNodeDBDifferences(
+                self.editions[i], ndb), [])
+
+    def testArchiveIsSmallerThanEditions(self):
+        archiveSize = os.path.getsize(self.makeArchive())
+        editionsSize = 0
+        for i, ndb in enumerate(self.editions):
+            fileName = os.path.join(self.directory, 'e%i.ndb' % i)
+            ndb.save(fileName)
+            editionsSize += os.path.getsize(fileName)
+        # base edition and small deltas
+        self.assertTrue(archiveSize < editionsSize / 2,
+                        '%i bytes, editions %i bytes' % (archiveSize,
+                                                         editionsSize))
+
+    def testChangesAreDetached(self):
+        archive = ndbarchive.NDBArchive()
+        archive.addEdition('e0', self.editions[0])
+        archive.addEdition('e1', self.editions[1])
+        changes = archive.getChanges('e1')
+        fullSize = len(pickle.dumps(self.editions[1],
+                                    pickle.HIGHEST_PROTOCOL))
+        changesSize = len(pickle.dumps(changes, pickle.HIGHEST_PROTOCOL))
+        self.assertTrue(changesSize * 10 < fullSize,
+                        '%i bytes, edition %i bytes' % (changesSize,
+                                                        fullSize))
+        # changes do not share nodes and fields with the edition
+        node = self.editions[1].getNode('Edition1Node')
+        for change in changes:
+            for value in change[2:]:
+                self.assertFalse(value is node)
+
+    def testPickledNodesDoNotStoreHierarchy(self):
+        node = self.editions[0].getNodeList()[-1]
+        self.assertTrue(node.getSuperNodes())
+        state = node.__getstate__()
+        self.assertFalse('superNodes' in state)
+        self.assertFalse('derivedNodes' in state)
+        for field in node.getFields():
+            self.assertFalse('declaredInNodes' in field.__getstate__())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,134 @@
+import unittest
+import os
+import shutil
+import tempfile
+import nodedb
+import ndbcheck
+import synthetic
+from nodedb import Node, Field, Annotation
+
+def makeNodeDB(violation=None):
+    """returns database without findings, or with a single violation of
+    the rule named violation"""
+    def field(name, fieldType='SFBool', accessType=nodedb.INPUT_OUTPUT,
+              value='FALSE', validValueTypes=[], annotations=[]):
+        return Field(fieldType, accessType, name, value, validValueTypes,
+                     annotations)
+
+    baseFields = [field('metadata', 'SFNode', value='NULL',
+                        validValueTypes=['Base'])]
+    childFields = [f.copy() for f in baseFields] + \
+                  [field('containerField', 'SFString', value='"children"'),
+                   field('mode', 'SFInt32', value='0',
+                         annotations=[Annotation('enum', ['a', 'b'])]),
+                   field('on', annotations=[Annotation('encodingId',
+                                                       ['1'])]),
+                   field('off', annotations=[Annotation('encodingId',
+                                                        ['2'])])]
+    otherFields = [field('containerField', 'SFString', value='"children"')]
+    childAttributes = {'encodingId' : 1}
+    otherAttributes = {'encodingId' : 2}
+
+    if violation == 'inherited-field':
+        childFields[0] = field('metadata', 'SFNode', nodedb.INITIALIZE_ONLY,
+                               'NULL', ['Base'])
+    elif violation == 'valid-value-types':
+        otherFields.append(field('node', 'SFNode', value='NULL',
+                                 validValueTypes=['Unknown']))
+    elif violation == 'enum-field':
+        otherFields.append(field('mode', 'SFFloat', value='0',
+                                 annotations=[Annotation('enum', ['a'])]))
+    elif violation == 'sfnode-default':
+        otherFields.append(field('node', 'SFNode', value=None))
+    elif violation == 'container-field':
+        del otherFields[0]
+    elif violation == 'encoding-id':
+        otherAttributes['encodingId'] = 1
+    elif violation == 'field-encoding-id':
+        childFields[-1] = field('off', annotations=[Annotation('encodingId',
+                                                               ['1'])])
+
+    ndb = nodedb.NodeDB([
+        Node('Base', [], baseFields, 'base.html', True, 'Core'),
+        Node('Child', ['Base'], childFields, 'child.html', False, 'Core',
+             childAttributes),
+        Node('Other', [], otherFields, 'other.html', False, 'Core',
+             otherAttributes)])
+    ndb.updateHierarchy()
+    return ndb
+
+RULE_MODULE = '''import ndbcheck
+
+class NoOffFieldRule(ndbcheck.Rule):
+
+    name = 'test-no-off-field'
+    severity = ndbcheck.WARNING
+    description = 'nodes have no field named off'
+
+    def checkNode(self, context, node):
+        field = node.findField('off')
+        if field is None:
+            return []
+        return [self.finding(node, field, 'Field off in node %s' % \\
+                             node.getType())]
+
+ndbcheck.registerRule(NoOffFieldRule())
+'''
+
+class CheckTest(unittest.TestCase):
+
+    def check(self, ndb, **kw):
+        return [(f.ruleName, f.nodeType, f.fieldName)
+                for f in ndbcheck.checkNodeDB(ndb, processes=1, **kw)]
+
+    def testNoFindings(self):
+        self.assertEqual(self.check(makeNodeDB()), [])
+
+    def testBuiltinRules(self):
+        expected = {'inherited-field' : ('Child', 'metadata'),
+                    'valid-value-types' : ('Other', 'node'),
+                    'enum-field' : ('Other', 'mode'),
+                    'sfnode-default' : ('Other', 'node'),
+                    'container-field' : ('Other', None),
+                    'encoding-id' : ('Other', None)}
+        self.assertEqual(sorted(expected), sorted(ndbcheck.ruleNames))
+        for ruleName, (nodeType, fieldName) in expected.items():
+            self.assertEqual(self.check(makeNodeDB(ruleName)),
+                             [(ruleName, nodeType, fieldName)], ruleName)
+
+    def testDuplicateFieldEncodingId(self):
+        self.assertEqual(self.check(makeNodeDB('field-encoding-id')),
+                         [('encoding-id', 'Child', 'off')])
+
+    def testCustomRule(self):
+        directory = tempfile.mkdtemp()
+        try:
+            fileName = os.path.join(directory, 'testrules.py')
+            fd = open(fileName, 'w')
+            fd.write(RULE_MODULE)
+            fd.close()
+            ndbcheck.loadRuleModule(fileName)
+            try:
+                rule = ndbcheck.getRule('test-no-off-field')
+                self.assertEqual(self.check(makeNodeDB(), checkRules=[rule]),
+                                 [('test-no-off-field', 'Child', 'off')])
+            finally:
+                del ndbcheck.rules['test-no-off-field']
+                ndbcheck.ruleNames.remove('test-no-off-field')
+        finally:
+            shutil.rmtree(directory)
+
+    def testWorkerProcesses(self):
+        ndb = synthetic.makeNodeDB(200)
+        # a few violations
+        for node in ndb.getNodeList()[::20]:
+            node.addField(Field('SFNode', nodedb.INPUT_OUTPUT, 'x', None,
+                                ['Unknown']))
+        ndb.updateHierarchy()
+        findings = [str(f) for f in ndbcheck.checkNodeDB(ndb, processes=1)]
+        self.assertTrue(findings)
+        self.assertEqual([str(f) for f in
+                          ndbcheck.checkNodeDB(ndb, processes=2)], findings)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+import unittest
+import os
+import shutil
+import tempfile
+import nodedb
+import ndbcheck
+import synthetic
+from nodedb import Field
+
+class CheckCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cacheFile = os.path.join(self.directory, 'test.checkcache')
+        self.ndb = synthetic.makeNodeDB(100)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def check(self, cacheFile=None):
+        return [str(f) for f in ndbcheck.checkNodeDB(self.ndb, processes=1,
+                                                     cacheFile=cacheFile)]
+
+    def testCachedFindings(self):
+        findings = self.check()
+        self.assertEqual(self.check(self.cacheFile), findings)
+        self.assertTrue(os.path.exists(self.cacheFile))
+        # findings of the second check are read from the cache
+        self.assertEqual(self.check(self.cacheFile), findings)
+        mtime = int(os.path.getmtime(self.cacheFile))
+        os.utime(self.cacheFile, (mtime - 10, mtime - 10))
+        self.check(self.cacheFile)
+        self.assertEqual(os.path.getmtime(self.cacheFile), mtime - 10)
+
+    def testChangedSuperNode(self):
+        self.assertEqual(self.check(self.cacheFile), [])
+        # Node3 is unchanged, but differs now from its super node Node1
+        field = self.ndb.getNode('Node1').findField('f1_0')
+        self.ndb.getNode('Node1').replaceField(
+            Field(field.getType(), (field.getAccessType() + 1) % 4,
+                  field.getName(), field.getValue()))
+        self.ndb.updateHierarchy()
+        findings = self.check()
+        self.assertTrue([f for f in findings if 'Node3' in f])
+        self.assertEqual(self.check(self.cacheFile), findings)
+
+    def testUnwritableCache(self):
+        cacheFile = os.path.join(self.directory, 'missing', 'test.checkcache')
+        self.assertRaises(nodedb.NodeDBException, self.check, cacheFile)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,40 @@
+import unittest
+import os
+import shutil
+import tempfile
+import nodedb
+import synthetic
+
+
+class CodecTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.ndb = synthetic.makeNodeDB(200)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def testCodecs(self):
+        for codecName in nodedb.getCodecNames() + [None]:
+            fileName = os.path.join(self.directory, '%s.ndb' % codecName)
+            self.ndb.save(fileName, codecName)
+            fd = open(fileName, 'rb')
+            codec = nodedb.detectCodec(fd.read(16))
+            fd.close()
+            if codecName is None:
+                self.assertTrue(codec is None)
+            else:
+                self.assertEqual(codec.getName(), codecName)
+            # the codec is detected by its magic bytes
+            ndb = nodedb.load(fileName)
+            self.assertEqual(synthetic.getNodeDBDifferences(self.ndb, ndb),
+                             [], codecName)
+
+    def testUnknownCodec(self):
+        self.assertRaises(nodedb.NodeDBException, self.ndb.save,
+                          os.path.join(self.directory, 'test.ndb'),
+                          'unknown')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,135 @@
+import unittest
+import StringIO
+import nodedb
+import ndbcomponents
+import ndbinfo
+import synthetic
+from nodedb import Node, Field
+
+
+def makeNodeDB():
+    """returns database with nodes of the components Core, Grouping, Shape,
+    Rendering and Sound in mixed order"""
+    def makeField(name, validValueTypes=[]):
+        if validValueTypes:
+            return Field('MFNode', nodedb.INPUT_OUTPUT, name, None,
+                         validValueTypes)
+        return Field('SFFloat', nodedb.INPUT_OUTPUT, name, '1.0')
+    metadata = makeField('metadata', ['X3DNode'])
+    children = makeField('children', ['Shape', 'Sound'])
+    geometry = makeField('geometry', ['Coordinate'])
+    ndb = nodedb.NodeDB([
+        Node('X3DNode', [], [metadata], 'core.html', True, 'Core'),
+        Node('X3DChildNode', ['X3DNode'], [metadata.copy()], 'core.html',
+             True, 'Core'),
+        Node('Group', ['X3DChildNode'], [metadata.copy(), children],
+             'group.html', False, 'Grouping'),
+        Node('Shape', ['X3DChildNode'], [metadata.copy(), geometry],
+             'shape.html', False, 'Shape'),
+        Node('Coordinate', ['X3DNode'], [metadata.copy(),
+                                         makeField('point')],
+             'rendering.html', False, 'Rendering'),
+        Node('Transform', ['Group'], [metadata.copy(), children.copy(),
+                                      makeField('scale')],
+             'group.html', False, 'Grouping'),
+        Node('Sound', ['X3DChildNode'], [metadata.copy(),
+                                         makeField('intensity')],
+             'sound.html', False, 'Sound')])
+    ndb.updateHierarchy()
+    return ndb
+
+def getReasons(index, componentName, otherName):
+    return map(str, index.getDependencyReasons(componentName, otherName))
+
+class ComponentIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.ndb = makeNodeDB()
+        self.index = ndbcomponents.ComponentIndex(self.ndb)
+
+    def testComponents(self):
+        self.assertEqual(self.index.getComponentNames(),
+                         ['Core', 'Grouping', 'Shape', 'Rendering', 'Sound'])
+        self.assertEqual([n.getType() for n in self.index.getNodes(
+            'Grouping')], ['Group', 'Transform'])
+
+    def testSuperTypeDependency(self):
+        self.assertEqual(self.index.getDependencies('Shape'),
+                         ['Core', 'Rendering'])
+        self.assertEqual(getReasons(self.index, 'Shape', 'Core'),
+                         ['Shape derives X3DChildNode'])
+        self.assertEqual(self.index.getDependencies('Sound'), ['Core'])
+        self.assertEqual(self.index.getDependencies('Core'), [])
+        self.assertEqual(self.index.getDependents('Core'),
+                         ['Grouping', 'Shape', 'Rendering', 'Sound'])
+
+    def testValidValueTypeDependency(self):
+        self.assertEqual(self.index.getDependencies('Grouping'),
+                         ['Core', 'Shape', 'Sound'])
+        # children is inherited by Transform and counted only at Group,
+        # inherited metadata fields reference nodes of Core
+        self.assertEqual(getReasons(self.index, 'Grouping', 'Shape'),
+                         ['Group.children accepts Shape'])
+        self.assertEqual(getReasons(self.index, 'Grouping', 'Sound'),
+                         ['Group.children accepts Sound'])
+        self.assertEqual(getReasons(self.index, 'Grouping', 'Core'),
+                         ['Group derives X3DChildNode'])
+        self.assertEqual(getReasons(self.index, 'Shape', 'Rendering'),
+                         ['Shape.geometry accepts Coordinate'])
+
+    def testRequiredComponents(self):
+        self.assertEqual(self.index.getRequiredComponents(['Shape']),
+                         ['Core', 'Shape', 'Rendering'])
+        self.assertEqual(self.index.getRequiredComponents(['Grouping']),
+                         ['Core', 'Grouping', 'Shape', 'Rendering', 'Sound'])
+        self.assertEqual(self.index.getRequiredComponents(['Sound', 'Core']),
+                         ['Core', 'Sound'])
+
+class ListComponentsTest(unittest.TestCase):
+    """output of ndbinfo.py --list-components and --list-nodes-of-component
+    is the output of the loops over the database used before
+    ndbcomponents"""
+
+    def runQuery(self, ndb, argv):
+        options, args = ndbinfo.parseOptions(argv)
+        out = StringIO.StringIO()
+        ndbinfo.runQuery(ndb, options, 'test.ndb', out, StringIO.StringIO())
+        return out.getvalue()
+
+    def listComponents(self, ndb):
+        out = StringIO.StringIO()
+        components = {}
+        for n in ndb.getNodeList():
+            componentName = n.getComponentName()
+            if componentName not in components:
+                components[componentName] = True
+                print >>out, componentName
+        return out.getvalue()
+
+    def listNodesOfComponent(self, ndb, componentNames):
+        out = StringIO.StringIO()
+        for n in ndb.getNodeList():
+            if n.getComponentName() in componentNames:
+                print >>out, n.getType()
+        return out.getvalue()
+
+    def checkOutput(self, ndb, componentLists):
+        self.assertEqual(self.runQuery(ndb, ['--list-components']),
+                         self.listComponents(ndb))
+        for componentNames in componentLists:
+            self.assertEqual(
+                self.runQuery(ndb, ['--list-nodes-of-component',
+                                    ','.join(componentNames)]),
+                self.listNodesOfComponent(ndb, componentNames))
+
+    def testOutput(self):
+        self.checkOutput(makeNodeDB(), [['Grouping'], ['Sound', 'Grouping'],
+                                        ['Core', 'Unknown']])
+
+    def testSyntheticDatabase(self):
+        self.checkOutput(synthetic.makeNodeDB(200),
+                         [['Core'], ['Time', 'Grouping', 'Texturing'],
+                          synthetic.COMPONENTS])
+
+if __name__ == '__main__':
+    unittest.main()
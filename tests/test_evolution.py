@@ -0,0 +1,67 @@
+import unittest
+import os
+import shutil
+import tempfile
+import nodedb
+import ndbevolution
+import synthetic
+
+
+class EvolutionTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        editions = [synthetic.makeNodeDB(100)]
+        for i in xrange(1, 3):
+            editions.append(synthetic.makeEdition(editions[-1], i))
+        editions[2].getNode('Node1').setAttribute('encodingId', 100)
+        self.editions = []
+        for i, ndb in enumerate(editions):
+            fileName = os.path.join(self.directory, 'e%i.ndb' % i)
+            ndb.save(fileName)
+            self.editions.append(('e%i' % i, fileName))
+        self.leaves = [[n.getType() for n in ndb.getNodeList()
+                        if not n.getDerivedNodes()] for ndb in editions]
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def testNodeHistory(self):
+        evolution = ndbevolution.computeEvolution(self.editions, processes=1)
+        self.assertEqual(evolution.getNodeHistory('Node0'),
+                         [(0, 'added', [])])
+        self.assertEqual(evolution.getNodeHistory('Node1'),
+                         [(0, 'added', []), (2, 'changed', ['attributes'])])
+        self.assertEqual(evolution.getNodeHistory('Edition1Node'),
+                         [(1, 'added', [])])
+        removed = self.leaves[1][2]
+        self.assertEqual(evolution.getNodeHistory(removed),
+                         [(0, 'added', []), (2, 'removed', [])])
+
+    def testFieldHistory(self):
+        evolution = ndbevolution.computeEvolution(self.editions, processes=1)
+        # added in e1 to every 23rd node starting with Node1
+        self.assertEqual(evolution.getFieldHistory('Node24', 'e1_24'),
+                         [(1, 'added', [])])
+        # the last field of every 17th node starting with Node2 changed in e2
+        node = nodedb.load(self.editions[0][1]).getNode('Node19')
+        fieldName = node.getFields()[-1].getName()
+        history = evolution.getFieldHistory('Node19', fieldName)
+        self.assertEqual(history[0], (0, 'added', []))
+        self.assertEqual(history[1][:2], (2, 'changed'))
+        self.assertTrue(history[1][2] in (['value'], ['info']))
+        # fields of a node removed in e2
+        removed = self.leaves[1][2]
+        for fieldName in evolution.getFieldNames(removed):
+            self.assertEqual(evolution.getFieldHistory(removed, fieldName),
+                             [(0, 'added', []), (2, 'removed', [])])
+
+    def testProcesses(self):
+        evolution1 = ndbevolution.computeEvolution(self.editions, processes=1)
+        evolution2 = ndbevolution.computeEvolution(self.editions, processes=2)
+        self.assertEqual(evolution2.nodeHistory, evolution1.nodeHistory)
+        self.assertEqual(evolution2.fieldHistory, evolution1.fieldHistory)
+        self.assertEqual(evolution2.toJSON(), evolution1.toJSON())
+
+if __name__ == '__main__':
+    unittest.main()
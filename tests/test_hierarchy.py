@@ -0,0 +1,98 @@
+import unittest
+import nodedb
+import ndbhierarchy
+import synthetic
+from nodedb import Node, Field
+
+def makeNodeDB(baseFields, childFields, baseValue='1.0'):
+    """returns database with abstract node Base, concrete nodes Child and
+    GrandChild derived from it, abstract node Middle between Child and
+    GrandChild, and unrelated node Other. Inherited fields are copied into
+    the derived nodes"""
+    def makeFields(names, value='1.0'):
+        return [Field('SFFloat', nodedb.INPUT_OUTPUT, name, value)
+                for name in names]
+    def copyFields(fields):
+        return [f.copy() for f in fields]
+    baseFields = makeFields(baseFields, baseValue)
+    childFields = baseFields + makeFields(childFields)
+    ndb = nodedb.NodeDB([Node('Base', [], baseFields, 'base.html', True,
+                              'Core'),
+                         Node('Child', ['Base'], copyFields(childFields),
+                              'child.html', False, 'Core'),
+                         Node('Middle', ['Child'], copyFields(childFields),
+                              'middle.html', True, 'Core'),
+                         Node('GrandChild', ['Middle'],
+                              copyFields(childFields) +
+                              makeFields(['size']),
+                              'grandchild.html', False, 'Core'),
+                         Node('Other', [], makeFields(['color']),
+                              'other.html', False, 'Core')])
+    ndb.updateHierarchy()
+    return ndb
+
+def resolveFields(ndb, node):
+    """naive resolution of the fields of node with its super nodes"""
+    result = {}
+    for superNode in reversed(ndb.getSuperNodes(node)):
+        result.update(resolveFields(ndb, superNode))
+    for field in node.getFields():
+        result[field.getName()] = ndbhierarchy.makeFieldEntry(field)
+    return result
+
+class HierarchyTest(unittest.TestCase):
+
+    def testResolveFieldTables(self):
+        ndb = makeNodeDB(['a', 'b'], ['c'])
+        tables = ndbhierarchy.resolveFieldTables(ndb)
+        self.assertEqual(sorted(tables['GrandChild'].keys()),
+                         ['a', 'b', 'c', 'size'])
+        self.assertEqual(tables['GrandChild']['a'][-1], ('Base',))
+        self.assertEqual(tables['GrandChild']['c'][-1], ('Child',))
+        # Middle adds nothing to Child and shares its table
+        self.assertTrue(tables['Middle'] is tables['Child'])
+
+    def testResolveFieldTablesOfSyntheticDatabase(self):
+        ndb = synthetic.makeNodeDB(200)
+        tables = ndbhierarchy.resolveFieldTables(ndb)
+        for node in ndb.getNodeList():
+            self.assertEqual(tables[node.getType()], resolveFields(ndb, node))
+
+    def testEqualInterfaces(self):
+        self.assertEqual(ndbhierarchy.compareEffectiveInterfaces(
+            makeNodeDB(['a'], ['c']), makeNodeDB(['a'], ['c'])), [])
+
+    def testFieldMovedToSuperNode(self):
+        old = makeNodeDB(['a'], ['c'])
+        new = makeNodeDB(['a', 'c'], [])
+        self.assertEqual(ndbhierarchy.resolveFieldTables(
+            new)['Child']['c'][-1], ('Base',))
+        self.assertEqual(ndbhierarchy.compareEffectiveInterfaces(old, new),
+                         [])
+
+    def testInheritedFieldChanged(self):
+        old = makeNodeDB(['a'], ['c'])
+        new = makeNodeDB(['a'], ['c'], baseValue='2.0')
+        self.assertEqual(ndbhierarchy.compareEffectiveInterfaces(old, new), [
+            '@@ node Child @@',
+            '- field SFFloat [in,out] a 1.0 # declared in Base',
+            '+ field SFFloat [in,out] a 2.0 # declared in Base',
+            '',
+            '@@ node GrandChild @@',
+            '- field SFFloat [in,out] a 1.0 # declared in Base',
+            '+ field SFFloat [in,out] a 2.0 # declared in Base',
+            ''])
+
+    def testFieldAddedAndRemoved(self):
+        old = makeNodeDB(['a'], ['c'])
+        new = makeNodeDB(['a'], ['d'])
+        result = ndbhierarchy.compareEffectiveInterfaces(old, new)
+        self.assertEqual(result[:4], [
+            '@@ node Child @@',
+            '- field SFFloat [in,out] c 1.0 # declared in Child',
+            '+ field SFFloat [in,out] d 1.0 # declared in Child',
+            ''])
+        self.assertEqual(result[4], '@@ node GrandChild @@')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,30 @@
+import unittest
+import nodedb
+import synthetic
+
+class ImporterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.ndb = synthetic.makeNodeDB(200)
+
+    def testJSONRoundTrip(self):
+        ndb = nodedb.fromJSON(nodedb.toJSON(self.ndb))
+        self.assertEqual(synthetic.getNodeDBDifferences(self.ndb, ndb), [])
+
+    def testXMLRoundTrip(self):
+        ndb = nodedb.fromXML(nodedb.toXML(self.ndb))
+        self.assertEqual(synthetic.getNodeDBDifferences(self.ndb, ndb), [])
+
+    def testHierarchyIsUpdated(self):
+        for ndb in (nodedb.fromJSON(nodedb.toJSON(self.ndb)),
+                    nodedb.fromXML(nodedb.toXML(self.ndb))):
+            node = ndb.getNode('Node10')
+            self.assertEqual([n.getType() for n in node.getSuperNodes()],
+                             node.getSuperTypes())
+
+    def testInvalidJSON(self):
+        self.assertRaises(nodedb.NodeDBException, nodedb.fromJSON,
+                          '{"__class__" : "Unknown"}')
+
+if __name__ == '__main__':
+    unittest.main()
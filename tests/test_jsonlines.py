@@ -0,0 +1,47 @@
+import unittest
+import StringIO
+import nodedb
+import synthetic
+
+def toJSONLines(ndb):
+    out = StringIO.StringIO()
+    nodedb.writeJSONLines(ndb, out)
+    return out.getvalue()
+
+class JSONLinesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.old = synthetic.makeNodeDB(150)
+        self.new = synthetic.makeEdition(self.old, 1)
+        node = self.new.getNode('Node7')
+        node.setFieldOrder([f.getName() for f in reversed(node.getFields())])
+        types = [n.getType() for n in self.new.getNodeList()]
+        self.new.setNodeOrder(types[1:] + types[:1])
+
+    def diff(self, fullDiff):
+        return list(nodedb.diffJSONLines(
+            StringIO.StringIO(toJSONLines(self.old)),
+            StringIO.StringIO(toJSONLines(self.new)), fullDiff))
+
+    def testDiffMatchesNodeDBDiff(self):
+        for fullDiff in (False, True):
+            expected = self.old.diff(self.new, fullDiff)
+            self.assertTrue(expected)
+            self.assertEqual(self.diff(fullDiff), expected)
+
+    def testNodes(self):
+        nodes = list(nodedb.iterJSONLines(StringIO.StringIO(
+            toJSONLines(self.new))))
+        self.assertEqual([node.getType() for index, node in nodes],
+                         sorted([n.getType() for n in self.new.getNodeList()]))
+        for index, node in nodes:
+            self.assertEqual(node, self.new.getNodeList()[index])
+
+    def testUnsortedNodes(self):
+        lines = toJSONLines(self.old).splitlines(True)
+        data = ''.join(lines[:1] + lines[2:3] + lines[1:2] + lines[3:])
+        self.assertRaises(nodedb.NodeDBException, list,
+                          nodedb.iterJSONLines(StringIO.StringIO(data)))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,129 @@
+import unittest
+import nodedb
+import ndbmerge
+import synthetic
+from nodedb import Node, Field
+
+def setInfo(ndb, nodeType, info):
+    ndb.getNode(nodeType).getFields()[-1].info = info
+
+def addField(ndb, nodeType, fieldName):
+    ndb.getNode(nodeType).addField(Field('SFBool', nodedb.INPUT_OUTPUT,
+                                         fieldName, 'FALSE'))
+
+def getConflicts(conflicts):
+    return [(c.kind, c.nodeType, c.name) for c in conflicts]
+
+class MergeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.base = synthetic.makeNodeDB(60)
+        self.ours = self.base.copy()
+        self.theirs = self.base.copy()
+
+    def merge(self, preferTheirs=False):
+        """returns tuple (merged database, conflicts), checks that the
+        merge in place has the same result"""
+        result, conflicts = ndbmerge.merge(self.base, self.ours, self.theirs,
+                                           preferTheirs)
+        result2, conflicts2 = ndbmerge.merge(self.base.copy(), self.ours,
+                                             self.theirs, preferTheirs,
+                                             inPlace=True)
+        self.assertEqual(synthetic.getNodeDBDifferences(result, result2), [])
+        self.assertEqual(getConflicts(conflicts), getConflicts(conflicts2))
+        return result, conflicts
+
+    def getInfo(self, ndb, nodeType):
+        return ndb.getNode(nodeType).getFields()[-1].getInfo()
+
+    def testConflict(self):
+        fieldName = self.base.getNode('Node3').getFields()[-1].getName()
+        setInfo(self.ours, 'Node3', 'ours')
+        setInfo(self.theirs, 'Node3', 'theirs')
+        result, conflicts = self.merge()
+        self.assertEqual(getConflicts(conflicts),
+                         [('field', 'Node3', fieldName)])
+        self.assertEqual(conflicts[0].resolution, 'ours')
+        self.assertEqual(self.getInfo(result, 'Node3'), 'ours')
+
+        result, conflicts = self.merge(preferTheirs=True)
+        self.assertEqual(conflicts[0].resolution, 'theirs')
+        self.assertEqual(self.getInfo(result, 'Node3'), 'theirs')
+
+    def testSameChange(self):
+        setInfo(self.ours, 'Node3', 'both')
+        setInfo(self.theirs, 'Node3', 'both')
+        addField(self.ours, 'Node4', 'added')
+        addField(self.theirs, 'Node4', 'added')
+        result, conflicts = self.merge()
+        self.assertEqual(conflicts, [])
+        self.assertEqual(self.getInfo(result, 'Node3'), 'both')
+        self.assertEqual([f.getName() for f in
+                          result.getNode('Node4').getFields()].count('added'),
+                         1)
+
+    def testChangesOfBothSides(self):
+        addField(self.ours, 'Node4', 'oursField')
+        addField(self.theirs, 'Node6', 'theirsField')
+        self.ours.addNode(Node('OursNode', [], [], 'ours.html', False,
+                               'Core'))
+        self.theirs.addNode(Node('TheirsNode', ['Node1'], [], 'theirs.html',
+                                 False, 'Core'))
+        leaf = self.base.getNodeList()[-1].getType()
+        self.theirs.removeNode(self.theirs.getNode(leaf))
+        node = self.ours.getNode('Node8')
+        removedField = node.getFields()[-1].getName()
+        node.removeField(node.getFields()[-1])
+        result, conflicts = self.merge()
+        self.assertEqual(conflicts, [])
+        self.assertTrue(result.getNode('Node4').findField('oursField'))
+        self.assertTrue(result.getNode('Node6').findField('theirsField'))
+        self.assertTrue(result.getNode('OursNode'))
+        self.assertTrue(result.getNode('TheirsNode'))
+        self.assertEqual(result.getNode(leaf), None)
+        self.assertEqual(result.getNode('Node8').findField(removedField),
+                         None)
+
+    def testRemovedAndChangedNode(self):
+        leaf = self.base.getNodeList()[-1].getType()
+        self.theirs.removeNode(self.theirs.getNode(leaf))
+        setInfo(self.ours, leaf, 'ours')
+        result, conflicts = self.merge()
+        self.assertEqual(getConflicts(conflicts), [('node', leaf, None)])
+        self.assertEqual(self.getInfo(result, leaf), 'ours')
+        result, conflicts = self.merge(preferTheirs=True)
+        self.assertEqual(result.getNode(leaf), None)
+
+    def testOrderConflicts(self):
+        node = self.ours.getNode('Node8')
+        oursOrder = [f.getName() for f in reversed(node.getFields())]
+        node.setFieldOrder(oursOrder)
+        node = self.theirs.getNode('Node8')
+        theirsOrder = [f.getName() for f in node.getFields()]
+        theirsOrder = theirsOrder[1:] + theirsOrder[:1]
+        node.setFieldOrder(theirsOrder)
+
+        oursNodeOrder = [n.getType() for n in
+                         reversed(self.ours.getNodeList())]
+        self.ours.setNodeOrder(oursNodeOrder)
+        theirsNodeOrder = sorted([n.getType() for n in
+                                  self.theirs.getNodeList()])
+        self.theirs.setNodeOrder(theirsNodeOrder)
+
+        result, conflicts = self.merge()
+        self.assertEqual(getConflicts(conflicts),
+                         [('fieldOrder', 'Node8', None),
+                          ('nodeOrder', None, None)])
+        self.assertEqual([f.getName() for f in
+                          result.getNode('Node8').getFields()], oursOrder)
+        self.assertEqual([n.getType() for n in result.getNodeList()],
+                         oursNodeOrder)
+
+        result, conflicts = self.merge(preferTheirs=True)
+        self.assertEqual([f.getName() for f in
+                          result.getNode('Node8').getFields()], theirsOrder)
+        self.assertEqual([n.getType() for n in result.getNodeList()],
+                         theirsNodeOrder)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+import unittest
+import nodedb
+from nodedb import Node, Field
+
+def makeNodeDB(baseFields, childFields):
+    """returns database with node Child derived from Base, inherited fields
+    are copied into Child"""
+    def makeFields(names):
+        return [Field('SFFloat', nodedb.INPUT_OUTPUT, name, '1.0')
+                for name in names]
+    baseFields = makeFields(baseFields)
+    ndb = nodedb.NodeDB([Node('Base', [], baseFields, 'base.html', True,
+                              'Core'),
+                         Node('Child', ['Base'],
+                              [f.copy() for f in baseFields] +
+                              makeFields(childFields),
+                              'child.html', False, 'Core'),
+                         Node('Other', [], makeFields(['color']),
+                              'other.html', False, 'Core')])
+    ndb.updateHierarchy()
+    return ndb
+
+def getOps(changes):
+    return sorted([(c[0], c[1], c[2].getName()) for c in changes])
+
+class MovedFieldsTest(unittest.TestCase):
+
+    def testRename(self):
+        old = makeNodeDB(['a'], ['size'])
+        new = makeNodeDB(['a'], ['sizes'])
+        changes = old.compare(new, detectMoves=True)
+        self.assertEqual([(c[0], c[1], c[2].getName(), c[3].getName())
+                          for c in changes],
+                         [('renameField', 'Child', 'size', 'sizes')])
+        old.applyChanges(changes, True)
+        self.assertEqual(old.compare(new), [])
+
+    def testDissimilarNamesAreNotRenamed(self):
+        old = makeNodeDB(['a'], ['size'])
+        new = makeNodeDB(['a'], ['width'])
+        self.assertEqual(getOps(old.compare(new, detectMoves=True)),
+                         [('addField', 'Child', 'width'),
+                          ('removeField', 'Child', 'size')])
+
+    def testMoveToSuperNode(self):
+        old = makeNodeDB(['a'], ['color'])
+        new = makeNodeDB(['a', 'color'], [])
+        changes = old.compare(new, detectMoves=True)
+        self.assertEqual([c[:2] + (c[4],) for c in changes],
+                         [('moveField', 'Base', 'Child')])
+        # the field is still inherited by Child
+        self.assertFalse(changes[0][5])
+        old.applyChanges(changes, True)
+        self.assertEqual(old.compare(new), [])
+
+    def testMoveToDerivedNode(self):
+        old = makeNodeDB(['a', 'color'], [])
+        new = makeNodeDB(['a'], ['color'])
+        changes = old.compare(new, detectMoves=True)
+        self.assertEqual([c[:2] + (c[4],) for c in changes],
+                         [('moveField', 'Child', 'Base')])
+        self.assertTrue(changes[0][5])
+        old.applyChanges(changes, True)
+        self.assertEqual(old.compare(new), [])
+
+    def testUnrelatedNodesAreNotMoved(self):
+        old = makeNodeDB(['a'], [])
+        new = makeNodeDB(['a', 'color'], [])
+        new.getNode('Other').removeField(new.getNode('Other').findField(
+            'color'))
+        self.assertEqual(getOps(old.compare(new, detectMoves=True)),
+                         [('addField', 'Base', 'color'),
+                          ('addField', 'Child', 'color'),
+                          ('removeField', 'Other', 'color')])
+
+if __name__ == '__main__':
+    unittest.main()
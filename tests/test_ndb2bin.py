@@ -0,0 +1,84 @@
+import unittest
+import StringIO
+import ndb2bin
+import synthetic
+
+class ImageRoundTripTest(unittest.TestCase):
+
+    def setUp(self):
+        self.ndb = synthetic.makeNodeDB(200)
+        out = StringIO.StringIO()
+        ndb2bin.BinaryExporter(self.ndb).export(out)
+        self.image = ndb2bin.NDBImage(out.getvalue())
+
+    def checkField(self, imageField, field):
+        name = field.getName()
+        self.assertEqual(imageField.name, name)
+        self.assertEqual(imageField.type, field.getType(), name)
+        self.assertEqual(imageField.accessType, field.getAccessType(), name)
+        self.assertEqual(imageField.value, field.getValue(), name)
+        self.assertEqual(imageField.encodingId,
+                         ndb2bin.getFieldEncodingId(field), name)
+        annotations = field.getAnnotations()
+        validValueTypes = field.getValidValueTypes()
+        if not validValueTypes and annotations.getAnnotation('enum'):
+            validValueTypes = annotations.getAnnotation('enum').getValueList()
+        self.assertEqual(imageField.validValueTypes, list(validValueTypes),
+                         name)
+        for ann in ndb2bin.FIELD_FLAG_ANNOTATIONS:
+            self.assertEqual(imageField.hasFlag(ann),
+                             bool(annotations.getAnnotation(ann)),
+                             '%s of %s' % (ann, name))
+
+    def testNodesAndFields(self):
+        imageNodes = self.image.getNodes()
+        self.assertEqual([n.type for n in imageNodes],
+                         [n.getType() for n in self.ndb.getNodeList()])
+        for imageNode in imageNodes:
+            node = self.ndb.getNode(imageNode.type)
+            self.assertEqual(imageNode.superTypes, node.getSuperTypes())
+            self.assertEqual(imageNode.abstract, node.isAbstract())
+            self.assertEqual(imageNode.componentName, node.getComponentName())
+            self.assertEqual(imageNode.auxTypeName,
+                             node.getAttribute('auxTypeName') or '')
+            self.assertEqual(imageNode.encodingId,
+                             ndb2bin.getNodeEncodingId(node))
+            # inherited fields are stored only with the declaring node
+            ownFields = node.getOwnFields()
+            self.assertEqual(len(imageNode.fields), len(ownFields))
+            for imageField, field in zip(imageNode.fields, ownFields):
+                self.checkField(imageField, field)
+
+    def testCPPOutput(self):
+        self.assertEqual(ndb2bin.checkImage(self.image, self.ndb), [])
+
+    def testCPPOutputOfNodeSubset(self):
+        nodes = ['Node150', 'Node20']
+        # nodes defined elsewhere are neither in the image nor in nodeDefs
+        superTypes = self.ndb.getNode('Node150').getSuperTypes()
+        self.ndb.getNode(superTypes[0]).setAttribute('externalDefinition',
+                                                     True)
+        out = StringIO.StringIO()
+        ndb2bin.BinaryExporter(self.ndb, nodes).export(out)
+        image = ndb2bin.NDBImage(out.getvalue())
+        imageTypes = [n.type for n in image.getNodes()]
+        self.assertTrue('Node150' in imageTypes and 'Node20' in imageTypes)
+        self.assertFalse(superTypes[0] in imageTypes)
+        self.assertTrue(len(imageTypes) < 150)
+        self.assertEqual(ndb2bin.checkImage(image, self.ndb, nodes), [])
+
+    def testCPPOutputDiffers(self):
+        self.ndb.getNode('Node10').setAttribute('encodingId', 999)
+        self.assertNotEqual(ndb2bin.checkImage(self.image, self.ndb), [])
+
+    def testParsedValues(self):
+        self.assertEqual(ndb2bin.checkParsedValues(self.image, self.ndb), [])
+
+    def testCorruptedImage(self):
+        data = self.image.data
+        corrupted = data[:-1] + chr(ord(data[-1]) ^ 1)
+        self.assertRaises(ndb2bin.ImageException, ndb2bin.NDBImage, corrupted)
+        self.assertRaises(ndb2bin.ImageException, ndb2bin.NDBImage, data[:10])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+import unittest
+import os
+import sys
+import shutil
+import tempfile
+import threading
+import StringIO
+import ndbd
+import ndbinfo
+import synthetic
+
+class DaemonTestCase(unittest.TestCase):
+    """hides messages of the daemon about loaded files"""
+
+    def setUp(self):
+        self.stderr = sys.stderr
+        sys.stderr = StringIO.StringIO()
+
+    def tearDown(self):
+        sys.stderr = self.stderr
+
+class SnapshotStoreTest(DaemonTestCase):
+
+    def setUp(self):
+        DaemonTestCase.setUp(self)
+        self.directory = tempfile.mkdtemp()
+        self.fileName = os.path.join(self.directory, 'test.ndb')
+        synthetic.makeNodeDB(50).save(self.fileName)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+        DaemonTestCase.tearDown(self)
+
+    def testReloadChangedFile(self):
+        store = ndbd.SnapshotStore()
+        snapshot = store.getSnapshot(self.fileName)
+        self.assertTrue(store.getSnapshot(self.fileName) is snapshot)
+        self.assertEqual(len(snapshot.nodeDB.getNodeList()), 50)
+
+        synthetic.makeNodeDB(60).save(self.fileName)
+        # the stamp changes even when the file system has coarse times
+        mtime = snapshot.stamp[0] + 10
+        os.utime(self.fileName, (mtime, mtime))
+        newSnapshot = store.getSnapshot(self.fileName)
+        self.assertFalse(newSnapshot is snapshot)
+        self.assertEqual(len(newSnapshot.nodeDB.getNodeList()), 60)
+        self.assertTrue(store.getSnapshot(self.fileName) is newSnapshot)
+        # requests in progress keep the old snapshot
+        self.assertEqual(len(snapshot.nodeDB.getNodeList()), 50)
+
+class ServerTest(DaemonTestCase):
+
+    def setUp(self):
+        DaemonTestCase.setUp(self)
+        self.directory = tempfile.mkdtemp()
+        self.fileName = os.path.join(self.directory, 'test.ndb')
+        self.ndb = synthetic.makeNodeDB(80)
+        self.ndb.save(self.fileName)
+        self.socketPath = os.path.join(self.directory, 'ndbd.sock')
+        self.server = ndbd.ThreadPoolServer(self.socketPath,
+                                            ndbd.SnapshotStore(), 2)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.setDaemon(True)
+        self.thread.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+        shutil.rmtree(self.directory)
+        DaemonTestCase.tearDown(self)
+
+    def testQueries(self):
+        for argv in (['-b', '-n', 'Node10'], ['-v', '-n', 'Node40'],
+                     ['-d', '-n', 'Node1,Node2'], ['-i', '-n', 'Node3'],
+                     ['-n', 'Nod10'], ['-c'], ['--list-components'],
+                     ['-l', '-s', '-n', 'Node5,Node7']):
+            options, args = ndbinfo.parseOptions(argv)
+            response = ndbinfo.queryServer(self.socketPath,
+                                           {'command' : 'ndbinfo',
+                                            'file' : self.fileName,
+                                            'options' :
+                                            options.toJSONObject()})
+            out = StringIO.StringIO()
+            err = StringIO.StringIO()
+            exitCode = ndbinfo.runQuery(self.ndb, options, self.fileName,
+                                        out, err, processes=1)
+            self.assertEqual(response['exitCode'], exitCode, argv)
+            self.assertEqual(response['stdout'], out.getvalue(), argv)
+            self.assertEqual(response['stderr'], err.getvalue(), argv)
+
+    def testErrors(self):
+        response = ndbinfo.queryServer(self.socketPath,
+                                       {'command' : 'unknown'})
+        self.assertEqual(response['exitCode'], 2)
+        response = ndbinfo.queryServer(self.socketPath,
+                                       {'command' : 'ndbinfo',
+                                        'file' : self.fileName + '.missing',
+                                        'options' : {}})
+        self.assertEqual(response['exitCode'], 2)
+        self.assertTrue(response['stderr'].startswith('Error:'))
+
+if __name__ == '__main__':
+    unittest.main()
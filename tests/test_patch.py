@@ -0,0 +1,84 @@
+import unittest
+import os
+import sys
+import shutil
+import subprocess
+import tempfile
+import nodedb
+import synthetic
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), 'src')
+
+class PatchTest(unittest.TestCase):
+
+    def setUp(self):
+        self.old = synthetic.makeNodeDB(150)
+        self.new = synthetic.makeEdition(self.old, 1)
+        # reorder fields and nodes so that the order changes are patched too
+        node = self.new.getNode('Node7')
+        node.setFieldOrder([f.getName() for f in reversed(node.getFields())])
+        self.new.setNodeOrder([n.getType() for n in
+                               reversed(self.new.getNodeList())])
+        self.new.updateHierarchy()
+
+    def applyPatch(self, patch, strict=True):
+        ndb = self.old.copy()
+        ndb.applyChanges(nodedb.changesFromJSON(patch), strict)
+        return ndb
+
+    def testRoundTrip(self):
+        for detectMoves in (False, True):
+            patch = nodedb.changesToJSON(self.old.compare(self.new, True,
+                                                          detectMoves))
+            ndb = self.applyPatch(patch)
+            self.assertEqual(synthetic.getNodeDBDifferences(self.new, ndb),
+                             [])
+            self.assertEqual(ndb.compare(self.new, True), [])
+
+    def testMismatchingDatabase(self):
+        patch = nodedb.changesToJSON(self.old.compare(self.new, True))
+        self.old = synthetic.makeEdition(self.old, 2)
+        self.assertRaises(nodedb.NodeDBException, self.applyPatch, patch)
+
+    def testInvalidPatch(self):
+        self.assertRaises(nodedb.NodeDBException, nodedb.changesFromJSON,
+                          '{"format" : "ndbpatch", "version" : 1,'
+                          ' "changes" : [{"op" : "dropTable", "node" : "X"}]}')
+        self.assertRaises(nodedb.NodeDBException, nodedb.changesFromJSON,
+                          '{"changes" : []}')
+
+    def testTools(self):
+        directory = tempfile.mkdtemp()
+        try:
+            oldFile = os.path.join(directory, 'old.ndb')
+            newFile = os.path.join(directory, 'new.ndb')
+            patchFile = os.path.join(directory, 'patch.json')
+            outFile = os.path.join(directory, 'out.ndb')
+            self.old.save(oldFile)
+            self.new.save(newFile)
+            fd = open(patchFile, 'w')
+            try:
+                subprocess.check_call([sys.executable,
+                                       os.path.join(SRC_DIR, 'ndbdiff.py'),
+                                       '-a', '-m', '-j', oldFile, newFile],
+                                      stdout=fd)
+            finally:
+                fd.close()
+            devnull = open(os.devnull, 'w')
+            try:
+                subprocess.check_call([sys.executable,
+                                       os.path.join(SRC_DIR, 'ndbpatch.py'),
+                                       '-o', outFile, oldFile, patchFile],
+                                      stderr=devnull)
+            finally:
+                devnull.close()
+            ndb = nodedb.load(outFile)
+            ndb.updateHierarchy()
+            self.assertEqual(synthetic.getNodeDBDifferences(self.new, ndb),
+                             [])
+        finally:
+            shutil.rmtree(directory)
+
+if __name__ == '__main__':
+    unittest.main()
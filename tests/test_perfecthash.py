@@ -0,0 +1,63 @@
+import unittest
+import re
+import StringIO
+import nodedb
+import ndb2cpp
+import synthetic
+
+class PerfectHashTest(unittest.TestCase):
+
+    def checkHash(self, keys):
+        seeds, indices = ndb2cpp.createPerfectHash(keys)
+        self.assertEqual(len(seeds), len(keys))
+        self.assertEqual(sorted(indices), range(len(keys)))
+        for i, key in enumerate(keys):
+            self.assertEqual(indices[ndb2cpp.getPerfectHashSlot(seeds, key)],
+                             i, key)
+
+    def testEmpty(self):
+        self.assertEqual(ndb2cpp.createPerfectHash([]), ([], []))
+
+    def testSingleKey(self):
+        self.checkHash(['metadata'])
+
+    def testDuplicateKeys(self):
+        self.assertRaises(nodedb.NodeDBException, ndb2cpp.createPerfectHash,
+                          ['url', 'loop', 'url'])
+
+    def testSimilarKeys(self):
+        self.checkHash(['a', 'b', 'c', 'ab', 'ba'])
+        self.checkHash(['set_field%i' % i for i in xrange(5000)])
+
+    def testRealisticDatabase(self):
+        ndb = synthetic.makeNodeDB(2000)
+        self.checkHash([n.getType() for n in ndb.getNodeList()])
+        numFields = {}
+        for node in ndb.getNodeList():
+            fieldNames = [f.getName() for f in node.getOwnFields()]
+            numFields[len(fieldNames)] = True
+            self.checkHash(fieldNames)
+        # nodes with one and with many own fields
+        self.assertTrue(1 in numFields and max(numFields) > 3)
+
+    def testExportedTables(self):
+        ndb = synthetic.makeNodeDB(50)
+        # node without own fields
+        ndb.addNode(nodedb.Node('EmptyNode', [], [], 'empty.html', True,
+                                'Core'))
+        out = StringIO.StringIO()
+        ndb2cpp.CPPExporter(ndb, hashTables=True).export(out)
+        source = out.getvalue()
+        self.assertTrue('getFieldDefIndex' in source)
+        # generated node table maps every node type to its nodeDefs index
+        def getArray(name):
+            m = re.search(r'%s\[\] = \{([^}]*)\};' % name, source)
+            return [int(v) for v in m.group(1).split(',')]
+        seeds = getArray('_nodehash_seeds')
+        indices = getArray('_nodehash_indices')
+        for i, node in enumerate(ndb.getNodeList()):
+            self.assertEqual(indices[ndb2cpp.getPerfectHashSlot(
+                seeds, node.getType())], i)
+
+if __name__ == '__main__':
+    unittest.main()
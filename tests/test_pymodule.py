@@ -0,0 +1,63 @@
+import unittest
+import sys
+import os
+import shutil
+import tempfile
+import json
+import nodedb
+import synthetic
+
+class PythonModuleTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def saveModule(self, ndb, subdirectory):
+        directory = os.path.join(self.directory, subdirectory)
+        os.mkdir(directory)
+        fileName = os.path.join(directory, 'spec.py')
+        ndb.saveAsPythonModule(fileName)
+        return fileName
+
+    def testRoundTrip(self):
+        ndb = synthetic.makeNodeDB(200)
+        fileName = self.saveModule(ndb, 'a')
+        loaded = nodedb.loadFromPythonModule(fileName)
+        self.assertEqual(synthetic.getNodeDBDifferences(ndb, loaded), [])
+        # second load uses the compiled module
+        if not sys.dont_write_bytecode:
+            self.assertTrue(os.path.exists(fileName + 'c'))
+        loaded = nodedb.loadFromPythonModule(fileName)
+        self.assertEqual(synthetic.getNodeDBDifferences(ndb, loaded), [])
+
+    def testEqualFileNames(self):
+        ndb1 = synthetic.makeNodeDB(10, seed=1)
+        ndb2 = synthetic.makeNodeDB(20, seed=2)
+        fileName1 = self.saveModule(ndb1, 'a')
+        fileName2 = self.saveModule(ndb2, 'b')
+        self.assertEqual(synthetic.getNodeDBDifferences(
+            ndb1, nodedb.loadFromPythonModule(fileName1)), [])
+        self.assertEqual(synthetic.getNodeDBDifferences(
+            ndb2, nodedb.loadFromPythonModule(fileName2)), [])
+
+    def testLoadedModulesAreNotReused(self):
+        # the module of json.py must not be executed into the json module
+        fileName = os.path.join(self.directory, 'json.py')
+        synthetic.makeNodeDB(5).saveAsPythonModule(fileName)
+        nodedb.loadFromPythonModule(fileName)
+        self.assertFalse(hasattr(json, 'getNodeTables'))
+        self.assertTrue(sys.modules['json'] is json)
+
+    def testUnsupportedVersion(self):
+        fileName = os.path.join(self.directory, 'old.py')
+        fd = open(fileName, 'w')
+        fd.write('NDB_MODULE_VERSION = -1\n')
+        fd.close()
+        self.assertRaises(nodedb.NodeDBException,
+                          nodedb.loadFromPythonModule, fileName)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+import unittest
+import nodedb
+import ndbquery
+import synthetic
+from nodedb import Field
+
+class QueryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.ndb = synthetic.makeNodeDB(300)
+        # field name which is a keyword of the query language
+        self.ndb.getNode('Node5').addField(Field('SFBool', nodedb.INPUT_ONLY,
+                                                 'or', None))
+        self.ndb.updateHierarchy()
+        self.index = ndbquery.QueryIndex(self.ndb)
+
+    def query(self, query):
+        return ndbquery.runQuery(self.index, query)[1]
+
+    def isDerived(self, node, superType):
+        for superNode in self.ndb.getSuperNodes(node):
+            if superNode.getType() == superType or \
+               self.isDerived(superNode, superType):
+                return True
+        return False
+
+    def scanFields(self, predicate):
+        return [(node.getType(), field.getName())
+                for node in self.ndb.getNodeList()
+                for field in node.getFields() if predicate(node, field)]
+
+    def scanNodes(self, predicate):
+        return [node.getType() for node in self.ndb.getNodeList()
+                if predicate(node)]
+
+    def testExampleQuery(self):
+        result = self.query('fields where type in (SFNode,MFNode) and'
+                            ' access=[in,out] and node derives Node0 and'
+                            ' component=Rendering')
+        self.assertTrue(result)
+        self.assertEqual(result, self.scanFields(
+            lambda node, field: field.getType() in ('SFNode', 'MFNode') and
+            field.getAccessType() == nodedb.INPUT_OUTPUT and
+            self.isDerived(node, 'Node0') and
+            node.getComponentName() == 'Rendering'))
+
+    def testNotEqual(self):
+        self.assertEqual(self.query('fields where type != SFFloat'),
+                         self.scanFields(lambda node, field:
+                                         field.getType() != 'SFFloat'))
+
+    def testPrecedence(self):
+        # not binds stronger than and, and stronger than or
+        self.assertEqual(
+            self.query('nodes where not abstract=true or component=Core'
+                       ' and field=f0_0'),
+            self.scanNodes(lambda node: not node.isAbstract() or
+                           (node.getComponentName() == 'Core' and
+                            node.findField('f0_0') is not None)))
+        self.assertEqual(
+            self.query('nodes where not (abstract=true or component=Core)'),
+            self.scanNodes(lambda node: not node.isAbstract() and
+                           node.getComponentName() != 'Core'))
+
+    def testInAndWildcards(self):
+        self.assertEqual(self.query('nodes where node in (Node1?, Node2)'),
+                         ['Node2'] + ['Node1%i' % i for i in xrange(10)])
+        self.assertEqual(self.query('fields where name=f1*_0'),
+                         self.scanFields(lambda node, field:
+                                         field.getName().startswith('f1') and
+                                         field.getName().endswith('_0')))
+
+    def testQuotedValues(self):
+        self.assertEqual(self.query('fields where name="or"'),
+                         [('Node5', 'or')])
+        self.assertEqual(self.query('nodes where component="Rendering"'),
+                         self.query('nodes where component=Rendering'))
+
+    def testAccessTypes(self):
+        self.assertEqual(self.query('fields where access=[in, out]'),
+                         self.scanFields(lambda node, field:
+                                         field.getAccessType() ==
+                                         nodedb.INPUT_OUTPUT))
+        self.assertEqual(self.query('fields where access=inputOnly'),
+                         self.scanFields(lambda node, field:
+                                         field.getAccessType() ==
+                                         nodedb.INPUT_ONLY))
+
+    def testErrors(self):
+        for query in ('fields where type=', 'fields where (type=SFBool',
+                      'fields where color=red', 'nodes where accepts=Node1',
+                      'fields where access=[in*]', 'edges'):
+            self.assertRaises(ndbquery.QueryException, self.query, query)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+import unittest
+import os
+import shutil
+import tempfile
+import nodedb
+import ndbsearch
+import synthetic
+from nodedb import Node
+
+def searchTexts(ndb, text, kind):
+    """brute force search of text in the own fields of the nodes of ndb"""
+    result = []
+    for node in ndb.getNodeList():
+        for field in node.getOwnFields():
+            if kind == 'info':
+                texts = [field.getInfo() or '']
+            else:
+                annotations = field.getAnnotations().annotDict.items()
+                annotations.sort()
+                texts = [a.toString() for name, a in annotations]
+            result.extend([(kind, node.getType(), field.getName(), t)
+                           for t in texts if text.lower() in t.lower()])
+    return result
+
+class SearchIndexTest(unittest.TestCase):
+    """matches of equal texts are returned together, so search results
+    are compared with the brute force search in any order"""
+
+    def setUp(self):
+        self.ndb = synthetic.makeNodeDB(100)
+        for nodeType in ('Transform', 'TextureTransform', 'TimeSensor'):
+            self.ndb.addNode(Node(nodeType, [], [], 'x3d.html', False,
+                                  'Core'))
+        self.index = ndbsearch.SearchIndex(self.ndb)
+
+    def testSuggest(self):
+        for text, nodeType in (('Trasnform', 'Transform'),
+                               ('texturetransfrom', 'TextureTransform'),
+                               ('TimeSensr', 'TimeSensor'),
+                               ('Nde15', 'Node15')):
+            self.assertEqual(self.index.suggest(text)[0][1], nodeType)
+        self.assertEqual(self.index.suggest('Transform')[0],
+                         (1.0, 'Transform'))
+
+    def testSearchInfo(self):
+        for text in ('info text 2', 'TEXT', 'xt 1'):
+            expected = searchTexts(self.ndb, text, 'info')
+            self.assertTrue(expected)
+            self.assertEqual(sorted(self.index.search(text, ['info'])),
+                             sorted(expected))
+
+    def testSearchAnnotation(self):
+        for text in ('@enum', 'isresource', '(a, b)', 'a'):
+            expected = searchTexts(self.ndb, text, 'annotation')
+            self.assertTrue(expected)
+            self.assertEqual(sorted(self.index.search(text, ['annotation'])),
+                             sorted(expected))
+        self.assertEqual(self.index.search('info text', ['annotation']), [])
+
+class SearchIndexFileTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.indexFile = os.path.join(self.directory, 'test.search')
+        self.ndb = synthetic.makeNodeDB(100)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def testIndexFile(self):
+        expected = ndbsearch.SearchIndex(self.ndb).search('f1')
+        self.assertTrue(expected)
+        index = ndbsearch.loadSearchIndex(self.ndb, self.indexFile)
+        self.assertEqual(index.search('f1'), expected)
+        index = ndbsearch.loadSearchIndex(self.ndb, self.indexFile)
+        self.assertEqual(index.search('f1'), expected)
+        # index is built again for the changed database
+        self.ndb.addNode(Node('AddedNode', [], [], 'added.html', False,
+                              'Core'))
+        index = ndbsearch.loadSearchIndex(self.ndb, self.indexFile)
+        self.assertEqual(index.search('added'),
+                         [('node', 'AddedNode', None, 'AddedNode')])
+
+    def testUnwritableIndexFile(self):
+        indexFile = os.path.join(self.directory, 'missing', 'test.search')
+        self.assertRaises(nodedb.NodeDBException, ndbsearch.loadSearchIndex,
+                          self.ndb, indexFile)
+
+if __name__ == '__main__':
+    unittest.main()